@@ -0,0 +1,563 @@
+# api.py
+# ---------------------------------------------------------
+# PERSONA SCORING SERVICE (FastAPI + micro-batching)
+# ---------------------------------------------------------
+# Run with:
+#   uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+#
+# Concurrent single-customer requests are coalesced into one
+# `model.predict` call inside a small time/size window. Every prediction
+# runs on a bounded executor (async_scoring.AsyncScorer), never on the
+# event loop: /predict uses the "interactive" lane, /predict/batch the
+# "bulk" lane, so single-customer lookups are not stuck behind big batches.
+# A full lane answers 503 with Retry-After, a request bigger than the lane
+# limit answers 413; every prediction response
+# carries X-Queue-Time-Ms and X-Exec-Time-Ms headers.
+#
+# With PERSONA_REGISTRY the model is served from a model_registry alias and
+# hot-swapped when the alias moves (loaded, verified and warmed in the
+# background first). Each request is bound to one model version when it is
+# submitted, so in-flight work finishes on the version it started with.
+# Responses carry model_version (and X-Model-Version); /metrics breaks
+# scoring cost down by version. A second alias can take a share of the
+# traffic (A/B) or score every label request again in the bulk lane for
+# comparison only (shadow).
+#
+# Tuning (environment variables):
+#   PERSONA_MODEL_PATH      model artifact to serve (default: model.pkl)
+#   PERSONA_BATCH_MAX_SIZE  max rows per coalesced predict call (default: 256)
+#   PERSONA_BATCH_WAIT_MS   max time a request waits for company (default: 2)
+#   PERSONA_COMPILED        1 = serve the pure-NumPy compiled predictor
+#   PERSONA_CACHE_SIZE      >0 = cache up to N predictions (default: 0, off)
+#   PERSONA_CACHE_TTL       seconds a cached prediction stays valid (default: none)
+#   PERSONA_PROFILE         1 = time every pipeline stage, exposed on GET /metrics
+#   PERSONA_DRIFT           1 = track feature drift / persona mix, exposed on GET /drift
+#   PERSONA_DRIFT_REFERENCE reference profile JSON for the drift monitor (default: the model,
+#                           which raises no numeric drift alerts)
+#   PERSONA_EXECUTOR        thread | process, where predictions run (default: thread)
+#   PERSONA_WORKERS         predictions executing at once (default: 1)
+#   PERSONA_MAX_QUEUE_INTERACTIVE  rows waiting in the interactive lane before 503 (default: 4096)
+#   PERSONA_MAX_QUEUE_BULK  rows waiting in the bulk lane before 503 (default: 200000)
+#   PERSONA_BULK_CHUNK_ROWS bulk requests are scored in jobs of this many rows (default: 1024)
+#   PERSONA_REGISTRY        model_registry directory to serve from instead of PERSONA_MODEL_PATH
+#   PERSONA_REGISTRY_ALIAS  alias to serve and follow (default: production)
+#   PERSONA_REGISTRY_POLL   seconds between alias checks (default: 2)
+#   PERSONA_AB_ALIAS        registry alias serving a share of the requests (default: none)
+#   PERSONA_AB_SHARE        share of requests routed to PERSONA_AB_ALIAS (default: 0.1)
+#   PERSONA_SHADOW_ALIAS    registry alias scored in shadow; only agreement is reported
+
+import asyncio
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from collections import namedtuple
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Extra, Field
+
+from async_scoring import AsyncScorer, QueueFullError, RequestTooLargeError, ScoreResult
+from batch_score import (
+    DEFAULT_MODEL_PATH, _affinity_records, _init_worker, _predict_records, affinity_top_k,
+    load_model, score_frame,
+)
+from compiled_model import CompiledPersonaModel
+from persona_config import PERSONA_DETAILS, FEATURE_COLUMNS
+from prediction_cache import CachedPersonaModel, PredictionCache, artifact_fingerprint
+from drift_monitor import DriftMonitor, load_reference
+from model_registry import HotSwapModel, ModelRegistry, ServedModel
+from persona_affinity import PersonaAffinity
+from profiling import PrometheusSink, StageProfiler, instrument
+
+MODEL_PATH = os.environ.get("PERSONA_MODEL_PATH", DEFAULT_MODEL_PATH)
+BATCH_MAX_SIZE = int(os.environ.get("PERSONA_BATCH_MAX_SIZE", 256))
+BATCH_WAIT_MS = float(os.environ.get("PERSONA_BATCH_WAIT_MS", 2))
+COMPILED = os.environ.get("PERSONA_COMPILED", "0") == "1"
+CACHE_SIZE = int(os.environ.get("PERSONA_CACHE_SIZE", 0))
+CACHE_TTL = float(os.environ["PERSONA_CACHE_TTL"]) if os.environ.get("PERSONA_CACHE_TTL") else None
+PROFILE = os.environ.get("PERSONA_PROFILE", "0") == "1"
+DRIFT = os.environ.get("PERSONA_DRIFT", "0") == "1"
+DRIFT_REFERENCE = os.environ.get("PERSONA_DRIFT_REFERENCE")
+N_PERSONAS = len(PERSONA_DETAILS)
+EXECUTOR = os.environ.get("PERSONA_EXECUTOR", "thread")
+WORKERS = int(os.environ.get("PERSONA_WORKERS", 1))
+MAX_QUEUE_INTERACTIVE = int(os.environ.get("PERSONA_MAX_QUEUE_INTERACTIVE", 4096))
+MAX_QUEUE_BULK = int(os.environ.get("PERSONA_MAX_QUEUE_BULK", 200_000))
+BULK_CHUNK_ROWS = int(os.environ.get("PERSONA_BULK_CHUNK_ROWS", 1024))
+REGISTRY = os.environ.get("PERSONA_REGISTRY")
+REGISTRY_ALIAS = os.environ.get("PERSONA_REGISTRY_ALIAS", "production")
+REGISTRY_POLL = float(os.environ.get("PERSONA_REGISTRY_POLL", 2))
+AB_ALIAS = os.environ.get("PERSONA_AB_ALIAS")
+AB_SHARE = float(os.environ.get("PERSONA_AB_SHARE", 0.1))
+SHADOW_ALIAS = os.environ.get("PERSONA_SHADOW_ALIAS")
+
+# ScoreResult plus the version of the model that produced it
+VersionedResult = namedtuple("VersionedResult", ScoreResult._fields + ("model_version",))
+
+
+# ---------------------------------------------------------
+# REQUEST / RESPONSE SCHEMAS (field order = FEATURE_COLUMNS)
+# ---------------------------------------------------------
+class Customer(BaseModel):
+    """
+    One customer's raw attributes. Every feature must be present; null is
+    allowed and is imputed by the pipeline exactly as in training.
+    """
+    Age: Optional[float] = Field(...)
+    Gender: Optional[str] = Field(...)
+    City_Tier: Optional[float] = Field(...)
+    Occupation: Optional[str] = Field(...)
+    Annual_Income: Optional[float] = Field(...)
+    AMB: Optional[float] = Field(...)
+    Debit_Txn_Count: Optional[float] = Field(...)
+    Credit_Txn_Count: Optional[float] = Field(...)
+    UPI_Usage_Ratio: Optional[float] = Field(...)
+    ATM_Withdrawal_Count: Optional[float] = Field(...)
+    Failed_Txn_Count: Optional[float] = Field(...)
+    Mobile_App_Login: Optional[float] = Field(...)
+    Netbanking_Login: Optional[float] = Field(...)
+    Dormancy_Days: Optional[float] = Field(...)
+    Products_Held: Optional[float] = Field(...)
+    Credit_Card_Utilization: Optional[float] = Field(...)
+    EMI_Presence: Optional[float] = Field(...)
+    Insurance_Premium: Optional[float] = Field(...)
+    SIP_Amount: Optional[float] = Field(...)
+    FD_Amount: Optional[float] = Field(...)
+
+    class Config:
+        extra = Extra.forbid
+
+
+assert list(Customer.__fields__) == FEATURE_COLUMNS, "Customer schema out of sync with FEATURE_COLUMNS"
+
+
+class PersonaPrediction(BaseModel):
+    cluster_id: int
+    persona: dict
+    model_version: Optional[str] = None
+
+
+class PersonaScore(BaseModel):
+    cluster_id: int
+    name: str
+    affinity: float
+    distance: float
+
+
+class PersonaAffinityPrediction(PersonaPrediction):
+    personas: List[PersonaScore]
+
+
+def to_record(customer):
+    # the pipeline's imputers treat NaN, not None, as missing
+    return {k: (np.nan if v is None else v) for k, v in customer.dict().items()}
+
+
+def to_prediction(cluster_id, model_version=None):
+    cluster_id = int(cluster_id)
+    return {"cluster_id": cluster_id, "persona": PERSONA_DETAILS.get(cluster_id, {}),
+            "model_version": model_version}
+
+
+def to_affinity_prediction(ranked, model_version=None):
+    """`ranked` is one row of affinity_top_k: [cluster_id, affinity, distance] per persona."""
+    personas = [
+        {"cluster_id": int(cid), "name": PERSONA_DETAILS.get(int(cid), {}).get("name", ""),
+         "affinity": float(affinity), "distance": float(distance)}
+        for cid, affinity, distance in ranked
+    ]
+    return {**to_prediction(ranked[0][0], model_version), "personas": personas}
+
+
+# ---------------------------------------------------------
+# MICRO-BATCHER
+# ---------------------------------------------------------
+class MicroBatcher:
+    """
+    Coalesce concurrent single-row requests into one predict call.
+
+    The first queued request opens a window of at most `max_wait_ms`;
+    everything that arrives before the window closes (up to `max_batch_size`
+    rows) is handed to the awaitable `score_fn(records) -> ScoreResult`.
+    The next window opens while that batch is still being scored.
+
+    `submit` returns (label, queue_seconds, exec_seconds, model_version);
+    the queue time includes the time spent waiting for the window to close.
+    """
+
+    def __init__(self, score_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_WAIT_MS):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._task = None
+        self._inflight = set()
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        for task in [self._task, *self._inflight]:
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._inflight.clear()
+
+    async def submit(self, record):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # take whatever is already queued without yielding first
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            task = loop.create_task(self._score(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _score(self, batch):
+        try:
+            result = await self.score_fn([record for record, _, _ in batch])
+        except Exception as exc:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        now = time.perf_counter()
+        version = getattr(result, "model_version", None)
+        for (_, future, submitted), label in zip(batch, result.labels):
+            if not future.done():
+                queued = max(now - submitted - result.exec_seconds, 0.0)
+                future.set_result((label, queued, result.exec_seconds, version))
+
+
+# ---------------------------------------------------------
+# APP
+# ---------------------------------------------------------
+state = {}
+_drift_lock = threading.Lock()
+
+
+def drift_monitor_for(model):
+    """A DriftMonitor in the space of `model` (the model under a prediction cache)."""
+    if isinstance(model, CachedPersonaModel):
+        model = model.model
+    return DriftMonitor(model, state["drift_reference"])
+
+
+def observe(records, labels, served):
+    """Feed primary-model traffic scored by `served` to the drift monitor."""
+    if "drift" not in state:
+        return
+    # predictions run on several executor threads at once
+    with _drift_lock:
+        if served.version != state["drift_version"]:
+            if served.version != served_model().version:
+                # finished on a model that has been swapped out since
+                return
+            # a hot swap / reload changed the model space: start a new monitor
+            state["drift"] = drift_monitor_for(served.model)
+            state["drift_version"] = served.version
+        state["drift"].update(records, labels)
+
+
+def predict_with(model, records):
+    """Labels for a list of feature dicts with one predict call."""
+    if isinstance(model, (CompiledPersonaModel, CachedPersonaModel)):
+        return model.predict(records)
+    return score_frame(model, pd.DataFrame.from_records(records, columns=FEATURE_COLUMNS))
+
+
+def predict_records(records, model=None, served=None):
+    """
+    Score a list of feature dicts (default: the served model); with
+    `served` (the primary ServedModel they were routed to) also track drift.
+    """
+    labels = predict_with(state["model"] if model is None else model, records)
+    if served is not None:
+        observe(records, labels, served)
+    return labels
+
+
+def affinity_records(records, top_k, model=None):
+    """Top-k persona affinities for a list of feature dicts (thread executor)."""
+    affinity = PersonaAffinity.from_model(state["model"] if model is None else model)
+    return affinity_top_k(affinity, pd.DataFrame.from_records(records, columns=FEATURE_COLUMNS), top_k)
+
+
+def served_model():
+    """ServedModel(version, model) of the primary model right now."""
+    if "served" in state:
+        return state["served"].current
+    model = state.get("model")
+    # a CachedPersonaModel reloads a changed MODEL_PATH and tracks its SHA-256
+    version = getattr(model, "version", None) or state["model_version"]
+    return ServedModel(version[:12], model)
+
+
+def route():
+    """(role, ServedModel) for the next request: the A/B arm for AB_SHARE of them."""
+    if "ab" in state and random.random() < AB_SHARE:
+        return "ab", state["ab"].current
+    return "primary", served_model()
+
+
+async def score(records, lane, top_k=None):
+    """
+    Score `records` on the shared AsyncScorer with the model routed to at
+    submission; returns a VersionedResult. `top_k` asks for persona
+    affinities (affinity_top_k rows) instead of labels.
+    """
+    role, served = route()
+    if EXECUTOR == "process":
+        # worker processes score with their own copy of MODEL_PATH
+        fn = _predict_records if top_k is None else partial(_affinity_records, top_k=top_k)
+    elif top_k is None:
+        # A/B traffic is left out of the primary model's drift statistics
+        fn = partial(predict_records, model=served.model, served=served if role == "primary" else None)
+    else:
+        fn = partial(affinity_records, top_k=top_k, model=served.model)
+    result = await state["scorer"].submit(records, lane, fn)
+    state["model_metrics"].record(f"{role}/{served.version}", result.exec_seconds, len(records), 0, None)
+    if top_k is None:
+        if EXECUTOR == "process" and "drift" in state:
+            # drift is tracked here rather than in the workers
+            await asyncio.get_running_loop().run_in_executor(None, observe, records, result.labels, served)
+        if "shadow" in state and state["shadow"].version != served.version:
+            task = asyncio.get_running_loop().create_task(shadow_score(records, result.labels))
+            state["shadow_tasks"].add(task)
+            task.add_done_callback(state["shadow_tasks"].discard)
+    return VersionedResult(*result, served.version)
+
+
+async def shadow_score(records, labels):
+    """Score `records` with the shadow model in the bulk lane and count agreement."""
+    served = state["shadow"].current
+    counters = state["shadow_stats"].setdefault(
+        served.version, {"rows": 0, "agree": 0, "dropped": 0, "failed": 0}
+    )
+    try:
+        result = await state["scorer"].submit(records, "bulk", partial(predict_with, served.model))
+    except QueueFullError:
+        # shadow traffic never pushes back on real requests
+        counters["dropped"] += len(records)
+        return
+    except Exception:
+        counters["failed"] += len(records)
+        return
+    state["model_metrics"].record(f"shadow/{served.version}", result.exec_seconds, len(records), 0, None)
+    counters["rows"] += len(records)
+    counters["agree"] += int((np.asarray(result.labels) == np.asarray(labels)).sum())
+
+
+def set_timing_headers(response, queue_seconds, exec_seconds, model_version=None):
+    response.headers["X-Queue-Time-Ms"] = f"{queue_seconds * 1000:.3f}"
+    response.headers["X-Exec-Time-Ms"] = f"{exec_seconds * 1000:.3f}"
+    if model_version is not None:
+        response.headers["X-Model-Version"] = model_version
+
+
+def render_shadow_metrics():
+    lines = []
+    for name, key, help_text in (
+        ("shadow_rows_total", "rows", "Rows scored by the shadow model."),
+        ("shadow_agree_rows_total", "agree", "Shadow rows with the same label as the served model."),
+        ("shadow_dropped_rows_total", "dropped", "Shadow rows skipped because the bulk lane was full."),
+    ):
+        lines.append(f"# HELP persona_{name} {help_text}")
+        lines.append(f"# TYPE persona_{name} counter")
+        for version, counters in state.get("shadow_stats", {}).items():
+            lines.append(f'persona_{name}{{version="{version}"}} {counters[key]}')
+    return "\n".join(lines) + "\n" if state.get("shadow_stats") else ""
+
+
+def load_served_model(path):
+    """Load the model to serve, instrumenting its stages when PERSONA_PROFILE=1."""
+    model = load_model(path, compiled=COMPILED)
+    # the compiled model has no sklearn stages to wrap
+    if "metrics" in state and hasattr(model, "steps"):
+        instrument(model, StageProfiler([state["metrics"]]))
+    return model
+
+
+def load_cached_model(path):
+    """load_served_model plus, with PERSONA_CACHE_SIZE, a fresh prediction cache."""
+    model = load_served_model(path)
+    if CACHE_SIZE > 0:
+        model = CachedPersonaModel(model, PredictionCache(max_size=CACHE_SIZE, ttl=CACHE_TTL))
+    return model
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if PROFILE:
+        state["metrics"] = PrometheusSink()
+    state["model_metrics"] = PrometheusSink(prefix="persona_model")
+    if REGISTRY:
+        if EXECUTOR == "process":
+            raise RuntimeError("PERSONA_REGISTRY hot swapping needs PERSONA_EXECUTOR=thread.")
+        registry = ModelRegistry(REGISTRY)
+        # every version gets its own cache: labels may differ between versions
+        for key, alias in (("served", REGISTRY_ALIAS), ("ab", AB_ALIAS), ("shadow", SHADOW_ALIAS)):
+            if alias:
+                state[key] = HotSwapModel(registry, alias, loader=load_cached_model,
+                                          poll_interval=REGISTRY_POLL).start()
+        state["shadow_stats"], state["shadow_tasks"] = {}, set()
+        predict_fn, initializer, initargs = predict_records, None, ()
+    elif EXECUTOR == "process":
+        # every worker process loads (and caches for) its own model copy
+        predict_fn, initializer = _predict_records, _init_worker
+        initargs = (MODEL_PATH, COMPILED, False, CACHE_SIZE)
+    else:
+        model = load_served_model(MODEL_PATH)
+        if CACHE_SIZE > 0:
+            # reloads the model and drops cached labels when MODEL_PATH changes
+            model = CachedPersonaModel(
+                model, PredictionCache(max_size=CACHE_SIZE, ttl=CACHE_TTL),
+                model_path=MODEL_PATH, loader=load_served_model,
+            )
+        state["model"] = model
+        predict_fn, initializer, initargs = predict_records, None, ()
+    if not REGISTRY:
+        state["model_version"] = artifact_fingerprint(MODEL_PATH)
+    if DRIFT:
+        state["drift_reference"] = load_reference(DRIFT_REFERENCE) if DRIFT_REFERENCE else None
+        served = served_model()
+        # process workers hold their own models: the monitor gets a copy
+        state["drift"] = drift_monitor_for(served.model if served.model is not None else load_model(MODEL_PATH))
+        state["drift_version"] = served.version
+    state["scorer_metrics"] = PrometheusSink(prefix="persona_scorer")
+    scorer = AsyncScorer(
+        predict_fn, workers=WORKERS, executor=EXECUTOR,
+        max_queue_rows={"interactive": MAX_QUEUE_INTERACTIVE, "bulk": MAX_QUEUE_BULK},
+        bulk_chunk_rows=BULK_CHUNK_ROWS, initializer=initializer, initargs=initargs,
+        sinks=[state["scorer_metrics"]],
+    )
+    scorer.start()
+    state["scorer"] = scorer
+    batcher = MicroBatcher(lambda records: score(records, "interactive"))
+    batcher.start()
+    state["batcher"] = batcher
+    yield
+    await batcher.stop()
+    for task in list(state.get("shadow_tasks", ())):
+        task.cancel()
+    await scorer.stop()
+    for key in ("served", "ab", "shadow"):
+        if key in state:
+            state[key].stop()
+    state.clear()
+
+
+app = FastAPI(title="Customer Persona Scoring API", lifespan=lifespan)
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full(request: Request, exc: QueueFullError):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(RequestTooLargeError)
+async def request_too_large(request: Request, exc: RequestTooLargeError):
+    # retrying cannot help: the client has to split the request
+    return JSONResponse({"detail": str(exc)}, status_code=413)
+
+
+@app.get("/health")
+async def health():
+    health = {"status": "ok", "model_loaded": "model" in state or "served" in state or EXECUTOR == "process"}
+    if "scorer" in state:
+        health["model_version"] = served_model().version
+    for key in ("served", "ab", "shadow"):
+        if key in state:
+            health.setdefault("registry", {})[key] = state[key].stats()
+    if "ab" in state:
+        health["registry"]["ab"]["share"] = AB_SHARE
+    if state.get("shadow_stats"):
+        health["shadow"] = {
+            version: {**counters, "agreement": counters["agree"] / counters["rows"] if counters["rows"] else None}
+            for version, counters in state["shadow_stats"].items()
+        }
+    cache = getattr(served_model().model if "scorer" in state else None, "cache", None)
+    if cache is not None:
+        health["cache"] = cache.stats()
+    scorer = state.get("scorer")
+    if scorer is not None:
+        health["scorer"] = scorer.stats()
+    return health
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    sinks = [state.get("metrics"), state.get("scorer_metrics"), state.get("model_metrics")]
+    return "".join(sink.render() for sink in sinks if sink is not None) + render_shadow_metrics()
+
+
+@app.get("/drift")
+async def drift():
+    monitor = state.get("drift")
+    if monitor is None:
+        return {"enabled": False}
+    with _drift_lock:
+        return {"enabled": True, **monitor.report()}
+
+
+@app.post("/predict", response_model=PersonaPrediction)
+async def predict(customer: Customer, response: Response):
+    label, queue_seconds, exec_seconds, version = await state["batcher"].submit(to_record(customer))
+    set_timing_headers(response, queue_seconds, exec_seconds, version)
+    return to_prediction(label, version)
+
+
+@app.post("/predict/batch", response_model=List[PersonaPrediction])
+async def predict_batch(customers: List[Customer], response: Response,
+                        lane: str = Query("bulk", regex="^(interactive|bulk)$")):
+    if not customers:
+        return []
+    result = await score([to_record(customer) for customer in customers], lane)
+    set_timing_headers(response, result.queue_seconds, result.exec_seconds, result.model_version)
+    return [to_prediction(label, result.model_version) for label in result.labels]
+
+
+@app.post("/predict/affinity", response_model=List[PersonaAffinityPrediction])
+async def predict_affinity(customers: List[Customer], response: Response,
+                           top_k: int = Query(N_PERSONAS, ge=1, le=N_PERSONAS),
+                           lane: str = Query("bulk", regex="^(interactive|bulk)$")):
+    if not customers:
+        return []
+    result = await score([to_record(customer) for customer in customers], lane, top_k=top_k)
+    set_timing_headers(response, result.queue_seconds, result.exec_seconds, result.model_version)
+    return [to_affinity_prediction(ranked, result.model_version) for ranked in result.labels]
@@ -1,7 +1,25 @@
+import os
+import tempfile
 import streamlit as st
 import joblib
 import pandas as pd
-from persona_config import PERSONA_DETAILS
+from batch_score import file_format, input_columns, score_file
+from input_validation import validate_frame
+from persona_config import PERSONA_DETAILS, PERSONA_FACTS, FEATURE_COLUMNS
+from persona_profiles import DEFAULT_PROFILE_CACHE, load_profiles, profile_facts
+from model_registry import HotSwapModel, ModelRegistry
+from prediction_cache import CachedPersonaModel, PredictionCache, artifact_signature
+
+MODEL_PATH = "model.pkl"
+# optional: serve a model_registry alias instead, hot-swapped when it moves
+REGISTRY = os.environ.get("PERSONA_REGISTRY") or None
+REGISTRY_ALIAS = os.environ.get("PERSONA_REGISTRY_ALIAS", "production")
+CACHE_SIZE = int(os.environ.get("PERSONA_CACHE_SIZE", 0))
+# optional: data to compute the persona cards from (else PERSONA_FACTS is shown)
+PROFILE_DATA = os.environ.get("PERSONA_PROFILE_DATA") or None
+PROFILE_CACHE = os.environ.get("PERSONA_PROFILE_CACHE", DEFAULT_PROFILE_CACHE)
+# rows scored per chunk in bulk upload mode (bounds memory per step)
+UPLOAD_CHUNKSIZE = int(os.environ.get("PERSONA_UPLOAD_CHUNKSIZE", 50_000))
 
 # ---------------------------------------------------------
 # PAGE CONFIG (for LinkedIn rich preview + basic SEO)
@@ -22,69 +40,33 @@ st.markdown("""
 # ---------------------------------------------------------
 @st.cache_resource
 def load_model():
-    return joblib.load("model.pkl")
-
-model = load_model()
-
-# ---------------------------------------------------------
-# FEATURE ORDER (must match model training)
-# ---------------------------------------------------------
-FEATURE_COLUMNS = [
-    "Age", "Gender", "City_Tier", "Occupation", "Annual_Income", "AMB",
-    "Debit_Txn_Count", "Credit_Txn_Count", "UPI_Usage_Ratio",
-    "ATM_Withdrawal_Count", "Failed_Txn_Count", "Mobile_App_Login",
-    "Netbanking_Login", "Dormancy_Days", "Products_Held",
-    "Credit_Card_Utilization", "EMI_Presence", "Insurance_Premium",
-    "SIP_Amount", "FD_Amount"
-]
-
-# ---------------------------------------------------------
-# CLUSTER MEDIAN SNAPSHOT FACTS (incl. Dormancy as last line)
-# ---------------------------------------------------------
-PERSONA_FACTS = {
-    0: {
-        "Age": 28,
-        "Occupation": "Salaried (65%)",
-        "UPI Usage": "0.76",
-        "Mobile App Logins": 35,
-        "AMB": "₹32,000",
-        "SIP Amount": "₹1,200",
-        "FD Amount": "₹10,000",
-        "ATM Withdrawals": 1,
-        "Dormancy": "99 days",
-    },
-    1: {
-        "Age": 45,
-        "Occupation": "Business Owner (58%)",
-        "FD Amount": "₹8,50,000",
-        "AMB": "₹1,20,000",
-        "UPI Usage": "0.32",
-        "ATM Withdrawals": 6,
-        "SIP Amount": "₹2,500",
-        "Dormancy": "159 days",
-    },
-    2: {
-        "Age": 34,
-        "Occupation": "Salaried (72%)",
-        "Income": "₹18,00,000",
-        "SIP Amount": "₹12,000",
-        "Mobile App Logins": 68,
-        "Credit Card Utilization": "48%",
-        "FD Amount": "₹75,000",
-        "UPI Usage": "0.84",
-        "Dormancy": "24 days",
-    },
-    3: {
-        "Age": 31,
-        "Occupation": "Self-Employed (52%)",
-        "ATM Withdrawals": 11,
-        "UPI Usage": "0.41",
-        "Mobile App Logins": 16,
-        "AMB": "₹18,000",
-        "FD Amount": "₹22,000",
-        "Dormancy": "79 days",
-    }
-}
+    model = joblib.load(MODEL_PATH)
+    # opt-in: PERSONA_CACHE_SIZE=N remembers N predictions (dropped if model.pkl changes)
+    if CACHE_SIZE > 0:
+        model = CachedPersonaModel(model, PredictionCache(max_size=CACHE_SIZE),
+                                   model_path=MODEL_PATH, loader=joblib.load)
+    return model
+
+
+def load_version(path):
+    model = joblib.load(path)
+    # a fresh cache per registry version
+    return CachedPersonaModel(model, PredictionCache(max_size=CACHE_SIZE)) if CACHE_SIZE > 0 else model
+
+
+@st.cache_resource
+def load_registry_model():
+    # one background watcher per server process, shared by every session
+    return HotSwapModel(ModelRegistry(REGISTRY), REGISTRY_ALIAS, loader=load_version).start()
+
+
+if REGISTRY:
+    # bind one version for this whole rerun; a swap shows up on the next one
+    served = load_registry_model().current
+    model, model_version = served.model, served.version
+    model_path = ModelRegistry(REGISTRY).path(model_version)
+else:
+    model, model_version, model_path = load_model(), None, MODEL_PATH
 
 # ---------------------------------------------------------
 # APP HEADER
@@ -100,18 +82,28 @@ st.write(
 # ---------------------------------------------------------
 st.markdown("## 📌 Persona Archetypes Overview")
 
-cols = st.columns(4)
-for idx, (cluster_id, persona) in enumerate(PERSONA_DETAILS.items()):
-    facts = PERSONA_FACTS.get(cluster_id, {})
-    median_html = (
-        "<p style='margin:4px 0 2px; font-weight:600;'>Median Snapshot:</p>"
-        "<ul style='margin-left:-10px; font-size:0.80rem;'>"
-        + "".join([f"<li><b>{k}:</b> {v}</li>" for k, v in facts.items()])
-        + "</ul>"
-    )
+# Facts and card HTML are cached per model file signature (or registry
+# version): the medians are computed (or read from PROFILE_CACHE) once per
+# model version, and later reruns only re-emit the stored HTML.
+@st.cache_data(show_spinner="Profiling personas...")
+def persona_facts(model_signature, model_path, data_path, cache_path):
+    profiles = load_profiles(model_path, data_path, cache_path)
+    return profile_facts(profiles) if profiles is not None else PERSONA_FACTS
 
-    with cols[idx]:
-        st.markdown(
+
+@st.cache_data
+def persona_cards(model_signature, model_path, data_path, cache_path):
+    all_facts = persona_facts(model_signature, model_path, data_path, cache_path)
+    cards = []
+    for cluster_id, persona in PERSONA_DETAILS.items():
+        facts = all_facts.get(cluster_id, {})
+        median_html = (
+            "<p style='margin:4px 0 2px; font-weight:600;'>Median Snapshot:</p>"
+            "<ul style='margin-left:-10px; font-size:0.80rem;'>"
+            + "".join([f"<li><b>{k}:</b> {v}</li>" for k, v in facts.items()])
+            + "</ul>"
+        )
+        cards.append(
             f"""
             <div style="
                 border-radius: 14px;
@@ -124,12 +116,145 @@ for idx, (cluster_id, persona) in enumerate(PERSONA_DETAILS.items()):
                 <p style="font-size:0.85rem;">{persona.get("description","")}</p>
                 {median_html}
             </div>
-            """,
-            unsafe_allow_html=True,
+            """
         )
+    return cards
+
+
+model_signature = model_version or artifact_signature(MODEL_PATH)
+cards = persona_cards(model_signature, model_path, PROFILE_DATA, PROFILE_CACHE)
+cols = st.columns(4)
+for idx, card_html in enumerate(cards):
+    with cols[idx]:
+        st.markdown(card_html, unsafe_allow_html=True)
 
 st.markdown("---")
 
+# ---------------------------------------------------------
+# BULK UPLOAD MODE (chunked scoring of a CSV / Parquet file)
+# ---------------------------------------------------------
+# The upload is streamed through the model chunk by chunk and the enriched
+# rows go straight to a temp file; session state only keeps its path and
+# the summary. Once scored, the uploader is reset so the upload is released
+# before the output is offered for download.
+mode = st.sidebar.radio("Mode", ["Single customer", "Bulk upload"])
+
+if mode == "Bulk upload":
+    st.subheader("📂 Score a Customer File")
+
+    if "upload_key" not in st.session_state:
+        st.session_state["upload_key"] = 0
+    uploaded = st.file_uploader(
+        "Customer file (CSV or Parquet) with the model's feature columns",
+        type=["csv", "parquet"],
+        key=f"upload_{st.session_state['upload_key']}",
+    )
+
+    if uploaded is not None:
+        try:
+            columns = input_columns(uploaded)
+        except Exception as e:
+            columns = None
+            st.error(f"Could not read the file header. Details: {e}")
+
+        if columns is not None:
+            missing = [col for col in FEATURE_COLUMNS if col not in columns]
+            if missing:
+                st.error("Missing required columns: " + ", ".join(missing))
+            else:
+                extra = [col for col in columns if col not in FEATURE_COLUMNS]
+                if extra:
+                    st.caption("Passed through unchanged: " + ", ".join(extra))
+
+                if st.button("🚀 Score file"):
+                    fmt = file_format(uploaded)
+                    total_rows = None
+                    if fmt == "parquet":
+                        import pyarrow.parquet as pq
+
+                        total_rows = pq.ParquetFile(uploaded).metadata.num_rows
+                        uploaded.seek(0)
+                    bar = st.progress(0.0, text="Scoring...")
+
+                    def report(rows, elapsed):
+                        # CSV row count is unknown up front: use the bytes read
+                        if total_rows:
+                            done = rows / total_rows
+                        else:
+                            done = uploaded.tell() / max(uploaded.size, 1)
+                        bar.progress(min(done, 1.0),
+                                     text=f"{rows:,} rows scored ({rows / elapsed:,.0f} rows/sec)")
+
+                    suffix = ".parquet" if fmt == "parquet" else ".csv"
+                    fd, out_path = tempfile.mkstemp(suffix=suffix)
+                    os.close(fd)
+                    # only created if a row is rejected
+                    quarantine_path = out_path[:-len(suffix)] + "_rejected" + suffix
+                    try:
+                        stats = score_file(uploaded, out_path, model=model, chunksize=UPLOAD_CHUNKSIZE,
+                                           progress=report, quarantine_path=quarantine_path)
+                    except Exception as e:
+                        for path in (out_path, quarantine_path):
+                            if os.path.exists(path):
+                                os.remove(path)
+                        st.error(f"Scoring failed. Details: {e}")
+                    else:
+                        previous = st.session_state.get("bulk_result")
+                        if previous is not None:
+                            for path in (previous["path"], previous["quarantine_path"]):
+                                if path is not None and os.path.exists(path):
+                                    os.remove(path)
+                        base = os.path.splitext(uploaded.name)[0]
+                        st.session_state["bulk_result"] = {
+                            "path": out_path,
+                            "file_name": f"{base}_personas{suffix}",
+                            "quarantine_path": quarantine_path if stats["quarantined"] else None,
+                            "quarantine_file_name": f"{base}_rejected{suffix}",
+                            "stats": stats,
+                            "model_version": model_version,
+                        }
+                        st.session_state["upload_key"] += 1
+                        st.rerun()
+
+    result = st.session_state.get("bulk_result")
+    if result is not None:
+        stats = result["stats"]
+        st.success(
+            f"Scored {stats['rows']:,} rows in {stats['seconds']:.1f}s "
+            f"({stats['rows_per_sec']:,.0f} rows/sec)"
+            + (f" with model {result['model_version']}" if result["model_version"] else "")
+        )
+
+        st.markdown("### 📊 Persona Distribution")
+        summary = pd.DataFrame([
+            {
+                "Persona": f"{PERSONA_DETAILS[cid].get('icon', '')} {PERSONA_DETAILS[cid]['name']}",
+                "Customers": n,
+                "Share": f"{n / max(stats['rows'], 1):.1%}",
+            }
+            for cid, n in stats["persona_counts"].items()
+        ])
+        st.bar_chart(summary.set_index("Persona")["Customers"])
+        st.dataframe(summary, hide_index=True, use_container_width=True)
+
+        mime = "application/octet-stream" if result["path"].endswith(".parquet") else "text/csv"
+        with open(result["path"], "rb") as fh:
+            st.download_button("⬇️ Download scored file", data=fh,
+                               file_name=result["file_name"], mime=mime)
+
+        if result["quarantine_path"] is not None:
+            st.warning(f"{stats['quarantined']:,} rows failed validation and were not scored.")
+            st.dataframe(
+                pd.DataFrame(sorted(stats["validation_errors"].items(), key=lambda item: -item[1]),
+                             columns=["Problem", "Rows"]),
+                hide_index=True, use_container_width=True,
+            )
+            with open(result["quarantine_path"], "rb") as fh:
+                st.download_button("⬇️ Download rejected rows", data=fh,
+                                   file_name=result["quarantine_file_name"], mime=mime)
+
+    st.stop()
+
 # ---------------------------------------------------------
 # INPUT FORM
 # ---------------------------------------------------------
@@ -207,18 +332,26 @@ if submit:
         "FD_Amount": FD_Amount,
     }], columns=FEATURE_COLUMNS)
 
-    try:
-        cid = int(model.predict(input_df)[0])
-        st.session_state["cluster_id"] = cid
-    except Exception as e:
-        # If prediction fails, do NOT reuse old value
+    checked = validate_frame(input_df)
+    if len(checked.quarantine):
+        # name the offending fields instead of a generic predict() failure
         st.session_state["cluster_id"] = None
-        st.error(f"Prediction failed. Please check inputs. Details: {e}")
+        st.error("Please check inputs: " + checked.quarantine["validation_errors"].iloc[0])
+    else:
+        try:
+            cid = int(model.predict(checked.valid[FEATURE_COLUMNS])[0])
+            st.session_state["cluster_id"] = cid
+            st.session_state["model_version"] = model_version
+        except Exception as e:
+            # If prediction fails, do NOT reuse old value
+            st.session_state["cluster_id"] = None
+            st.error(f"Prediction failed. Please check inputs. Details: {e}")
 
 # ---------------------------------------------------------
 # RESULT DISPLAY (uses latest cluster_id only)
 # ---------------------------------------------------------
 cid = st.session_state.get("cluster_id", None)
+version = st.session_state.get("model_version")
 
 if cid is not None:
     persona = PERSONA_DETAILS.get(cid, {})
@@ -236,6 +369,7 @@ if cid is not None:
         ">
             <h2>{persona.get("icon","")} Persona: {persona.get("name","")}</h2>
             <p><b>Cluster ID:</b> {cid}</p>
+            {f"<p><b>Model version:</b> {version}</p>" if version else ""}
         </div>
         """,
         unsafe_allow_html=True,
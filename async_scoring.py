@@ -0,0 +1,259 @@
+# async_scoring.py
+# ---------------------------------------------------------
+# ASYNC SCORING (bounded executor, priority lanes, backpressure)
+# ---------------------------------------------------------
+# Usage (inside a running event loop):
+#   scorer = AsyncScorer(predict_records, workers=2)
+#   scorer.start()
+#   result = await scorer.submit(records, lane="interactive")
+#   result.labels, result.queue_seconds, result.exec_seconds
+#   await scorer.submit(records, lane="bulk", fn=other_fn)   # any row-wise scorer
+#   await scorer.stop()
+#
+# `predict_fn(records) -> labels` runs on a bounded thread or process pool
+# and never on the event loop. Exactly `workers` jobs run at a time; the
+# rest wait in per-lane queues so that:
+#   - lanes are served in priority order ("interactive" before "bulk"),
+#     with one lower-lane job let through after `max_consecutive` higher
+#     ones so bulk work still progresses under constant interactive load
+#   - bulk requests are split into `bulk_chunk_rows` jobs, so a single
+#     interactive lookup waits for at most one chunk, not a whole file
+#   - each lane holds at most `max_queue_rows` waiting rows; beyond that
+#     submit() raises QueueFullError immediately (the caller sheds load);
+#     a request larger than the whole limit raises RequestTooLargeError,
+#     since no amount of waiting would let it in
+# Time spent waiting and time spent executing are measured separately and
+# recorded per lane in a profiling.HistogramSink ("queue/<lane>", "exec/<lane>").
+
+import asyncio
+import multiprocessing
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from profiling import HistogramSink
+
+LANES = ("interactive", "bulk")
+DEFAULT_MAX_QUEUE_ROWS = {"interactive": 4096, "bulk": 200_000}
+
+ScoreResult = namedtuple("ScoreResult", ["labels", "queue_seconds", "exec_seconds"])
+
+
+class QueueFullError(RuntimeError):
+    """Raised by AsyncScorer.submit when a lane's queue limit is reached."""
+
+
+class RequestTooLargeError(ValueError):
+    """Raised by AsyncScorer.submit for more rows than a lane can ever hold."""
+
+
+class _Job:
+    __slots__ = ("records", "fn", "future", "enqueued", "started", "finished")
+
+    def __init__(self, records, fn, future):
+        self.records = records
+        self.fn = fn
+        self.future = future
+        self.enqueued = time.perf_counter()
+        self.started = None
+        self.finished = None
+
+
+class AsyncScorer:
+    """
+    Awaitable scoring on a bounded executor with priority lanes.
+
+    Parameters
+    ----------
+    predict_fn : callable
+        predict_fn(records) -> sequence of cluster ids. Must be picklable
+        (a module-level function) when executor="process".
+    workers : int (default=1)
+        Size of the executor, i.e. jobs executing at once.
+    executor : {"thread", "process"} (default="thread")
+    max_queue_rows : dict or None
+        Waiting-row limit per lane (default DEFAULT_MAX_QUEUE_ROWS).
+    bulk_chunk_rows : int (default=1024)
+        Bulk requests are scored in jobs of at most this many rows.
+    max_consecutive : int (default=8)
+        Higher-lane jobs dispatched in a row before a waiting lower-lane
+        job gets a turn.
+    initializer, initargs :
+        Passed to the executor (e.g. to load the model once per process).
+    sinks : list or None
+        Receive record(stage, seconds, rows, out_bytes, alloc_bytes) for
+        every job; a HistogramSink is always kept for `stats()`.
+    """
+
+    def __init__(self, predict_fn, workers=1, executor="thread", max_queue_rows=None,
+                 bulk_chunk_rows=1024, max_consecutive=8, initializer=None, initargs=(), sinks=None):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"executor must be 'thread' or 'process', got {executor!r}")
+        self.predict_fn = predict_fn
+        self.workers = workers
+        self.executor_kind = executor
+        self.max_queue_rows = dict(DEFAULT_MAX_QUEUE_ROWS, **(max_queue_rows or {}))
+        self.bulk_chunk_rows = bulk_chunk_rows
+        self.max_consecutive = max_consecutive
+        self.initializer = initializer
+        self.initargs = initargs
+        self.histograms = HistogramSink()
+        self.sinks = [self.histograms] + list(sinks or [])
+        self._queues = {lane: deque() for lane in LANES}
+        self._queued_rows = dict.fromkeys(LANES, 0)
+        self._counters = {lane: {"submitted": 0, "rejected": 0, "too_large": 0, "completed": 0, "failed": 0, "rows": 0}
+                          for lane in LANES}
+        self._running = 0
+        self._streak = 0
+        self._executor = None
+        self._wakeup = None
+        self._tasks = []
+
+    # ---------------- lifecycle ----------------
+    def start(self):
+        if self.executor_kind == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, initializer=self.initializer,
+                                                initargs=self.initargs)
+        else:
+            # spawn, not fork: a server process already runs threads (and OpenMP
+            # pools after its first predict) that a forked child would deadlock on
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer,
+                                                 initargs=self.initargs,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        self._wakeup = asyncio.Condition()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        for queue in self._queues.values():
+            while queue:
+                job = queue.popleft()
+                if not job.future.done():
+                    job.future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    # ---------------- submission ----------------
+    async def submit(self, records, lane="interactive", fn=None):
+        """
+        Score `records` (list of feature dicts); returns a ScoreResult.
+
+        `fn` replaces `predict_fn` for this request. It must return one
+        array row per record; `labels` is the concatenation of its outputs.
+        """
+        if lane not in self._queues:
+            raise ValueError(f"Unknown lane {lane!r}; expected one of {LANES}.")
+        counters = self._counters[lane]
+        n = len(records)
+        if n > self.max_queue_rows[lane]:
+            counters["too_large"] += 1
+            raise RequestTooLargeError(
+                f"{n} rows exceed the {lane} lane limit of {self.max_queue_rows[lane]}; split the request."
+            )
+        if self._queued_rows[lane] + n > self.max_queue_rows[lane]:
+            counters["rejected"] += 1
+            raise QueueFullError(
+                f"{lane} queue is full ({self._queued_rows[lane]} rows waiting, "
+                f"limit {self.max_queue_rows[lane]})."
+            )
+        counters["submitted"] += 1
+        if n == 0:
+            return ScoreResult(np.empty(0, dtype=np.int32), 0.0, 0.0)
+
+        loop = asyncio.get_running_loop()
+        size = self.bulk_chunk_rows if lane != LANES[0] else n
+        fn = fn or self.predict_fn
+        jobs = [_Job(records[i:i + size], fn, loop.create_future()) for i in range(0, n, size)]
+        async with self._wakeup:
+            self._queues[lane].extend(jobs)
+            self._queued_rows[lane] += n
+            self._wakeup.notify(len(jobs))
+        try:
+            parts = await asyncio.gather(*[job.future for job in jobs])
+        except BaseException:
+            for job in jobs:
+                job.future.cancel()
+            raise
+        exec_seconds = sum(job.finished - job.started for job in jobs)
+        total = max(job.finished for job in jobs) - jobs[0].enqueued
+        counters["rows"] += n
+        return ScoreResult(np.concatenate([np.asarray(p) for p in parts]),
+                           max(total - exec_seconds, 0.0), exec_seconds)
+
+    # ---------------- dispatch ----------------
+    def _pick_lane(self):
+        waiting = [lane for lane in LANES if self._queues[lane]]
+        if not waiting:
+            return None
+        if len(waiting) > 1 and self._streak >= self.max_consecutive:
+            self._streak = 0
+            return waiting[1]
+        self._streak = self._streak + 1 if waiting[0] == LANES[0] else 0
+        return waiting[0]
+
+    async def _next_job(self):
+        async with self._wakeup:
+            while True:
+                lane = self._pick_lane()
+                if lane is not None:
+                    job = self._queues[lane].popleft()
+                    self._queued_rows[lane] -= len(job.records)
+                    if not job.future.done():
+                        return lane, job
+                    continue
+                await self._wakeup.wait()
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lane, job = await self._next_job()
+            job.started = time.perf_counter()
+            self._running += 1
+            try:
+                labels = await loop.run_in_executor(self._executor, job.fn, job.records)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self._counters[lane]["failed"] += 1
+                if not job.future.done():
+                    job.future.set_exception(exc)
+                continue
+            finally:
+                self._running -= 1
+                job.finished = time.perf_counter()
+            self._counters[lane]["completed"] += 1
+            rows = len(job.records)
+            for sink in self.sinks:
+                sink.record(f"queue/{lane}", job.started - job.enqueued, rows, 0, None)
+                sink.record(f"exec/{lane}", job.finished - job.started, rows, 0, None)
+            if not job.future.done():
+                job.future.set_result(labels)
+
+    # ---------------- introspection ----------------
+    def stats(self):
+        histograms = self.histograms.snapshot()
+        lanes = {}
+        for lane in LANES:
+            entry = dict(self._counters[lane])
+            entry["queued_jobs"] = len(self._queues[lane])
+            entry["queued_rows"] = self._queued_rows[lane]
+            entry["max_queue_rows"] = self.max_queue_rows[lane]
+            for kind in ("queue", "exec"):
+                hist = histograms.get(f"{kind}/{lane}")
+                if hist and hist["count"]:
+                    entry[f"{kind}_mean_ms"] = hist["seconds_sum"] / hist["count"] * 1000
+                    entry[f"{kind}_p99_ms"] = self.histograms.quantile(f"{kind}/{lane}", 0.99) * 1000
+            lanes[lane] = entry
+        return {"workers": self.workers, "executor": self.executor_kind,
+                "running": self._running, "lanes": lanes}
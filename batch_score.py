@@ -0,0 +1,677 @@
+# batch_score.py
+# ---------------------------------------------------------
+# BATCH SCORING ENGINE (chunked, vectorized persona assignment)
+# ---------------------------------------------------------
+# Usage:
+#   python batch_score.py customers.csv personas.csv --chunksize 200000
+#   python batch_score.py customers.parquet personas.parquet
+#   python batch_score.py customers.csv personas.csv --workers 16
+#   python batch_score.py customers.csv personas.csv --dedupe --cache-size 500000
+#   python batch_score.py customers.csv personas.csv --drift-report drift.json
+#   python batch_score.py customers.csv personas.csv --affinity --top-k 2
+#   python batch_score.py customers.csv personas.csv --quarantine rejected.csv
+#
+# The input is streamed in bounded-size chunks and `model.predict` is
+# called once per chunk, so memory stays flat regardless of file size.
+# Parquet input is read column-projected, batch by batch, into compact
+# dtypes (see columnar_io); `--passthrough id` reads just id + FEATURE_COLUMNS.
+# With --workers > 1 the chunks are fanned out to a process pool in which
+# every worker loads the model once at start-up.
+# With --validate / --quarantine, rows that fail input_validation are set
+# aside (with the reasons) instead of failing the whole chunk.
+
+import argparse
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+from compiled_model import CompiledPersonaModel
+from input_validation import ERRORS_COLUMN, ROW_COLUMN, validate_frame
+from model_artifact import is_artifact, load_artifact
+from persona_affinity import PersonaAffinity
+from persona_config import CATEGORICAL_COLUMNS, FEATURE_COLUMNS, FEATURE_RANGES, PERSONA_DETAILS
+from prediction_cache import CachedPersonaModel, PredictionCache
+
+DEFAULT_MODEL_PATH = "model.pkl"
+DEFAULT_CHUNKSIZE = 100_000
+# rows a Parquet ChunkWriter may hold back while a column has no value yet
+DEFAULT_PENDING_ROWS = 10 * DEFAULT_CHUNKSIZE
+
+CLUSTER_COLUMN = "cluster_id"
+PERSONA_COLUMN = "persona_name"
+
+# cluster id -> persona name, as an array so labels can index it directly
+PERSONA_NAMES = np.array(
+    [PERSONA_DETAILS[cid]["name"] for cid in sorted(PERSONA_DETAILS)], dtype=object
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------
+# MODEL
+# ---------------------------------------------------------
+def load_model(path=DEFAULT_MODEL_PATH, compiled=False):
+    """
+    Load the persona Pipeline; with compiled=True wrap it in the NumPy fast
+    path. `path` may also be a slim artifact directory (see model_artifact).
+    """
+    if is_artifact(path):
+        return load_artifact(path, compiled=compiled)
+    model = joblib.load(path)
+    if compiled:
+        model = CompiledPersonaModel.from_pipeline(model)
+    return model
+
+
+def wrap_model(model, dedupe=False, cache_size=0):
+    """
+    Score duplicate rows once: dedupe=True collapses repeats within a chunk,
+    cache_size > 0 additionally remembers labels across chunks (LRU).
+    """
+    if cache_size:
+        return CachedPersonaModel(model, PredictionCache(max_size=cache_size))
+    if dedupe:
+        return CachedPersonaModel(model)
+    return model
+
+
+# ---------------------------------------------------------
+# INPUT / OUTPUT
+# ---------------------------------------------------------
+def file_format(path):
+    """
+    Return 'parquet' or 'csv' based on the file extension. `path` may also
+    be a file object with a `name` (e.g. an upload).
+    """
+    path = getattr(path, "name", path)
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext in (".csv", ".txt", ".gz", ".bz2", ".zip"):
+        return "csv"
+    raise ValueError(f"Unsupported file type '{ext}' for {path!r} (expected CSV or Parquet).")
+
+
+def input_columns(path):
+    """Column names of a CSV or Parquet input, read from its header / schema only."""
+    if file_format(path) == "parquet":
+        import pyarrow.parquet as pq
+
+        columns = pq.read_schema(path).names
+    else:
+        columns = pd.read_csv(path, nrows=0).columns.tolist()
+    if hasattr(path, "seek"):
+        path.seek(0)
+    return columns
+
+
+# coded features whose encoder expects float values (City_Tier's imputer fills
+# 0.0 and cannot write it into an int64 column); Parquet gets float32 in columnar_io
+FLOAT_CODE_COLUMNS = [
+    col for col in FEATURE_COLUMNS
+    if isinstance(FEATURE_RANGES[col], list) and any(isinstance(option, float) for option in FEATURE_RANGES[col])
+]
+
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE, columns=None, float_precision=None):
+    """
+    Yield DataFrames of at most `chunksize` rows from a CSV or Parquet file.
+    Categorical features are read as pandas Categoricals and float-coded
+    features (City_Tier) as floats; Parquet numerics are also narrowed where
+    lossless (columnar_io.compact_batch). `float_precision` goes to
+    pd.read_csv: "round_trip" parses CSV floats to exactly the values that
+    were written (slower; the default parser can be 1 ulp off).
+    """
+    if file_format(path) == "parquet":
+        from columnar_io import iter_parquet_frames
+
+        yield from iter_parquet_frames(path, chunksize=chunksize, columns=columns)
+    else:
+        dtype = {col: "category" for col in CATEGORICAL_COLUMNS}
+        dtype.update({col: "float64" for col in FLOAT_CODE_COLUMNS})
+        with pd.read_csv(path, chunksize=chunksize, usecols=columns, dtype=dtype,
+                         float_precision=float_precision) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+class ChunkWriter:
+    """
+    Append scored chunks to a CSV or Parquet file one at a time.
+
+    The Parquet schema is fixed when the file is opened; later chunks are
+    cast to it so that per-chunk dtype drift (e.g. int vs float) does not
+    break the file. Columns named in `schema` (e.g. the input file's Arrow
+    schema) are written with that type, so compact read dtypes never leak
+    into the output. Any other column that is all null so far (an empty CSV
+    column reads as float64 NaN) has no type yet: chunks are held back
+    until it gets a value and takes that value's type, for at most
+    `max_pending_rows` rows. Columns still empty then are written as string
+    and logged. Leaving the `with` block on an exception removes the
+    partial file.
+    """
+
+    def __init__(self, path, schema=None, max_pending_rows=DEFAULT_PENDING_ROWS):
+        self.path = path
+        self.format = file_format(path)
+        self.schema = schema
+        self.max_pending_rows = max_pending_rows
+        self._handle = None
+        self._writer = None
+        self._pending = []
+        self._pending_rows = 0
+        self._untyped = set()
+
+    def _untyped_columns(self, table):
+        import pyarrow as pa
+
+        typed = set(self.schema.names) if self.schema is not None else set()
+        untyped = set()
+        for name in table.schema.names:
+            if name in typed or (name in FEATURE_COLUMNS and name not in CATEGORICAL_COLUMNS):
+                continue
+            column = table.column(name)
+            if column.type == pa.null() or (len(table) and column.null_count == len(table)):
+                untyped.add(name)
+        return untyped
+
+    def _open(self):
+        """Fix the schema from the held-back chunks, open the file and write them."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        first = next((table for table in self._pending if len(table)), self._pending[0])
+        schema = first.schema
+        stringified = []
+        for name in sorted(self._untyped_columns(first)):
+            # the first chunk with a value decides the type
+            field = next(
+                (table.schema.field(name) for table in self._pending if table.column(name).null_count < len(table)),
+                None,
+            )
+            if field is None:
+                field = pa.field(name, pa.string())
+                stringified.append(name)
+            schema = schema.set(schema.get_field_index(name), field)
+        if self.schema is not None:
+            for name in self.schema.names:
+                if name in schema.names:
+                    schema = schema.set(schema.get_field_index(name), self.schema.field(name))
+        if self.schema is not None or schema != first.schema:
+            # the pandas metadata would still describe the read dtypes
+            schema = schema.remove_metadata()
+        if stringified:
+            logger.warning("%s: %s had no values in the first %d rows and are written as string",
+                           self.path, stringified, self._pending_rows)
+        self._writer = pq.ParquetWriter(self.path, schema)
+        for table in self._pending:
+            self._writer.write_table(table.cast(schema))
+        self._pending = []
+        self._pending_rows = 0
+        self._untyped = set()
+
+    def write(self, df):
+        if self.format == "parquet":
+            import pyarrow as pa
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is not None:
+                self._writer.write_table(table.cast(self._writer.schema))
+                return
+            self._pending.append(table)
+            if len(table):
+                untyped = self._untyped_columns(table)
+                self._untyped = untyped if not self._pending_rows else self._untyped & untyped
+                self._pending_rows += len(table)
+                if not self._untyped or self._pending_rows >= self.max_pending_rows:
+                    self._open()
+        else:
+            header = self._handle is None
+            if self._handle is None:
+                self._handle = open(self.path, "w", newline="", encoding="utf-8")
+            df.to_csv(self._handle, header=header, index=False)
+
+    def close(self):
+        if self._pending:
+            self._open()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def abort(self):
+        """Close and delete whatever was written so far."""
+        self._pending = []
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# ---------------------------------------------------------
+# SCORING
+# ---------------------------------------------------------
+def check_columns(df):
+    missing = [col for col in FEATURE_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Input is missing required feature columns: {missing}")
+
+
+def score_frame(model, df):
+    """Return the cluster ids for every row of `df` with a single `predict` call."""
+    check_columns(df)
+    return np.asarray(model.predict(df[FEATURE_COLUMNS]))
+
+
+def score_affinity(affinity, df, top_k=None):
+    """Cluster ids plus the PersonaAffinity.columns() of every row of `df`."""
+    check_columns(df)
+    result = affinity.score(df[FEATURE_COLUMNS])
+    return result.labels, affinity.columns(result, top_k)
+
+
+def affinity_top_k(affinity, df, top_k):
+    """(n, top_k, 3) array of [cluster_id, affinity, distance], closest persona first."""
+    ids, affinities, distances = affinity.top_k(affinity.score(df), top_k)
+    return np.stack([ids, affinities, distances], axis=2)
+
+
+def attach_personas(df, labels, passthrough=None, extra=None):
+    """
+    Build the output frame: the requested passthrough columns (all input
+    columns when None) followed by the cluster id, persona name and any
+    `extra` columns (e.g. persona affinities).
+    """
+    out = df if passthrough is None else df[list(passthrough)]
+    out = out.assign(**{
+        CLUSTER_COLUMN: labels,
+        # categorical: one code per row, written dictionary-encoded to Parquet
+        PERSONA_COLUMN: pd.Categorical.from_codes(labels, PERSONA_NAMES),
+        **(extra or {}),
+    })
+    return out
+
+
+def score_chunks(model, chunks, passthrough=None, monitor=None, affinity=False, top_k=None):
+    """
+    Score an iterable of DataFrame chunks, yielding enriched chunks in order.
+    Every chunk and its labels are also fed to `monitor` (a DriftMonitor).
+    With `affinity`, distance/affinity columns (see score_affinity) are added.
+    """
+    scorer = PersonaAffinity.from_model(model) if affinity else None
+    for chunk in chunks:
+        extra = None
+        if scorer is not None:
+            labels, extra = score_affinity(scorer, chunk, top_k)
+        else:
+            labels = score_frame(model, chunk)
+        if monitor is not None:
+            monitor.update(chunk, labels)
+        yield attach_personas(chunk, labels, passthrough, extra)
+
+
+def validate_chunks(chunks, stats, quarantine=None):
+    """
+    Yield the rows of every chunk that pass validate_frame (coerced). The
+    rejected rows are written to `quarantine` (a ChunkWriter) if given, and
+    counted in stats["quarantined"] and stats["validation_errors"].
+    """
+    offset = 0
+    for chunk in chunks:
+        result = validate_frame(chunk, row_offset=offset)
+        offset += len(chunk)
+        if len(result.quarantine):
+            stats["quarantined"] += len(result.quarantine)
+            for message, n in result.error_counts.items():
+                stats["validation_errors"][message] = stats["validation_errors"].get(message, 0) + n
+            if quarantine is not None:
+                quarantine.write(result.quarantine)
+        if len(result.valid):
+            yield result.valid
+
+
+def quarantine_schema(source_schema=None):
+    """
+    Arrow schema of a Parquet quarantine file: input_row int64, the reasons
+    and the (textual) features as string, other columns as in the source.
+    Without it, a column that is all null in the first rejected chunk would
+    fix the type for the whole file.
+    """
+    import pyarrow as pa
+
+    fields = [pa.field(ROW_COLUMN, pa.int64()), pa.field(ERRORS_COLUMN, pa.string())]
+    fields += [pa.field(col, pa.string()) for col in FEATURE_COLUMNS]
+    if source_schema is not None:
+        taken = {field.name for field in fields}
+        fields += [field for field in source_schema if field.name not in taken]
+    return pa.schema(fields)
+
+
+# ---------------------------------------------------------
+# PARALLEL SCORING (process pool, one model per worker)
+# ---------------------------------------------------------
+_worker_model = None
+_worker_limits = None
+_worker_affinity = None
+
+
+def _init_worker(model_path, compiled=False, dedupe=False, cache_size=0):
+    # Each worker owns one core: keep BLAS/OpenMP in KMeans.predict from
+    # oversubscribing the box, and load the model exactly once.
+    global _worker_model, _worker_limits
+    _worker_limits = threadpool_limits(limits=1)
+    _worker_model = wrap_model(load_model(model_path, compiled=compiled), dedupe, cache_size)
+
+
+def _get_worker_affinity():
+    global _worker_affinity
+    if _worker_affinity is None:
+        _worker_affinity = PersonaAffinity.from_model(_worker_model)
+    return _worker_affinity
+
+
+def _predict_partition(features, affinity=False, top_k=None):
+    if affinity:
+        return score_affinity(_get_worker_affinity(), features, top_k)
+    return score_frame(_worker_model, features)
+
+
+def _predict_records(records):
+    # list-of-dicts entry points for the API's process executor
+    return score_frame(_worker_model, pd.DataFrame.from_records(records, columns=FEATURE_COLUMNS))
+
+
+def _affinity_records(records, top_k):
+    affinity = _get_worker_affinity()
+    return affinity_top_k(affinity, pd.DataFrame.from_records(records, columns=FEATURE_COLUMNS), top_k)
+
+
+def parallel_score_chunks(chunks, model_path=DEFAULT_MODEL_PATH, workers=None,
+                          passthrough=None, max_pending=None, compiled=False,
+                          dedupe=False, cache_size=0, monitor=None, affinity=False, top_k=None):
+    """
+    Score DataFrame chunks across a pool of worker processes.
+
+    Only the FEATURE_COLUMNS of each chunk are shipped to the workers and
+    only the labels come back; the model itself is never pickled per task.
+    Results are yielded in input order, and at most `max_pending` chunks
+    (default 2 x workers) are in flight so memory stays bounded. With
+    `cache_size`, every worker keeps its own cache. `monitor` is updated
+    in this process as results arrive.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path, compiled, dedupe, cache_size)) as pool:
+        for chunk in chunks:
+            check_columns(chunk)
+            pending.append((chunk, pool.submit(_predict_partition, chunk[FEATURE_COLUMNS], affinity, top_k)))
+            if len(pending) >= max_pending:
+                yield _collect(pending, passthrough, monitor)
+        while pending:
+            yield _collect(pending, passthrough, monitor)
+
+
+def _collect(pending, passthrough, monitor):
+    done_chunk, future = pending.popleft()
+    labels, extra = future.result(), None
+    if isinstance(labels, tuple):
+        labels, extra = labels
+    if monitor is not None:
+        monitor.update(done_chunk, labels)
+    return attach_personas(done_chunk, labels, passthrough, extra)
+
+
+def score_file(input_path, output_path, model=None, chunksize=DEFAULT_CHUNKSIZE,
+               passthrough=None, progress=None, workers=1,
+               model_path=DEFAULT_MODEL_PATH, compiled=False, dedupe=False, cache_size=0,
+               monitor=None, affinity=False, top_k=None, validate=False, quarantine_path=None):
+    """
+    Stream `input_path` through the persona model and write `output_path`.
+
+    Parameters
+    ----------
+    input_path, output_path : str
+        CSV or Parquet files (format taken from the extension). The input
+        may also be a named file object, e.g. an upload.
+    model : fitted Pipeline or None
+        Loaded from `model_path` when None. Ignored when workers > 1.
+    chunksize : int
+        Maximum rows held in memory (and passed to `predict`) at once.
+    passthrough : list or None
+        Input columns to copy to the output. None keeps all of them.
+    progress : callable or None
+        Called as progress(rows_done, elapsed_seconds) after every chunk.
+    workers : int
+        Number of scoring processes. 1 scores in-process; more fans the
+        chunks out to a process pool that loads `model_path` per worker.
+    model_path : str
+        Model artifact to load when `model` is None or workers > 1.
+    compiled : bool
+        Score with CompiledPersonaModel (pure NumPy) instead of the Pipeline.
+    dedupe : bool
+        Score each distinct feature vector of a chunk only once.
+    cache_size : int
+        Also keep up to this many labels across chunks (implies dedupe).
+    monitor : DriftMonitor or None
+        Updated with every scored chunk (same pass, no re-read).
+    affinity : bool
+        Add the distance to and affinity for every persona (see
+        persona_affinity). Every row is scored; dedupe/cache do not apply.
+    top_k : int or None
+        With `affinity`, only write the k closest personas per customer.
+    validate : bool
+        Check and coerce every chunk with input_validation first; rows
+        that fail are left out of the output instead of failing the run.
+    quarantine_path : str or None
+        Write the rejected rows, their input position and the reasons
+        here (CSV or Parquet; implies `validate`). Only created when a
+        row is rejected.
+
+    Returns
+    -------
+    dict with rows, chunks, seconds, rows_per_sec and persona_counts
+    ({cluster_id: rows}), plus the cache counters under "cache" when
+    scoring in-process with a cache, and quarantined / validation_errors
+    when validating.
+    """
+    if affinity and (dedupe or cache_size):
+        raise ValueError("affinity scoring does not support dedupe / cache_size.")
+    if workers == 1:
+        if model is None:
+            model = load_model(model_path, compiled=compiled)
+        model = wrap_model(model, dedupe, cache_size)
+
+    columns = None
+    if passthrough is not None:
+        columns = list(dict.fromkeys(list(passthrough) + FEATURE_COLUMNS))
+
+    source_schema = None
+    if file_format(input_path) == "parquet":
+        import pyarrow.parquet as pq
+
+        source_schema = pq.read_schema(input_path)
+
+    validate = validate or quarantine_path is not None
+    validation = {"quarantined": 0, "validation_errors": {}}
+    rows = 0
+    n_chunks = 0
+    counts = np.zeros(len(PERSONA_NAMES), dtype=np.int64)
+    quarantine = None
+    if quarantine_path:
+        schema = quarantine_schema(source_schema) if file_format(quarantine_path) == "parquet" else None
+        quarantine = ChunkWriter(quarantine_path, schema=schema)
+    start = time.perf_counter()
+    try:
+        with ChunkWriter(output_path, schema=source_schema) as writer:
+            chunks = iter_chunks(input_path, chunksize=chunksize, columns=columns)
+            if validate:
+                chunks = validate_chunks(chunks, validation, quarantine)
+            if workers == 1:
+                scored_chunks = score_chunks(model, chunks, passthrough, monitor, affinity, top_k)
+            else:
+                scored_chunks = parallel_score_chunks(
+                    chunks, model_path=model_path, workers=workers, passthrough=passthrough,
+                    compiled=compiled, dedupe=dedupe, cache_size=cache_size, monitor=monitor,
+                    affinity=affinity, top_k=top_k,
+                )
+            for scored in scored_chunks:
+                writer.write(scored)
+                rows += len(scored)
+                n_chunks += 1
+                counts += np.bincount(scored[CLUSTER_COLUMN], minlength=len(counts))
+                if progress is not None:
+                    progress(rows, time.perf_counter() - start)
+    except BaseException:
+        if quarantine is not None:
+            quarantine.abort()
+        raise
+    if quarantine is not None:
+        quarantine.close()
+    seconds = time.perf_counter() - start
+
+    stats = {
+        "rows": rows,
+        "chunks": n_chunks,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds > 0 else float("nan"),
+        "persona_counts": {cid: int(n) for cid, n in enumerate(counts)},
+    }
+    if workers == 1 and getattr(model, "cache", None) is not None:
+        stats["cache"] = model.cache.stats()
+    if validate:
+        stats.update(validation)
+    return stats
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def build_parser():
+    parser = argparse.ArgumentParser(description="Batch-score customers into personas.")
+    parser.add_argument("input", help="Input CSV or Parquet file with FEATURE_COLUMNS.")
+    parser.add_argument("output", help="Output CSV or Parquet file.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to model.pkl.")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="Rows per chunk (bounds memory use).")
+    parser.add_argument("--passthrough", nargs="*", default=None,
+                        help="Input columns to keep in the output (default: all).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Scoring processes (0 = one per CPU core).")
+    parser.add_argument("--compiled", action="store_true",
+                        help="Use the pure-NumPy compiled predictor instead of the sklearn Pipeline.")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Score duplicate feature rows within a chunk only once.")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="Remember up to N labels across chunks (per worker; implies --dedupe).")
+    parser.add_argument("--drift-report",
+                        help="Write a feature-drift / persona-mix report (JSON) for the input.")
+    parser.add_argument("--drift-reference",
+                        help="Reference profile for --drift-report (default: the model itself).")
+    parser.add_argument("--affinity", action="store_true",
+                        help="Add distance_<id> / affinity_<id> columns for every persona.")
+    parser.add_argument("--top-k", type=int, default=None,
+                        help="With --affinity, only the K closest personas per customer (implies --affinity).")
+    parser.add_argument("--validate", action="store_true",
+                        help="Check dtypes, ranges and categories first; skip rows that fail.")
+    parser.add_argument("--quarantine",
+                        help="Write rows that fail validation (with reasons) here (implies --validate).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Report time per pipeline stage (single process, sklearn Pipeline only).")
+    return parser
+
+
+def print_stage_report(sink):
+    """Per-stage totals from a profiling.HistogramSink, slowest first."""
+    snapshot = sink.snapshot()
+    total = snapshot.get("pipeline", {}).get("seconds_sum") or sum(
+        entry["seconds_sum"] for entry in snapshot.values()
+    )
+    print(f"{'stage':<14}{'calls':>7}{'seconds':>10}{'share':>8}{'rows/sec':>14}")
+    for stage, entry in sorted(snapshot.items(), key=lambda item: -item[1]["seconds_sum"]):
+        seconds = entry["seconds_sum"]
+        rate = entry["rows"] / seconds if seconds > 0 else float("nan")
+        print(f"{stage:<14}{entry['count']:>7}{seconds:>10.2f}{seconds / total:>8.1%}{rate:>14,.0f}")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+    affinity = args.affinity or args.top_k is not None
+    if affinity and (args.dedupe or args.cache_size):
+        raise SystemExit("--affinity / --top-k score every row; drop --dedupe and --cache-size.")
+    model = load_model(args.model, compiled=args.compiled) if workers == 1 else None
+    stage_sink = None
+    if args.profile:
+        if model is None or args.compiled:
+            raise SystemExit("--profile needs --workers 1 and the sklearn Pipeline (no --compiled).")
+        from profiling import HistogramSink, StageProfiler, instrument
+
+        stage_sink = HistogramSink()
+        instrument(model, StageProfiler([stage_sink]))
+
+    monitor = None
+    if args.drift_report:
+        from drift_monitor import DriftMonitor, load_reference
+
+        reference = load_reference(args.drift_reference) if args.drift_reference else None
+        monitor = DriftMonitor(model if model is not None else load_model(args.model), reference)
+
+    def report(rows, elapsed):
+        print(f"  {rows:,} rows  ({rows / elapsed:,.0f} rows/sec)", flush=True)
+
+    stats = score_file(
+        args.input, args.output, model=model, chunksize=args.chunksize,
+        passthrough=args.passthrough, progress=report,
+        workers=workers, model_path=args.model, compiled=args.compiled,
+        dedupe=args.dedupe, cache_size=args.cache_size, monitor=monitor,
+        affinity=affinity, top_k=args.top_k, validate=args.validate, quarantine_path=args.quarantine,
+    )
+    print(
+        f"Scored {stats['rows']:,} rows in {stats['chunks']} chunks, "
+        f"{stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/sec) -> {args.output}"
+    )
+    if "cache" in stats:
+        cache = stats["cache"]
+        print(f"Cache: {cache['hits']:,} hits, {cache['misses']:,} misses, "
+              f"{cache['evictions']:,} evictions")
+    if stats.get("quarantined"):
+        target = f" -> {args.quarantine}" if args.quarantine else ""
+        print(f"Quarantined {stats['quarantined']:,} rows{target}")
+        for message, n in sorted(stats["validation_errors"].items(), key=lambda item: -item[1]):
+            print(f"  {n:>9,}  {message}")
+    if stage_sink is not None:
+        print_stage_report(stage_sink)
+    if monitor is not None:
+        drift = monitor.report()
+        with open(args.drift_report, "w", encoding="utf-8") as fh:
+            json.dump(drift, fh, indent=2)
+        for alert in drift["alerts"]:
+            print(f"  DRIFT {alert}")
+        print(f"Drift report -> {args.drift_report}")
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+# benchmark.py
+# ---------------------------------------------------------
+# BENCHMARK SUITE (throughput, latency and per-step cost of model.pkl)
+# ---------------------------------------------------------
+# Usage:
+#   python benchmark.py --output bench.json
+#   python benchmark.py --sizes 1 100 10000 --paths pipeline compiled --output bench.json
+#   python benchmark.py --output new.json --compare bench.json
+#
+# Customers are drawn uniformly from FEATURE_RANGES (the app.py form
+# bounds) with a fixed seed, so runs on different commits score identical
+# data. Two measurements are taken:
+#   end_to_end - predict() latency percentiles and rows/sec per batch size
+#                and scoring path (sklearn Pipeline, compiled NumPy model,
+#                compiled predict_one for single rows)
+#   steps      - time and peak allocation of every fitted step: each
+#                ColumnTransformer branch (trf1-trf5) and step, the
+#                ColumnTransformer's own dispatch/hstack overhead and
+#                KMeans.predict
+# The JSON report carries the environment (git commit, library versions,
+# CPU count) so files from different machines are not compared blindly.
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from batch_score import DEFAULT_MODEL_PATH, load_model
+from compiled_model import CompiledPersonaModel
+from persona_config import FEATURE_COLUMNS, FEATURE_RANGES
+
+DEFAULT_SIZES = [1, 10, 100, 1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_PATHS = ["pipeline", "compiled", "compiled_one"]
+PERCENTILES = (50, 90, 99)
+
+
+# ---------------------------------------------------------
+# SYNTHETIC DATA
+# ---------------------------------------------------------
+def synthetic_customers(n, seed=0, missing_rate=0.02):
+    """
+    `n` customers drawn uniformly from FEATURE_RANGES. A `missing_rate`
+    share of every feature except EMI_Presence is set to NaN so the
+    imputers do real work.
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for col in FEATURE_COLUMNS:
+        spec = FEATURE_RANGES[col]
+        if isinstance(spec, list):
+            data[col] = np.array(spec, dtype=object if isinstance(spec[0], str) else float)[
+                rng.integers(len(spec), size=n)
+            ]
+        elif spec[2] is int:
+            data[col] = rng.integers(spec[0], spec[1] + 1, size=n).astype(float)
+        else:
+            data[col] = rng.uniform(spec[0], spec[1], size=n)
+        if missing_rate and col != "EMI_Presence":
+            mask = rng.random(n) < missing_rate
+            data[col][mask] = np.nan
+    return pd.DataFrame(data, columns=FEATURE_COLUMNS)
+
+
+# ---------------------------------------------------------
+# TIMING HELPERS
+# ---------------------------------------------------------
+def summarize(seconds, rows):
+    seconds = np.asarray(seconds)
+    stats = {f"p{q}_ms": float(np.percentile(seconds, q) * 1000) for q in PERCENTILES}
+    stats.update(
+        repeats=len(seconds),
+        mean_ms=float(seconds.mean() * 1000),
+        max_ms=float(seconds.max() * 1000),
+        rows_per_sec=rows / float(np.median(seconds)),
+    )
+    return stats
+
+
+def run_timed(fn, batches, budget, max_repeats):
+    """
+    Call fn on the batches (cycling) until `budget` seconds or
+    `max_repeats` calls are used, after one untimed warm-up call.
+    At least three calls are timed unless a single call exceeds the budget.
+    """
+    fn(batches[0])
+    seconds = []
+    spent = 0.0
+    while len(seconds) < max_repeats:
+        batch = batches[len(seconds) % len(batches)]
+        start = time.perf_counter()
+        fn(batch)
+        elapsed = time.perf_counter() - start
+        seconds.append(elapsed)
+        spent += elapsed
+        if spent >= budget and (len(seconds) >= 3 or elapsed >= budget):
+            break
+    return seconds
+
+
+def traced(fn, *args):
+    """Run fn(*args) under tracemalloc; return (result, seconds, peak MB)."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        result = fn(*args)
+    finally:
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+
+# ---------------------------------------------------------
+# END-TO-END
+# ---------------------------------------------------------
+def _slices(data, size, limit=64):
+    # distinct batches for small sizes so one row's cache lines are not reused
+    count = max(1, min(limit, len(data) // size))
+    return [data.iloc[i * size:(i + 1) * size] for i in range(count)]
+
+
+def bench_end_to_end(pipeline, compiled, data, sizes, paths, budget=2.0, max_repeats=1000, log=print):
+    results = []
+    for size in sizes:
+        batches = _slices(data, size)
+        for path in paths:
+            if path == "compiled_one":
+                if size != 1:
+                    continue
+                records = [batch.iloc[0].to_dict() for batch in batches]
+                seconds = run_timed(compiled.predict_one, records, budget, max_repeats)
+            else:
+                model = pipeline if path == "pipeline" else compiled
+                seconds = run_timed(model.predict, batches, budget, max_repeats)
+            entry = {"path": path, "batch_size": size, **summarize(seconds, size)}
+            results.append(entry)
+            log(f"  {path:<13} n={size:<9,} p50 {entry['p50_ms']:10.3f} ms  "
+                f"p99 {entry['p99_ms']:10.3f} ms  {entry['rows_per_sec']:14,.0f} rows/sec")
+    return results
+
+
+# ---------------------------------------------------------
+# PER-STEP BREAKDOWN
+# ---------------------------------------------------------
+def _branch_steps(name, transformer):
+    if isinstance(transformer, str) and transformer == "passthrough":
+        return [(f"{name}/passthrough", None)]
+    if hasattr(transformer, "steps"):
+        return [
+            (f"{name}/{step_name} ({type(step).__name__})", step)
+            for step_name, step in transformer.steps
+        ]
+    return [(f"{name} ({type(transformer).__name__})", transformer)]
+
+
+def bench_steps(pipeline, data, repeats=3):
+    """
+    Time and peak allocation of every fitted step on `data`.
+
+    Timings are the best of `repeats` untraced runs; memory comes from one
+    extra run under tracemalloc (which is slower, so it is not timed).
+    """
+    preprocess = pipeline.steps[0][1]
+    cluster = pipeline.steps[-1][1]
+    results = []
+
+    def record(name, fn, *args):
+        best = min(_elapsed(fn, *args) for _ in range(repeats))
+        result, _, peak_mb = traced(fn, *args)
+        results.append({"step": name, "rows": len(data), "seconds": best,
+                        "rows_per_sec": len(data) / best if best > 0 else None,
+                        "peak_alloc_mb": peak_mb})
+        return result
+
+    branch_total = 0.0
+    for name, transformer, columns in preprocess.transformers_:
+        if name == "remainder" and transformer == "drop":
+            continue
+        X = data[list(columns)]
+        for step_name, step in _branch_steps(name, transformer):
+            if step is None:
+                X = record(step_name, lambda frame: frame.to_numpy(), X)
+            else:
+                X = record(step_name, step.transform, X)
+            branch_total += results[-1]["seconds"]
+
+    Xt = record("preprocess (ColumnTransformer total)", preprocess.transform, data)
+    results.append({
+        "step": "preprocess dispatch + hstack",
+        "rows": len(data),
+        "seconds": max(results[-1]["seconds"] - branch_total, 0.0),
+        "rows_per_sec": None,
+        "peak_alloc_mb": None,
+    })
+    record("cluster/KMeans.predict", cluster.predict, Xt)
+    record("pipeline.predict (total)", pipeline.predict, data)
+    return results
+
+
+def _elapsed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+# ---------------------------------------------------------
+# REPORT
+# ---------------------------------------------------------
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _file_sha256(path):
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as fh:
+        return hashlib.sha256(fh.read()).hexdigest()
+
+
+def environment(model_path):
+    import sklearn
+
+    return {
+        "git_commit": _git_commit(),
+        "model_path": model_path,
+        "model_sha256": _file_sha256(model_path),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(current, baseline, threshold=0.10, log=print):
+    """
+    Print rows/sec ratios against a baseline report and return the entries
+    that got slower by more than `threshold`.
+    """
+    regressions = []
+    for key in ("cpu_count", "platform", "numpy", "pandas", "sklearn", "model_sha256"):
+        ours, theirs = current["environment"].get(key), baseline.get("environment", {}).get(key)
+        if ours != theirs:
+            log(f"  warning: {key} differs ({theirs} -> {ours})")
+    base = {(e["path"], e["batch_size"]): e for e in baseline.get("end_to_end", [])}
+    for entry in current.get("end_to_end", []):
+        old = base.get((entry["path"], entry["batch_size"]))
+        if old is None:
+            continue
+        ratio = entry["rows_per_sec"] / old["rows_per_sec"]
+        flag = "  REGRESSION" if ratio < 1 - threshold else ""
+        log(f"  {entry['path']:<13} n={entry['batch_size']:<9,} {ratio:6.2f}x{flag}")
+        if flag:
+            regressions.append({"path": entry["path"], "batch_size": entry["batch_size"], "ratio": ratio})
+    base_steps = {(e["step"], e["rows"]): e for e in baseline.get("steps", [])}
+    for entry in current.get("steps", []):
+        old = base_steps.get((entry["step"], entry["rows"]))
+        if old is None or not old["seconds"] or not entry["seconds"]:
+            continue
+        ratio = old["seconds"] / entry["seconds"]
+        flag = "  REGRESSION" if ratio < 1 - threshold else ""
+        log(f"  {entry['step']:<52} {ratio:6.2f}x{flag}")
+        if flag:
+            regressions.append({"step": entry["step"], "ratio": ratio})
+    return regressions
+
+
+def run_benchmark(model_path=DEFAULT_MODEL_PATH, sizes=DEFAULT_SIZES, paths=DEFAULT_PATHS,
+                  step_rows=100_000, seed=0, budget=2.0, log=print):
+    pipeline = load_model(model_path)
+    compiled = CompiledPersonaModel.from_pipeline(pipeline)
+    n_rows = max(max(sizes, default=1), step_rows)
+    log(f"Generating {n_rows:,} synthetic customers (seed={seed}) ...")
+    data = synthetic_customers(n_rows, seed=seed)
+
+    report = {"environment": environment(model_path), "seed": seed}
+    log("End-to-end predict():")
+    report["end_to_end"] = bench_end_to_end(pipeline, compiled, data, sizes, paths, budget=budget, log=log)
+    if step_rows:
+        log(f"Per-step breakdown on {step_rows:,} rows:")
+        report["steps"] = bench_steps(pipeline, data.iloc[:step_rows])
+        for entry in report["steps"]:
+            peak = entry["peak_alloc_mb"]
+            log(f"  {entry['step']:<52} {entry['seconds'] * 1000:10.1f} ms"
+                + (f"  peak alloc {peak:8.1f} MB" if peak is not None else ""))
+    return report
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the persona scoring pipeline.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to model.pkl.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Batch sizes for the end-to-end benchmark.")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS, choices=DEFAULT_PATHS,
+                        help="Scoring paths to benchmark.")
+    parser.add_argument("--step-rows", type=int, default=100_000,
+                        help="Rows for the per-step breakdown (0 to skip).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data.")
+    parser.add_argument("--budget", type=float, default=2.0,
+                        help="Seconds spent per (path, batch size).")
+    parser.add_argument("--output", help="Write the JSON report here.")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown flagged as a regression by --compare.")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.model, sorted(args.sizes), args.paths, args.step_rows,
+                           args.seed, args.budget)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Report written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        print(f"Compared with {args.compare} (rows/sec ratio, >1 is faster):")
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# columnar_io.py
+# ---------------------------------------------------------
+# COLUMNAR PARQUET I/O (projection, compact dtypes, row-group streaming)
+# ---------------------------------------------------------
+# Usage:
+#   for df in iter_parquet_frames("customers.parquet", columns=FEATURE_COLUMNS):
+#       model.predict(df)                      # same labels as the float64 frame
+#   compact_batch(record_batch)                # one Arrow batch -> compact types
+#
+# Only the requested columns are read, one row-group-sized batch at a time.
+# Each batch is narrowed before it becomes a pandas frame:
+#   Gender, Occupation      dictionary -> pandas Categorical (not object strings)
+#   integer-valued counts   int8 / int16 / int32 by their FEATURE_RANGES bound
+#   ... with nulls          float32 (every integer below 2**24 is exact in it)
+#   City_Tier               float32 (its imputer needs a float column)
+#   fractional values       left as they are (float32 would move them)
+# Every narrowing is a checked cast, so a batch that does not fit a compact
+# type (fractions, out-of-range values) simply keeps its original type and
+# the model sees exactly the same numbers as before.
+#
+# Null strings become NaN in the Categorical, as they are in the CSV path
+# and the API. (A plain pandas conversion yields None, which the pipeline's
+# SimpleImputer does not treat as missing.)
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from persona_config import FEATURE_COLUMNS, FEATURE_RANGES
+
+FLOAT32_EXACT_INT = 2 ** 24
+
+
+def _compact_kind(spec):
+    if isinstance(spec, tuple):
+        low, high, kind = spec
+        if kind is not int:
+            return None
+        for dtype in (np.int8, np.int16, np.int32):
+            if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                return np.dtype(dtype).name
+        return None
+    if all(isinstance(option, str) for option in spec):
+        return "category"
+    if all(isinstance(option, int) for option in spec):
+        return "int8" if max(spec) <= np.iinfo(np.int8).max else "int32"
+    return "float32"
+
+
+# column -> "category" | "int8" | "int16" | "int32" | "float32" | None (keep)
+COMPACT_TYPES = {col: _compact_kind(FEATURE_RANGES[col]) for col in FEATURE_COLUMNS}
+
+
+def compact_column(array, kind):
+    """Narrow one Arrow array to `kind` when that is lossless, else return it unchanged."""
+    if kind is None:
+        return array
+    if kind == "category":
+        if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+            return pc.dictionary_encode(array)
+        return array
+    if not (pa.types.is_integer(array.type) or pa.types.is_floating(array.type)):
+        return array
+    try:
+        # safe=True rejects fractional values and out-of-range integers
+        as_int = array.cast(pa.int32() if kind == "float32" else pa.type_for_alias(kind), safe=True)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return array
+    if kind != "float32" and as_int.null_count == 0:
+        return as_int
+    # pandas cannot hold nulls in an int column; float32 can, exactly
+    bounds = pc.min_max(as_int)
+    low, high = bounds["min"].as_py(), bounds["max"].as_py()
+    if low is None or max(abs(low), abs(high)) < FLOAT32_EXACT_INT:
+        return as_int.cast(pa.float32())
+    return array
+
+
+def compact_batch(batch, types=None):
+    """Apply `compact_column` to every FEATURE column of an Arrow RecordBatch."""
+    types = COMPACT_TYPES if types is None else types
+    arrays = [
+        compact_column(batch.column(i), types.get(name))
+        for i, name in enumerate(batch.schema.names)
+    ]
+    return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+
+
+def iter_parquet_frames(path, chunksize=100_000, columns=None, compact=True):
+    """
+    Yield pandas frames of at most `chunksize` rows from a Parquet file,
+    reading only `columns` (all when None), narrowed with `compact_batch`.
+    """
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+        if compact:
+            batch = compact_batch(batch)
+        yield batch.to_pandas()
@@ -0,0 +1,453 @@
+# compiled_model.py
+# ---------------------------------------------------------
+# COMPILED PREDICTOR (pure NumPy evaluation of model.pkl)
+# ---------------------------------------------------------
+# The fitted Pipeline is "compiled" once into flat parameter arrays:
+#   imputer fill values, winsor bounds, Yeo-Johnson lambdas, scaler stats,
+#   category maps and the KMeans cluster_centers_.
+# Predictions then skip pandas, the ColumnTransformer dispatch and the
+# per-step validation, which takes single-row latency from milliseconds
+# to microseconds while producing the same labels as `model.predict`.
+#
+# Usage:
+#   model = joblib.load("model.pkl")
+#   fast = CompiledPersonaModel.from_pipeline(model)
+#   fast.predict_one({"Age": 30, "Gender": "Male", ...})
+#   fast.predict(df)          # DataFrame, dict of columns or list of dicts
+#   fast.save("model_slim/compiled")
+#   CompiledPersonaModel.load("model_slim/compiled")   # NumPy only, memory-mapped
+#
+# sklearn, pandas and custom_classes are only imported by the compiler
+# (`from_pipeline`), so a process that loads a saved compiled model pays
+# for NumPy alone.
+
+import json
+import os
+import sys
+
+import numpy as np
+
+from persona_config import FEATURE_COLUMNS
+
+# order in which numeric steps are folded into the per-column parameters
+_NUMERIC_STAGES = ("impute", "winsorize", "power", "scale")
+
+
+# ---------------------------------------------------------
+# BRANCH COMPILERS
+# ---------------------------------------------------------
+def _branch_steps(transformer):
+    from sklearn.pipeline import Pipeline
+
+    if transformer == "passthrough":
+        return []
+    if isinstance(transformer, Pipeline):
+        return [step for _, step in transformer.steps if step != "passthrough"]
+    # FunctionTransformer() with no func is sklearn's fitted form of 'passthrough'
+    if getattr(transformer, "func", "missing") is None:
+        return []
+    return [transformer]
+
+
+def _is_categorical_branch(steps):
+    from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
+
+    return any(isinstance(step, (OneHotEncoder, OrdinalEncoder)) for step in steps)
+
+
+def _compile_numeric(steps, columns):
+    """Fold impute -> winsorize -> power -> scale steps into per-column arrays."""
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import PowerTransformer, StandardScaler
+
+    from custom_classes import DistributionPreservingImputer, Winsorizer
+
+    k = len(columns)
+    params = {
+        "fill": np.full(k, np.nan),
+        "lower": np.full(k, -np.inf),
+        "upper": np.full(k, np.inf),
+        "lambdas": np.full(k, np.nan),
+        "mean": np.zeros(k),
+        "scale": np.ones(k),
+    }
+    stage = -1
+    for step in steps:
+        if isinstance(step, DistributionPreservingImputer):
+            name = "impute"
+            for j, col in enumerate(columns):
+                if col in step.fill_values_:
+                    params["fill"][j] = step.fill_values_[col]
+        elif isinstance(step, SimpleImputer):
+            name = "impute"
+            params["fill"][:] = np.asarray(step.statistics_, dtype=float)
+        elif isinstance(step, Winsorizer):
+            name = "winsorize"
+            for j, col in enumerate(columns):
+                if col in step.columns_:
+                    params["lower"][j] = step.lower_bounds_[col]
+                    params["upper"][j] = step.upper_bounds_[col]
+        elif isinstance(step, PowerTransformer):
+            name = "power"
+            if step.method != "yeo-johnson":
+                raise ValueError(f"Cannot compile PowerTransformer(method={step.method!r}).")
+            params["lambdas"][:] = step.lambdas_
+            if step.standardize:
+                params["mean"][:] = step._scaler.mean_
+                params["scale"][:] = step._scaler.scale_
+        elif isinstance(step, StandardScaler):
+            # a separate scaler (train_model's streamed statistics)
+            name = "scale"
+            if step.with_mean:
+                params["mean"] += step.mean_ * params["scale"]
+            if step.with_std:
+                params["scale"] *= step.scale_
+        else:
+            raise ValueError(f"Cannot compile numeric step {type(step).__name__}.")
+        order = _NUMERIC_STAGES.index(name)
+        if order <= stage:
+            raise ValueError(f"Cannot compile numeric steps in this order: {[type(s).__name__ for s in steps]}")
+        stage = order
+    return params
+
+
+def _compile_categorical(steps, columns):
+    """Compile a [SimpleImputer ->] OneHot/Ordinal encoder branch into category arrays."""
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
+
+    fill = None
+    encoder = None
+    for step in steps:
+        if isinstance(step, SimpleImputer) and encoder is None:
+            if step.strategy != "constant":
+                raise ValueError(f"Cannot compile SimpleImputer(strategy={step.strategy!r}) on categorical columns.")
+            fill = step.statistics_
+        elif isinstance(step, (OneHotEncoder, OrdinalEncoder)) and encoder is None:
+            if getattr(step, "_infrequent_enabled", False):
+                raise ValueError("Cannot compile encoders with infrequent categories.")
+            encoder = step
+        else:
+            raise ValueError(f"Cannot compile categorical step {type(step).__name__}.")
+
+    if isinstance(encoder, OneHotEncoder):
+        if encoder.handle_unknown != "ignore":
+            raise ValueError("Only OneHotEncoder(handle_unknown='ignore') can be compiled.")
+        drop_idx = encoder.drop_idx_
+        kept = []
+        for j, cats in enumerate(encoder.categories_):
+            drop = None if drop_idx is None else drop_idx[j]
+            kept.append(np.array([c for i, c in enumerate(cats) if i != drop], dtype=cats.dtype))
+        return {"kind": "onehot", "fill": fill, "categories": kept}
+
+    if encoder.handle_unknown != "use_encoded_value":
+        raise ValueError("Only OrdinalEncoder(handle_unknown='use_encoded_value') can be compiled.")
+    return {
+        "kind": "ordinal",
+        "fill": fill,
+        "categories": list(encoder.categories_),
+        "unknown_value": float(encoder.unknown_value),
+    }
+
+
+# ---------------------------------------------------------
+# ELEMENTWISE KERNELS (same arithmetic as sklearn)
+# ---------------------------------------------------------
+def _yeo_johnson(x, lambdas):
+    """
+    Column-wise Yeo-Johnson with one lambda per column (NaN = identity).
+
+    Uses the exact expressions of PowerTransformer._yeo_johnson_transform so
+    results are bit-for-bit identical; the lambda == 0 / lambda == 2 special
+    cases are only evaluated when some column needs them.
+    """
+    identity = np.isnan(lambdas)
+    lam = np.where(identity, 1.0, lambdas)
+    pos = x >= 0
+    xp = np.where(pos, x, 0.0)
+    xn = np.where(pos, 0.0, -x)
+    zero = np.abs(lam) < np.spacing(1.0)
+    two = np.abs(lam - 2) <= np.spacing(1.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pos_part = (np.power(xp + 1, lam) - 1) / lam
+        neg_part = -(np.power(xn + 1, 2 - lam) - 1) / (2 - lam)
+        if zero.any():
+            pos_part = np.where(zero, np.log1p(xp), pos_part)
+        if two.any():
+            neg_part = np.where(two, -np.log1p(xn), neg_part)
+    out = np.where(pos, pos_part, neg_part)
+    if identity.any():
+        out = np.where(identity, x, out)
+    return out
+
+
+def _is_dataframe(X):
+    # looked up in sys.modules so the NumPy-only load path never imports pandas
+    pd = sys.modules.get("pandas")
+    return pd is not None and isinstance(X, pd.DataFrame)
+
+
+def _impute_object(values, fill):
+    values = np.asarray(values, dtype=object)
+    # SimpleImputer(missing_values=np.nan) only matches NaN (x != x), not None
+    missing = values != values
+    if fill is not None and missing.any():
+        values = values.copy()
+        values[missing] = fill
+    return values
+
+
+# ---------------------------------------------------------
+# COMPILED MODEL
+# ---------------------------------------------------------
+class CompiledPersonaModel:
+    """
+    NumPy-only evaluator for the persona Pipeline.
+
+    Build it with `CompiledPersonaModel.from_pipeline(pipeline)`; the
+    original Pipeline is not referenced afterwards.
+    """
+
+    def __init__(self, numeric_columns, numeric_slots, numeric_params,
+                 categorical_blocks, n_features_out, centers):
+        self.numeric_columns = list(numeric_columns)
+        self.numeric_slots = np.asarray(numeric_slots, dtype=np.intp)
+        self.fill = numeric_params["fill"]
+        self.lower = numeric_params["lower"]
+        self.upper = numeric_params["upper"]
+        self.lambdas = numeric_params["lambdas"]
+        self.mean = numeric_params["mean"]
+        self.scale = numeric_params["scale"]
+        self.categorical_blocks = categorical_blocks
+        self.n_features_out = n_features_out
+        self.centers = np.ascontiguousarray(centers, dtype=np.float64)
+        self.centers_squared_norms = (self.centers ** 2).sum(axis=1)
+        self._lookups = self._build_lookups()
+
+    def _build_lookups(self):
+        """
+        Per categorical column: (column, fill, table, slot, unknown).
+
+        One-hot tables map category -> output slot (slot is None); ordinal
+        tables map category -> code written to `slot`, `unknown` otherwise.
+        """
+        lookups = []
+        for block in self.categorical_blocks:
+            pos = block["start"]
+            for j, col in enumerate(block["columns"]):
+                fill = None if block["fill"] is None else block["fill"][j]
+                cats = block["categories"][j]
+                if block["kind"] == "onehot":
+                    table = {c: pos + i for i, c in enumerate(cats.tolist())}
+                    lookups.append((col, fill, table, None, None))
+                    pos += len(cats)
+                else:
+                    table = {c: float(i) for i, c in enumerate(np.asarray(cats).tolist())}
+                    lookups.append((col, fill, table, pos, block["unknown_value"]))
+                    pos += 1
+        return lookups
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        from sklearn.cluster import KMeans
+
+        preprocess = pipeline.steps[0][1]
+        cluster = pipeline.steps[-1][1]
+        if not isinstance(cluster, KMeans):
+            raise ValueError(f"Last pipeline step must be KMeans, got {type(cluster).__name__}.")
+
+        numeric_columns, numeric_slots = [], []
+        numeric_params = {key: [] for key in ("fill", "lower", "upper", "lambdas", "mean", "scale")}
+        categorical_blocks = []
+
+        for name, transformer, columns in preprocess.transformers_:
+            if name == "remainder" or transformer == "drop":
+                continue
+            columns = list(columns)
+            out = preprocess.output_indices_[name]
+            steps = _branch_steps(transformer)
+            if _is_categorical_branch(steps):
+                block = _compile_categorical(steps, columns)
+                block.update(columns=columns, start=out.start, stop=out.stop)
+                categorical_blocks.append(block)
+            else:
+                params = _compile_numeric(steps, columns)
+                for key, values in params.items():
+                    numeric_params[key].append(values)
+                numeric_columns.extend(columns)
+                numeric_slots.extend(range(out.start, out.stop))
+
+        numeric_params = {
+            key: np.concatenate(values) if values else np.empty(0)
+            for key, values in numeric_params.items()
+        }
+        n_features_out = max(s.stop for s in preprocess.output_indices_.values())
+        return cls(numeric_columns, numeric_slots, numeric_params, categorical_blocks,
+                   n_features_out, cluster.cluster_centers_)
+
+    # ---------------- persistence ----------------
+    _ARRAYS = ("fill", "lower", "upper", "lambdas", "mean", "scale", "centers")
+
+    def save(self, path):
+        """
+        Write `manifest.json` (columns, categories, layout) and `params.bin`
+        (every float64 parameter array back to back) into directory `path`.
+        """
+        os.makedirs(path, exist_ok=True)
+        layout = {}
+        offset = 0
+        with open(os.path.join(path, "params.bin"), "wb") as fh:
+            for name in self._ARRAYS:
+                array = np.ascontiguousarray(getattr(self, name), dtype=np.float64)
+                fh.write(array.tobytes())
+                layout[name] = {"offset": offset, "shape": list(array.shape)}
+                offset += array.size
+        blocks = [
+            {
+                "kind": block["kind"],
+                "columns": block["columns"],
+                "start": block["start"],
+                "stop": block["stop"],
+                "fill": None if block["fill"] is None else np.asarray(block["fill"]).tolist(),
+                "categories": [np.asarray(cats).tolist() for cats in block["categories"]],
+                "unknown_value": block.get("unknown_value"),
+            }
+            for block in self.categorical_blocks
+        ]
+        manifest = {
+            "format": 1,
+            "numeric_columns": self.numeric_columns,
+            "numeric_slots": self.numeric_slots.tolist(),
+            "n_features_out": self.n_features_out,
+            "categorical_blocks": blocks,
+            "arrays": layout,
+        }
+        with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a model written by `save`. With mmap=True the parameters are a
+        read-only memory map of params.bin, so every process serving the
+        same file shares one page-cached copy.
+        """
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as fh:
+            manifest = json.load(fh)
+        if manifest.get("format") != 1:
+            raise ValueError(f"Unsupported compiled model format: {manifest.get('format')!r}")
+        bin_path = os.path.join(path, "params.bin")
+        buffer = np.memmap(bin_path, dtype=np.float64, mode="r") if mmap else np.fromfile(bin_path)
+        arrays = {}
+        for name, spec in manifest["arrays"].items():
+            size = int(np.prod(spec["shape"]))
+            arrays[name] = buffer[spec["offset"]:spec["offset"] + size].reshape(spec["shape"])
+
+        blocks = []
+        for block in manifest["categorical_blocks"]:
+            if block["kind"] == "onehot":
+                categories = [np.array(cats, dtype=object) for cats in block["categories"]]
+            else:
+                categories = [np.array(cats) for cats in block["categories"]]
+            blocks.append({
+                "kind": block["kind"],
+                "columns": block["columns"],
+                "start": block["start"],
+                "stop": block["stop"],
+                "fill": None if block["fill"] is None else np.array(block["fill"], dtype=object),
+                "categories": categories,
+                "unknown_value": block["unknown_value"],
+            })
+        numeric_params = {name: arrays[name] for name in cls._ARRAYS if name != "centers"}
+        return cls(manifest["numeric_columns"], manifest["numeric_slots"], numeric_params,
+                   blocks, manifest["n_features_out"], arrays["centers"])
+
+    # ---------------- transforms ----------------
+    def _transform_numeric(self, raw):
+        x = raw
+        x = np.where(np.isnan(x), self.fill, x)
+        x = np.clip(x, self.lower, self.upper)
+        x = _yeo_johnson(x, self.lambdas)
+        x = x - self.mean
+        x /= self.scale
+        return x
+
+    def _encode(self, block, columns, n):
+        width = block["stop"] - block["start"]
+        out = np.zeros((n, width))
+        pos = 0
+        for j, col in enumerate(block["columns"]):
+            values = _impute_object(columns[col], None if block["fill"] is None else block["fill"][j])
+            cats = block["categories"][j]
+            if block["kind"] == "onehot":
+                out[:, pos:pos + len(cats)] = values[:, None] == cats[None, :]
+                pos += len(cats)
+            else:
+                hits = values[:, None] == np.asarray(cats, dtype=object)[None, :]
+                code = np.where(hits.any(axis=1), hits.argmax(axis=1), block["unknown_value"])
+                out[:, pos] = code
+                pos += 1
+        return out
+
+    def transform(self, X):
+        """Return the preprocessed feature matrix (same as preprocess.transform)."""
+        raw, columns, n = self._gather(X)
+        return self._transform_gathered(raw, columns, n)
+
+    def _transform_gathered(self, raw, columns, n):
+        Xt = np.empty((n, self.n_features_out))
+        Xt[:, self.numeric_slots] = self._transform_numeric(raw)
+        for block in self.categorical_blocks:
+            Xt[:, block["start"]:block["stop"]] = self._encode(block, columns, n)
+        return Xt
+
+    # ---------------- input handling ----------------
+    def _gather(self, X):
+        """Split input into a float matrix of numeric columns and object columns."""
+        if _is_dataframe(X):
+            columns = {c: X[c].to_numpy() for c in FEATURE_COLUMNS}
+        elif isinstance(X, dict):
+            columns = {c: np.atleast_1d(np.asarray(X[c], dtype=object)) for c in FEATURE_COLUMNS}
+        elif isinstance(X, np.ndarray):
+            if X.ndim == 1:
+                X = X[None, :]
+            columns = {c: X[:, i] for i, c in enumerate(FEATURE_COLUMNS)}
+        else:
+            records = list(X)
+            columns = {c: np.array([r[c] for r in records], dtype=object) for c in FEATURE_COLUMNS}
+        n = len(columns[FEATURE_COLUMNS[0]])
+        raw = np.empty((n, len(self.numeric_columns)))
+        for j, col in enumerate(self.numeric_columns):
+            raw[:, j] = columns[col]
+        return raw, columns, n
+
+    # ---------------- prediction ----------------
+    def _assign(self, Xt):
+        if not np.isfinite(Xt).all():
+            raise ValueError("Input contains NaN or infinity after preprocessing.")
+        # same expression sklearn's lloyd kernel uses: ||c||^2 - 2 x.c
+        distances = self.centers_squared_norms - 2.0 * (Xt @ self.centers.T)
+        return distances.argmin(axis=1).astype(np.int32)
+
+    def predict(self, X):
+        """Cluster ids for a DataFrame, 2-D array, dict of columns or list of dicts."""
+        return self._assign(self.transform(X))
+
+    def predict_one(self, record):
+        """Cluster id for a single customer given as a dict of FEATURE_COLUMNS."""
+        raw = np.array([record[c] for c in self.numeric_columns], dtype=float)
+        row = np.zeros(self.n_features_out)
+        row[self.numeric_slots] = self._transform_numeric(raw)
+        for col, fill, table, slot, unknown in self._lookups:
+            value = record[col]
+            if value != value and fill is not None:
+                value = fill
+            if slot is None:
+                hit = table.get(value)
+                if hit is not None:
+                    row[hit] = 1.0
+            else:
+                row[slot] = table.get(value, unknown)
+        if not np.isfinite(row).all():
+            raise ValueError("Input contains NaN or infinity after preprocessing.")
+        return int((self.centers_squared_norms - 2.0 * (self.centers @ row)).argmin())
@@ -3,6 +3,39 @@ from scipy.stats import wasserstein_distance
 import pandas as pd
 import numpy as np
 
+
+# shared helpers for the copy-free transform paths
+def _prepare_output(X, copy):
+    """
+    Return the container transform() writes into.
+
+    DataFrames are shallow-copied when copy=True (replaced columns never touch
+    the caller's data) and used as-is when copy=False. NumPy arrays are used
+    as-is and only copied when copy=True.
+    """
+    if isinstance(X, pd.DataFrame):
+        return X.copy(deep=False) if copy else X
+    if isinstance(X, np.ndarray):
+        return X.copy() if copy else X
+    return pd.DataFrame(X)
+
+
+def _set_columns(out, columns, values):
+    """Write a 2-D block of values back into `out`, returning the result."""
+    if isinstance(out, pd.DataFrame):
+        out[columns] = values
+        return out
+    if not np.can_cast(values.dtype, out.dtype, casting="same_kind"):
+        out = out.astype(np.result_type(out.dtype, values.dtype))
+    out[:, columns] = values
+    return out
+
+
+def _get_columns(X, columns):
+    if isinstance(X, pd.DataFrame):
+        return X[columns].to_numpy()
+    return X[:, columns]
+
 # winsorizer class
 class Winsorizer(BaseEstimator, TransformerMixin):
     """
@@ -17,12 +50,21 @@ class Winsorizer(BaseEstimator, TransformerMixin):
     columns : list or None
         Columns to apply winsorization on.
         If None, will apply to all numeric columns during fit.
+    copy : bool (default=True)
+        If False, clip the input DataFrame / float array in place instead of
+        returning a new container.
     """
 
-    def __init__(self, lower_q=0.01, upper_q=0.99, columns=None):
+    def __init__(self, lower_q=0.01, upper_q=0.99, columns=None, copy=True):
         self.lower_q = lower_q
         self.upper_q = upper_q
         self.columns = columns
+        self.copy = copy
+
+    def __setstate__(self, state):
+        # models pickled before `copy` existed
+        state.setdefault("copy", True)
+        super().__setstate__(state)
 
     def fit(self, X, y=None):
         X = pd.DataFrame(X).copy()
@@ -38,11 +80,14 @@ class Winsorizer(BaseEstimator, TransformerMixin):
         return self
 
     def transform(self, X):
-        X = pd.DataFrame(X).copy()
-        for col in self.columns_:
-            X[col] = np.where(X[col] < self.lower_bounds_[col], self.lower_bounds_[col], X[col])
-            X[col] = np.where(X[col] > self.upper_bounds_[col], self.upper_bounds_[col], X[col])
-        return X
+        out = _prepare_output(X, self.copy)
+        if not self.columns_:
+            return out
+        lower = np.array([self.lower_bounds_[col] for col in self.columns_], dtype=float)
+        upper = np.array([self.upper_bounds_[col] for col in self.columns_], dtype=float)
+        # one clip over the (n_rows, n_columns) block; NaNs pass through as before
+        values = np.clip(_get_columns(out, self.columns_).astype(float, copy=False), lower, upper)
+        return _set_columns(out, self.columns_, values)
 
 
 # topncategories class
@@ -50,12 +95,18 @@ class TopNCategories(BaseEstimator, TransformerMixin):
     """
     Keep top-N most frequent categories per column; map all others to 'Other'.
     NaNs are preserved (so your imputer/encoder can handle them next).
+    Pass copy=False to rewrite the input DataFrame / object array in place.
     """
-    def __init__(self, top_n=5):
+    def __init__(self, top_n=5, copy=True):
         self.top_n = top_n
+        self.copy = copy
         self.top_categories_ = {}
         self.columns_ = None
 
+    def __setstate__(self, state):
+        state.setdefault("copy", True)
+        super().__setstate__(state)
+
     def fit(self, X, y=None):
         X = pd.DataFrame(X).copy()
         self.columns_ = list(X.columns)
@@ -66,21 +117,78 @@ class TopNCategories(BaseEstimator, TransformerMixin):
         return self
 
     def transform(self, X):
-        X = pd.DataFrame(X).copy()
+        out = _prepare_output(X, self.copy)
+        if isinstance(out, np.ndarray) and out.dtype != object:
+            out = out.astype(object)
         for col in self.columns_:
-            keep = self.top_categories_[col]
-            mask = X[col].notna()
+            values = out[col] if isinstance(out, pd.DataFrame) else pd.Series(out[:, col], copy=False)
+            if isinstance(values.dtype, pd.CategoricalDtype) and "other" not in values.cat.categories:
+                # iter_chunks reads Gender / Occupation as Categoricals
+                values = values.cat.add_categories("other")
             # everything not in top-N becomes 'other'
-            X.loc[mask & ~X[col].isin(keep), col] = "other"
-        return X
+            replaced = values.where(values.isna() | values.isin(self.top_categories_[col]), "other")
+            if isinstance(out, pd.DataFrame):
+                out[col] = replaced
+            else:
+                out[:, col] = replaced.to_numpy()
+        return out
 
 # imputation class
+def _mean_abs_deviation(sorted_values, prefix_sums, value):
+    """
+    mean(|x - value|) over pre-sorted x, in O(log n) via prefix sums.
+
+    For a column u with k nulls filled by `value`, the filled column t is
+    u plus k copies of `value`, so F_u - F_t = k/(n+k) * (F_u - 1[x >= value])
+    and wasserstein_distance(u, t) = k/(n+k) * mean(|u - value|). Ranking
+    candidates by this quantity therefore ranks them by Wasserstein distance.
+    """
+    n = len(sorted_values)
+    below = np.searchsorted(sorted_values, value, side="left")
+    below_sum = prefix_sums[below - 1] if below > 0 else 0.0
+    above_sum = prefix_sums[-1] - below_sum
+    return (value * below - below_sum + above_sum - value * (n - below)) / n
+
+
 class DistributionPreservingImputer(BaseEstimator, TransformerMixin):
-    def __init__(self):
+    """
+    Fill each column's nulls with whichever of min/median/mean/max/Q1/Q3
+    keeps the filled column closest (Wasserstein) to the observed values.
+    Pass copy=False to fill the input DataFrame / array in place.
+
+    Parameters
+    ----------
+    copy : bool (default=True)
+        If False, fill the input in place during transform.
+    fast : bool (default=False)
+        Sort each column's observed values once and score the candidates
+        analytically (see `_mean_abs_deviation`) instead of running
+        `wasserstein_distance` on six filled copies. Picks the same fill
+        values as the exact path, which is only consulted to break exact
+        analytic ties between distinct candidates.
+    subsample : int or None (default=None)
+        If set, fit on at most this many rows drawn without replacement.
+    random_state : int or None (default=None)
+        Seed for `subsample`.
+    """
+    def __init__(self, copy=True, fast=False, subsample=None, random_state=None):
+        self.copy = copy
+        self.fast = fast
+        self.subsample = subsample
+        self.random_state = random_state
         self.fill_values_ = {}
 
+    def __setstate__(self, state):
+        state.setdefault("copy", True)
+        state.setdefault("fast", False)
+        state.setdefault("subsample", None)
+        state.setdefault("random_state", None)
+        super().__setstate__(state)
+
     def fit(self, X, y=None):
         X = pd.DataFrame(X)
+        if self.subsample is not None and len(X) > self.subsample:
+            X = X.sample(n=self.subsample, random_state=self.random_state)
         for col in X.columns:
             if X[col].isnull().any():
                 original = X[col].dropna()
@@ -92,21 +200,63 @@ class DistributionPreservingImputer(BaseEstimator, TransformerMixin):
                     original.quantile(0.25),
                     original.quantile(0.75)
                 ]
+                if self.fast:
+                    self.fill_values_[col] = self._closest_candidate(X[col], original, candidates)
+                    continue
                 best_val = None
                 best_dist = float('inf')
                 for val in candidates:
-                    temp = X[col].copy()
-                    temp[X[col].isna()] = val
-                    dist = wasserstein_distance(original, temp)
+                    dist = self._exact_distance(X[col], original, val)
                     if dist < best_dist:
                         best_dist = dist
                         best_val = val
                 self.fill_values_[col] = best_val
         return self
 
+    @staticmethod
+    def _exact_distance(column, original, val):
+        temp = column.copy()
+        temp[column.isna()] = val
+        return wasserstein_distance(original, temp)
+
+    def _closest_candidate(self, column, original, candidates):
+        sorted_values = np.sort(original.to_numpy(dtype=float))
+        prefix_sums = np.cumsum(sorted_values)
+        dists = [_mean_abs_deviation(sorted_values, prefix_sums, val) for val in candidates]
+        best = min(dists)
+        # Distinct candidates that tie analytically (e.g. anywhere between the
+        # two middle values of an even-sized column) are separated only by
+        # float noise in the exact path, so let the exact path break the tie.
+        tol = 1e-9 * max(abs(best), 1e-12)
+        tied = [val for val, dist in zip(candidates, dists) if dist - best <= tol]
+        if len(set(tied)) == 1:
+            return tied[0]
+        best_val = None
+        best_dist = float('inf')
+        for val in tied:
+            dist = self._exact_distance(column, original, val)
+            if dist < best_dist:
+                best_dist = dist
+                best_val = val
+        return best_val
+
     def transform(self, X):
-        X = pd.DataFrame(X).copy()
-        for col, fill_val in self.fill_values_.items():
-            X[col] = X[col].fillna(fill_val)
-        return X
+        out = _prepare_output(X, self.copy)
+        if isinstance(out, pd.DataFrame):
+            # only columns that actually contain nulls are touched (and keep
+            # their dtype otherwise), instead of copying every column
+            for col, fill_val in self.fill_values_.items():
+                if out[col].hasnans:
+                    out[col] = out[col].fillna(fill_val)
+            return out
+        if not self.fill_values_:
+            return out
+        columns = list(self.fill_values_)
+        values = _get_columns(out, columns)
+        missing = pd.isna(values)
+        if missing.any():
+            fills = np.array([self.fill_values_[col] for col in columns])
+            values = np.where(missing, fills, values)
+            out = _set_columns(out, columns, values)
+        return out
 
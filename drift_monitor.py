@@ -0,0 +1,450 @@
+# drift_monitor.py
+# ---------------------------------------------------------
+# DRIFT MONITOR (streaming feature drift + persona mix)
+# ---------------------------------------------------------
+# Usage:
+#   # optional: a reference profile from the training data (one streamed pass)
+#   python drift_monitor.py reference history.parquet --output drift_reference.json
+#   # score-and-monitor a file, or use `batch_score.py --drift-report`
+#   python drift_monitor.py report live.parquet --reference drift_reference.json --output drift.json
+#
+# Live traffic is summarised incrementally with constant memory per
+# feature, and monitors built on different chunks or processes merge:
+#   numeric      null rate, share of values clipped by the Winsorizer, and a
+#                QuantileSketch of the value *after* Yeo-Johnson + scaling,
+#                i.e. in the space KMeans sees. PSI (deciles) and the
+#                Wasserstein distance are measured there, in units of
+#                training standard deviations.
+#   categorical  null rate, category shares and the share of categories the
+#                encoders never saw in training
+#   personas     overall mix and one mix per time window
+#
+# Without a reference profile the model itself is the reference: the
+# standardised Yeo-Johnson output is ~N(0, 1) on the training data, the
+# Winsorizer clips lower_q + upper_q of it, the encoders hold the training
+# categories and KMeans labels_ the training persona mix. N(0, 1) is only
+# an approximation (discrete features are far from it), so numeric PSI
+# against it is reported without a status and never raises an alert; use
+# a data reference (`reference` command, load_reference) for that.
+#
+# Category values are compared as labels, with numbers normalised to float
+# first: City_Tier 1 and 1.0 are the same category.
+
+import argparse
+import json
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from compiled_model import CompiledPersonaModel
+from persona_config import FEATURE_COLUMNS, FEATURE_RANGES, PERSONA_DETAILS
+from sketches import QuantileSketch
+
+# quantile grid (bin midpoints) used for Wasserstein distances
+PROBS = (np.arange(200) + 0.5) / 200
+DECILES = np.arange(1, 10) / 10
+
+PSI_MODERATE = 0.1
+PSI_MAJOR = 0.25
+MAX_CATEGORIES = 64
+OTHER = "__other__"
+
+
+# ---------------------------------------------------------
+# DRIFT MEASURES
+# ---------------------------------------------------------
+def psi(expected, actual, floor=1e-4):
+    """Population stability index between two share vectors."""
+    expected = np.maximum(np.asarray(expected, dtype=float), floor)
+    actual = np.maximum(np.asarray(actual, dtype=float), floor)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def category_label(value):
+    """Label a category is counted under; numbers go through float (1 -> '1.0')."""
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_)):
+        return repr(float(value))
+    return str(value)
+
+
+def psi_status(value):
+    if value is None or value != value:
+        return None
+    if value >= PSI_MAJOR:
+        return "major"
+    if value >= PSI_MODERATE:
+        return "moderate"
+    return "stable"
+
+
+# ---------------------------------------------------------
+# MODEL REFERENCE
+# ---------------------------------------------------------
+def _winsor_quantiles(pipeline):
+    """{column: lower_q + upper_q} for every winsorized column."""
+    from custom_classes import Winsorizer
+
+    expected = {}
+    for _, transformer, _ in pipeline.steps[0][1].transformers_:
+        for _, step in getattr(transformer, "steps", []):
+            if isinstance(step, Winsorizer):
+                for col in step.columns_:
+                    expected[col] = step.lower_q + (1 - step.upper_q)
+    return expected
+
+
+def _category_domains(model, compiled):
+    """Every category the encoders were fitted on, per categorical column."""
+    domains = {}
+    if hasattr(model, "steps"):
+        for _, transformer, columns in model.steps[0][1].transformers_:
+            for _, step in getattr(transformer, "steps", []):
+                if hasattr(step, "categories_"):
+                    for col, cats in zip(columns, step.categories_):
+                        domains[col] = [c for c in np.asarray(cats).tolist() if c == c]
+        return domains
+    # the compiled model drops the one-hot 'first' category; the form lists it
+    for block in compiled.categorical_blocks:
+        for col, cats in zip(block["columns"], block["categories"]):
+            options = FEATURE_RANGES.get(col)
+            known = list(options) if isinstance(options, list) else []
+            domains[col] = known + [c for c in np.asarray(cats).tolist() if c not in known]
+    return domains
+
+
+def reference_from_model(model):
+    """
+    Reference profile implied by the fitted model (see module notes). Its
+    numeric quantiles are flagged `approximate`: reported, never alerted on.
+    """
+    from scipy.special import ndtri
+
+    compiled = _compiled(model)
+    clip = _winsor_quantiles(model) if hasattr(model, "steps") else {}
+    numeric = {}
+    for j, col in enumerate(compiled.numeric_columns):
+        powered = not np.isnan(compiled.lambdas[j])
+        numeric[col] = {
+            "quantiles": ndtri(PROBS).tolist() if powered else None,
+            "approximate": powered,
+            "null_rate": None,
+            "clip_share": clip.get(col, 0.0 if np.isinf(compiled.upper[j]) else None),
+        }
+    categorical = {
+        col: {"domain": domain, "shares": None, "null_rate": None}
+        for col, domain in _category_domains(model, compiled).items()
+    }
+    personas = None
+    labels = getattr(getattr(model, "steps", [[None, None]])[-1][1], "labels_", None)
+    if labels is not None:
+        counts = np.bincount(labels, minlength=len(compiled.centers))
+        personas = (counts / counts.sum()).tolist()
+    return {"source": "model", "probs": PROBS.tolist(), "numeric": numeric,
+            "categorical": categorical, "personas": personas}
+
+
+def _compiled(model):
+    if isinstance(model, CompiledPersonaModel):
+        return model
+    return CompiledPersonaModel.from_pipeline(model)
+
+
+# ---------------------------------------------------------
+# MONITOR
+# ---------------------------------------------------------
+class DriftMonitor:
+    """
+    Incremental drift statistics for persona scoring traffic.
+
+    Parameters
+    ----------
+    model : fitted Pipeline or CompiledPersonaModel
+        Supplies the transform into model space and the default reference.
+    reference : dict or None
+        Profile from `build_reference` / `to_reference`; None uses the model.
+    k : int (default=1024)
+        QuantileSketch size per numeric feature.
+    window_seconds : int (default=3600)
+        Width of the persona-mix time windows when `update` gets no label.
+    max_windows : int (default=168)
+        Windows kept; older ones are dropped (their rows stay in the totals).
+    """
+
+    def __init__(self, model, reference=None, k=1024, window_seconds=3600, max_windows=168, seed=None):
+        self.compiled = _compiled(model)
+        self.reference = reference if reference is not None else reference_from_model(model)
+        self.k = k
+        self.window_seconds = window_seconds
+        self.max_windows = max_windows
+        self.n_clusters = len(self.compiled.centers)
+        columns = self.compiled.numeric_columns
+        self.sketches = {col: QuantileSketch(k=k, seed=seed) for col in columns}
+        self.sum_squares = dict.fromkeys(columns, 0.0)
+        self.clipped = {col: [0, 0] for col in columns}
+        self.categories = {col: Counter() for col in self.reference["categorical"]}
+        self.category_nulls = dict.fromkeys(self.reference["categorical"], 0)
+        self.rows = 0
+        self.personas = np.zeros(self.n_clusters, dtype=np.int64)
+        self.windows = OrderedDict()
+
+    # ---------------- updates ----------------
+    def update(self, X, labels=None, window=None):
+        """
+        Add a batch (DataFrame or list of dicts with FEATURE_COLUMNS) and,
+        optionally, its cluster ids under time window `window`.
+        """
+        compiled = self.compiled
+        raw, columns, n = compiled._gather(X)
+        if n == 0:
+            return self
+        missing = np.isnan(raw)
+        z = compiled._transform_numeric(raw)
+        z[missing] = np.nan
+        low = (raw < compiled.lower).sum(axis=0)
+        high = (raw > compiled.upper).sum(axis=0)
+        for j, col in enumerate(compiled.numeric_columns):
+            self.sketches[col].update(z[:, j])
+            self.sum_squares[col] += float(np.nansum(z[:, j] ** 2))
+            self.clipped[col][0] += int(low[j])
+            self.clipped[col][1] += int(high[j])
+        for col, counter in self.categories.items():
+            values = np.asarray(columns[col], dtype=object)
+            nulls = values != values
+            nulls |= values == None  # noqa: E711
+            self.category_nulls[col] += int(nulls.sum())
+            observed = pd.Series(values[~nulls]).value_counts(sort=False)
+            self._count_categories(counter, ((category_label(value), count) for value, count in observed.items()))
+        self.rows += n
+        if labels is not None:
+            counts = np.bincount(np.asarray(labels, dtype=np.int64), minlength=self.n_clusters)
+            self.personas += counts
+            if window is None:
+                window = time.strftime(
+                    "%Y-%m-%dT%H:%M:%S",
+                    time.gmtime(int(time.time() // self.window_seconds) * self.window_seconds),
+                )
+            self._add_window(window, counts)
+        return self
+
+    def _count_categories(self, counter, items):
+        for value, count in items:
+            # bounded: once MAX_CATEGORIES values are known, new ones are lumped
+            if value in counter or len(counter) < MAX_CATEGORIES:
+                counter[value] += int(count)
+            else:
+                counter[OTHER] += count
+
+    def _add_window(self, window, counts):
+        if window in self.windows:
+            self.windows[window] = self.windows[window] + counts
+        else:
+            self.windows[window] = np.asarray(counts, dtype=np.int64).copy()
+            while len(self.windows) > self.max_windows:
+                self.windows.popitem(last=False)
+
+    def merge(self, other):
+        """Fold another monitor (same model) into this one."""
+        for col, sketch in self.sketches.items():
+            sketch.merge(other.sketches[col])
+            self.sum_squares[col] += other.sum_squares[col]
+            self.clipped[col][0] += other.clipped[col][0]
+            self.clipped[col][1] += other.clipped[col][1]
+        for col, counter in self.categories.items():
+            self._count_categories(counter, other.categories[col].items())
+            self.category_nulls[col] += other.category_nulls[col]
+        self.rows += other.rows
+        self.personas += other.personas
+        for window, counts in other.windows.items():
+            self._add_window(window, counts)
+        self.windows = OrderedDict(sorted(self.windows.items())[-self.max_windows:])
+        return self
+
+    # ---------------- reports ----------------
+    def _numeric_report(self, col):
+        sketch = self.sketches[col]
+        ref = self.reference["numeric"].get(col, {})
+        observed = sketch.count
+        total = observed + sketch.nulls
+        low, high = self.clipped[col]
+        entry = {
+            "count": total,
+            "null_rate": sketch.nulls / total if total else None,
+            "ref_null_rate": ref.get("null_rate"),
+            "clip_share": (low + high) / observed if observed else None,
+            "clip_low_share": low / observed if observed else None,
+            "clip_high_share": high / observed if observed else None,
+            "ref_clip_share": ref.get("clip_share"),
+            "z_mean": sketch.mean if observed else None,
+            "z_std": float(np.sqrt(max(self.sum_squares[col] / observed - sketch.mean ** 2, 0.0)))
+            if observed else None,
+            "psi": None,
+            "wasserstein": None,
+        }
+        quantiles = ref.get("quantiles")
+        if quantiles is not None and observed:
+            probs = np.asarray(self.reference["probs"])
+            quantiles = np.asarray(quantiles)
+            # clipped / discrete features put whole deciles on one value, so
+            # bins are (e_i, e_i+1] over the distinct decile edges and the
+            # expected shares come from the reference grid itself
+            edges = np.unique(np.interp(DECILES, probs, quantiles))
+            ref_cdf = np.searchsorted(np.sort(quantiles), edges, side="right") / len(quantiles)
+            expected = np.diff(np.concatenate([[0.0], ref_cdf, [1.0]]))
+            actual = np.diff(np.concatenate([[0.0], sketch.cdf(edges), [1.0]]))
+            entry["psi"] = psi(expected, actual)
+            entry["wasserstein"] = float(np.mean(np.abs(sketch.quantile(probs) - quantiles)))
+        entry["approximate"] = bool(ref.get("approximate"))
+        entry["status"] = None if entry["approximate"] else psi_status(entry["psi"])
+        return entry
+
+    def _categorical_report(self, col):
+        ref = self.reference["categorical"][col]
+        counter = self.categories[col]
+        observed = sum(counter.values())
+        total = observed + self.category_nulls[col]
+        domain = {category_label(value) for value in ref["domain"]}
+        unseen = sum(count for value, count in counter.items() if value not in domain)
+        entry = {
+            "count": total,
+            "null_rate": self.category_nulls[col] / total if total else None,
+            "ref_null_rate": ref.get("null_rate"),
+            "unseen_share": unseen / observed if observed else None,
+            "shares": {value: count / observed for value, count in counter.most_common()} if observed else {},
+            "psi": None,
+        }
+        if ref.get("shares") and observed:
+            keys = sorted(set(ref["shares"]) | set(counter))
+            entry["psi"] = psi([ref["shares"].get(key, 0.0) for key in keys],
+                               [counter.get(key, 0) / observed for key in keys])
+        entry["status"] = psi_status(entry["psi"])
+        return entry
+
+    def _persona_shares(self, counts):
+        total = counts.sum()
+        return {
+            PERSONA_DETAILS.get(cid, {}).get("name", str(cid)): (counts[cid] / total if total else 0.0)
+            for cid in range(self.n_clusters)
+        }
+
+    def report(self):
+        """JSON-serialisable drift summary."""
+        ref_personas = self.reference.get("personas")
+        persona_psi = None
+        if ref_personas is not None and self.personas.sum():
+            persona_psi = psi(ref_personas, self.personas / self.personas.sum())
+        numeric = {col: self._numeric_report(col) for col in self.compiled.numeric_columns}
+        categorical = {col: self._categorical_report(col) for col in self.categories}
+        alerts = [
+            f"{col}: PSI {entry['psi']:.3f} ({entry['status']})"
+            for col, entry in {**numeric, **categorical}.items()
+            if entry["status"] in ("moderate", "major")
+        ]
+        if psi_status(persona_psi) in ("moderate", "major"):
+            alerts.append(f"persona mix: PSI {persona_psi:.3f} ({psi_status(persona_psi)})")
+        for col, entry in categorical.items():
+            if entry["unseen_share"]:
+                alerts.append(f"{col}: {entry['unseen_share']:.1%} of values unseen in training")
+        return {
+            "rows": self.rows,
+            "reference": self.reference["source"],
+            "numeric": numeric,
+            "categorical": categorical,
+            "personas": {
+                "shares": self._persona_shares(self.personas),
+                "reference": None if ref_personas is None else self._persona_shares(np.asarray(ref_personas)),
+                "psi": persona_psi,
+                "status": psi_status(persona_psi),
+                "windows": [
+                    {"window": window, "rows": int(counts.sum()), "shares": self._persona_shares(counts)}
+                    for window, counts in self.windows.items()
+                ],
+            },
+            "alerts": alerts,
+        }
+
+    def to_reference(self):
+        """Freeze what was observed so far into a reference profile."""
+        numeric = {}
+        for col in self.compiled.numeric_columns:
+            entry = self._numeric_report(col)
+            sketch = self.sketches[col]
+            numeric[col] = {
+                "quantiles": sketch.quantile(PROBS).tolist() if sketch.count else None,
+                "null_rate": entry["null_rate"],
+                "clip_share": entry["clip_share"],
+            }
+        categorical = {}
+        for col, ref in self.reference["categorical"].items():
+            entry = self._categorical_report(col)
+            categorical[col] = {"domain": ref["domain"], "shares": entry["shares"],
+                                "null_rate": entry["null_rate"]}
+        total = self.personas.sum()
+        return {
+            "source": "data",
+            "rows": self.rows,
+            "probs": PROBS.tolist(),
+            "numeric": numeric,
+            "categorical": categorical,
+            "personas": (self.personas / total).tolist() if total else None,
+        }
+
+
+# ---------------------------------------------------------
+# FILE DRIVERS
+# ---------------------------------------------------------
+def monitor_file(path, model, reference=None, chunksize=100_000, window=None):
+    """Score `path` chunk by chunk and feed every chunk to a DriftMonitor."""
+    from batch_score import iter_chunks
+
+    compiled = _compiled(model)
+    monitor = DriftMonitor(model, reference=reference)
+    for i, chunk in enumerate(iter_chunks(path, chunksize=chunksize, columns=FEATURE_COLUMNS)):
+        monitor.update(chunk, compiled.predict(chunk), window=window or f"chunk-{i:05d}")
+    return monitor
+
+
+def build_reference(path, model, chunksize=100_000):
+    """Reference profile (JSON-serialisable) from a training / baseline file."""
+    return monitor_file(path, model, chunksize=chunksize, window="reference").to_reference()
+
+
+def load_reference(path):
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def main(argv=None):
+    from batch_score import DEFAULT_CHUNKSIZE, DEFAULT_MODEL_PATH, load_model
+
+    parser = argparse.ArgumentParser(description="Feature drift and persona-mix monitoring.")
+    parser.add_argument("command", choices=["reference", "report"])
+    parser.add_argument("input", help="CSV or Parquet file with FEATURE_COLUMNS.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to model.pkl or artifact dir.")
+    parser.add_argument("--reference", help="Reference profile JSON (report only; default: the model).")
+    parser.add_argument("--output", help="Where to write the JSON result.")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    model = load_model(args.model)
+    start = time.perf_counter()
+    if args.command == "reference":
+        result = build_reference(args.input, model, chunksize=args.chunksize)
+    else:
+        reference = load_reference(args.reference) if args.reference else None
+        result = monitor_file(args.input, model, reference, chunksize=args.chunksize).report()
+        for alert in result["alerts"]:
+            print(f"  ALERT {alert}")
+    rows = result["rows"]
+    elapsed = time.perf_counter() - start
+    print(f"{rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/sec)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2)
+        print(f"Written to {args.output}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+# incremental_score.py
+# ---------------------------------------------------------
+# INCREMENTAL RE-SCORING (only new / changed customers hit the model)
+# ---------------------------------------------------------
+# Usage:
+#   python incremental_score.py snapshot.parquet personas.parquet \
+#       --id-column Customer_ID --state persona_state.parquet
+#
+# The state file keeps one row per customer of the last run:
+#   id, feature fingerprint (prediction_cache.feature_fingerprints), cluster_id
+# plus, in its Parquet metadata, the SHA-256 of the model artifact and the
+# feature list. A new snapshot is streamed chunk by chunk; customers whose
+# fingerprint matches the state reuse their stored cluster_id, the rest
+# (new or changed) are scored with the model. The output is the merged,
+# full persona table for the snapshot, in snapshot order.
+#
+# A different model artifact (or feature list) forces a full re-score, as
+# does --full. The state is replaced atomically once the run completes,
+# so an interrupted run leaves the previous state intact.
+#
+# A state of up to --max-state-rows customers is joined in memory. A larger
+# one is never loaded whole: the snapshot's (row, id, fingerprint) and the
+# state are hash-partitioned by id into temporary Parquet files, joined one
+# partition at a time, and the labels to reuse are kept in a memory-mapped
+# array (4 bytes per snapshot row) read back during the scoring pass.
+#
+# CSV snapshots are parsed with float_precision="round_trip" and every
+# feature is hashed as float64, so a snapshot that moves between CSV and
+# Parquet (float round trip, int8 vs float columns) keeps its fingerprints.
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch_score import (
+    DEFAULT_CHUNKSIZE, DEFAULT_MODEL_PATH, ChunkWriter, attach_personas, check_columns,
+    file_format, iter_chunks, load_model, score_frame,
+)
+from persona_config import FEATURE_COLUMNS
+from prediction_cache import artifact_fingerprint, feature_fingerprints
+
+FINGERPRINT_COLUMN = "fingerprint"
+LABEL_COLUMN = "cluster_id"
+STATE_METADATA_KEY = b"persona_state"
+ROW_COLUMN = "row"
+DEFAULT_MAX_STATE_ROWS = 2_000_000
+# CSV floats must parse to the exact values a Parquet snapshot holds
+FLOAT_PRECISION = "round_trip"
+
+
+# ---------------------------------------------------------
+# STATE
+# ---------------------------------------------------------
+def read_state_metadata(path):
+    """(rows, metadata) of a state file without reading it; (None, {}) when absent."""
+    if path is None or not os.path.exists(path):
+        return None, {}
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    metadata = json.loads((parquet.schema_arrow.metadata or {}).get(STATE_METADATA_KEY, b"{}"))
+    return parquet.metadata.num_rows, metadata
+
+
+def load_state(path, id_column):
+    """
+    Return (state_frame, metadata) or (None, {}) when there is no state yet.
+    The frame is indexed by customer id; metadata holds model_version,
+    feature_columns and seconds_per_row (bulk scoring cost of that run).
+    """
+    if path is None or not os.path.exists(path):
+        return None, {}
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    metadata = json.loads((table.schema.metadata or {}).get(STATE_METADATA_KEY, b"{}"))
+    state = table.to_pandas()
+    if id_column not in state.columns:
+        raise ValueError(f"State file {path!r} has no {id_column!r} column.")
+    # a snapshot with repeated ids stores the last occurrence
+    state = state.drop_duplicates(id_column, keep="last").set_index(id_column)
+    return state, metadata
+
+
+class StateWriter:
+    """
+    Stream the new state to `<path>.tmp` and move it into place on commit().
+    `metadata` may be updated until the first write.
+    """
+
+    def __init__(self, path, id_column, metadata):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.id_column = id_column
+        self.metadata = metadata
+        self._writer = None
+
+    def write(self, ids, fingerprints, labels):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({
+            self.id_column: ids,
+            FINGERPRINT_COLUMN: pa.array(fingerprints, type=pa.uint64()),
+            LABEL_COLUMN: pa.array(labels, type=pa.int32()),
+        })
+        if self._writer is None:
+            metadata = {STATE_METADATA_KEY: json.dumps(self.metadata).encode()}
+            self._writer = pq.ParquetWriter(self.tmp_path, table.schema.with_metadata(metadata))
+        self._writer.write_table(table.cast(self._writer.schema))
+
+    def commit(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+# ---------------------------------------------------------
+# PARTITIONED JOIN (states too large for memory)
+# ---------------------------------------------------------
+def _id_values(ids):
+    """Ids as int64 (any integer width) or objects, so every source hashes alike."""
+    ids = np.asarray(ids)
+    return ids.astype(np.int64) if ids.dtype.kind in "iu" else ids.astype(object)
+
+
+def _partition_of(ids, partitions):
+    return (pd.util.hash_array(_id_values(ids)) % np.uint64(partitions)).astype(np.intp)
+
+
+class _PartitionWriters:
+    """One lazily opened Parquet file per partition under `directory`."""
+
+    def __init__(self, directory, prefix, partitions):
+        self.paths = [os.path.join(directory, f"{prefix}-{p:04d}.parquet") for p in range(partitions)]
+        self._writers = [None] * partitions
+
+    def write(self, table, parts):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        order = np.argsort(parts, kind="stable")
+        bounds = np.searchsorted(parts[order], np.arange(len(self.paths) + 1))
+        for p, path in enumerate(self.paths):
+            if bounds[p] == bounds[p + 1]:
+                continue
+            part = table.take(pa.array(order[bounds[p]:bounds[p + 1]]))
+            if self._writers[p] is None:
+                self._writers[p] = pq.ParquetWriter(path, part.schema)
+            self._writers[p].write_table(part.cast(self._writers[p].schema))
+
+    def close(self):
+        for writer in self._writers:
+            if writer is not None:
+                writer.close()
+
+    def read(self, p):
+        import pyarrow.parquet as pq
+
+        return pq.read_table(self.paths[p]) if self._writers[p] is not None else None
+
+
+def join_state_on_disk(input_path, state_path, id_column, partitions, workdir,
+                       chunksize=DEFAULT_CHUNKSIZE, columns=None):
+    """
+    Join a snapshot with a large state file in bounded memory.
+
+    Returns (prior, counts): prior[i] is the stored cluster_id to reuse for
+    snapshot row i, or -1 when the row is new or changed (a memory-mapped
+    int32 array in `workdir`); counts holds new, changed and removed.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    snapshot = _PartitionWriters(workdir, "snapshot", partitions)
+    rows = 0
+    try:
+        for chunk in iter_chunks(input_path, chunksize=chunksize, columns=columns,
+                                 float_precision=FLOAT_PRECISION):
+            check_columns(chunk)
+            if id_column not in chunk.columns:
+                raise ValueError(f"Input has no id column {id_column!r}.")
+            ids = chunk[id_column].to_numpy()
+            table = pa.table({
+                ROW_COLUMN: pa.array(np.arange(rows, rows + len(chunk)), type=pa.int64()),
+                id_column: _id_values(ids),
+                FINGERPRINT_COLUMN: pa.array(feature_fingerprints(chunk), type=pa.uint64()),
+            })
+            snapshot.write(table, _partition_of(ids, partitions))
+            rows += len(chunk)
+    finally:
+        snapshot.close()
+
+    state = _PartitionWriters(workdir, "state", partitions)
+    try:
+        parquet = pq.ParquetFile(state_path)
+        if id_column not in parquet.schema_arrow.names:
+            raise ValueError(f"State file {state_path!r} has no {id_column!r} column.")
+        for batch in parquet.iter_batches(batch_size=chunksize):
+            ids = batch.column(id_column).to_numpy(zero_copy_only=False)
+            table = pa.table({
+                id_column: _id_values(ids),
+                FINGERPRINT_COLUMN: batch.column(FINGERPRINT_COLUMN),
+                LABEL_COLUMN: batch.column(LABEL_COLUMN),
+            })
+            state.write(table, _partition_of(ids, partitions))
+    finally:
+        state.close()
+
+    prior = np.lib.format.open_memmap(os.path.join(workdir, "prior.npy"), mode="w+",
+                                      dtype=np.int32, shape=(rows,))
+    counts = {"new": 0, "changed": 0, "removed": 0}
+    for p in range(partitions):
+        part = snapshot.read(p)
+        stored = state.read(p)
+        if stored is not None:
+            # a snapshot with repeated ids stored the last occurrence
+            stored = stored.to_pandas().drop_duplicates(id_column, keep="last").set_index(id_column)
+        if part is None:
+            counts["removed"] += 0 if stored is None else len(stored)
+            continue
+        positions = part.column(ROW_COLUMN).to_numpy()
+        if stored is None:
+            prior[positions] = -1
+            counts["new"] += len(positions)
+            continue
+        found = stored.index.get_indexer(part.column(id_column).to_numpy(zero_copy_only=False))
+        known = found >= 0
+        fingerprints = part.column(FINGERPRINT_COLUMN).to_numpy()
+        stored_fingerprints = stored[FINGERPRINT_COLUMN].to_numpy(dtype=np.uint64)
+        reuse = np.zeros(len(found), dtype=bool)
+        reuse[known] = stored_fingerprints[found[known]] == fingerprints[known]
+        labels = np.full(len(found), -1, dtype=np.int32)
+        labels[reuse] = stored[LABEL_COLUMN].to_numpy(dtype=np.int32)[found[reuse]]
+        prior[positions] = labels
+        seen = np.zeros(len(stored), dtype=bool)
+        seen[found[known]] = True
+        counts["new"] += int((~known).sum())
+        counts["changed"] += int((known & ~reuse).sum())
+        counts["removed"] += int((~seen).sum())
+    prior.flush()
+    return prior, counts
+
+
+# ---------------------------------------------------------
+# INCREMENTAL SCORING
+# ---------------------------------------------------------
+def incremental_score(input_path, output_path, state_path, id_column, model=None,
+                      model_path=DEFAULT_MODEL_PATH, compiled=False, chunksize=DEFAULT_CHUNKSIZE,
+                      passthrough=None, full=False, progress=None, max_state_rows=DEFAULT_MAX_STATE_ROWS):
+    """
+    Score a snapshot, reusing stored labels for customers whose features
+    are unchanged since the last run under the same model.
+
+    Parameters
+    ----------
+    input_path, output_path : str
+        Snapshot and merged persona table (CSV or Parquet).
+    state_path : str
+        Parquet fingerprint store; created on the first run.
+    id_column : str
+        Customer id column of the snapshot (kept in the output).
+    model : fitted model or None
+        Loaded from `model_path` when None. Its version is always the
+        SHA-256 of `model_path`, so pass the matching path.
+    full : bool
+        Ignore the state and re-score everything.
+    passthrough : list or None
+        Snapshot columns to copy to the output (None keeps all of them).
+    progress : callable or None
+        Called as progress(rows_done, elapsed_seconds) after every chunk.
+    max_state_rows : int
+        Largest state joined in memory; a larger one is joined on disk in
+        ceil(rows / max_state_rows) hash partitions (one extra snapshot pass).
+
+    Returns
+    -------
+    dict with rows, new, changed, unchanged, removed, scored, full_rescore
+    (and its reason), seconds, scoring_seconds and the estimated seconds
+    saved by not scoring the unchanged rows.
+    """
+    model_version = artifact_fingerprint(model_path)
+    if model is None:
+        model = load_model(model_path, compiled=compiled)
+
+    state_rows, metadata = read_state_metadata(state_path)
+    reason = None
+    if full:
+        reason = "requested"
+    elif state_rows is None:
+        reason = "no previous state"
+    elif metadata.get("model_version") != model_version:
+        reason = "model changed"
+    elif metadata.get("feature_columns") != FEATURE_COLUMNS:
+        reason = "feature columns changed"
+    # per-row cost of a full chunk under this model; small changed-row
+    # batches cost more per row and would overstate the savings
+    bulk_seconds_per_row = metadata.get("seconds_per_row") if reason is None else None
+
+    columns = out_columns = source_schema = None
+    if passthrough is not None:
+        out_columns = list(dict.fromkeys([id_column] + list(passthrough)))
+        columns = list(dict.fromkeys(out_columns + FEATURE_COLUMNS))
+
+    state = prior = workdir = None
+    stats = {"rows": 0, "new": 0, "changed": 0, "unchanged": 0, "scored": 0}
+    start = time.perf_counter()
+    if reason is None and state_rows <= max_state_rows:
+        state, _ = load_state(state_path, id_column)
+        state_ids = state.index
+        state_fingerprints = state[FINGERPRINT_COLUMN].to_numpy(dtype=np.uint64)
+        state_labels = state[LABEL_COLUMN].to_numpy(dtype=np.int32)
+        seen = np.zeros(len(state), dtype=bool)
+    elif reason is None:
+        workdir = tempfile.mkdtemp(prefix=".persona-join-", dir=os.path.dirname(os.path.abspath(state_path)))
+        partitions = -(-state_rows // max_state_rows)
+        try:
+            prior, join_counts = join_state_on_disk(input_path, state_path, id_column, partitions, workdir,
+                                                    chunksize=chunksize, columns=columns)
+        except BaseException:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+    if file_format(input_path) == "parquet":
+        import pyarrow.parquet as pq
+
+        source_schema = pq.read_schema(input_path)
+
+    scoring_seconds = 0.0
+    state_writer = StateWriter(state_path, id_column, {
+        "model_version": model_version,
+        "feature_columns": FEATURE_COLUMNS,
+        "seconds_per_row": bulk_seconds_per_row,
+    })
+    try:
+        with ChunkWriter(output_path, schema=source_schema) as writer:
+            for chunk in iter_chunks(input_path, chunksize=chunksize, columns=columns,
+                                     float_precision=FLOAT_PRECISION):
+                check_columns(chunk)
+                if id_column not in chunk.columns:
+                    raise ValueError(f"Input has no id column {id_column!r}.")
+                ids = chunk[id_column].to_numpy()
+                fingerprints = feature_fingerprints(chunk)
+                labels = np.empty(len(chunk), dtype=np.int32)
+
+                reuse = np.zeros(len(chunk), dtype=bool)
+                if state is not None:
+                    positions = state_ids.get_indexer(ids)
+                    known = positions >= 0
+                    seen[positions[known]] = True
+                    reuse[known] = state_fingerprints[positions[known]] == fingerprints[known]
+                    labels[reuse] = state_labels[positions[reuse]]
+                    stats["new"] += int((~known).sum())
+                    stats["changed"] += int((known & ~reuse).sum())
+                elif prior is not None:
+                    stored = prior[stats["rows"]:stats["rows"] + len(chunk)]
+                    reuse = stored >= 0
+                    labels[reuse] = stored[reuse]
+                else:
+                    stats["new"] += len(chunk)
+
+                todo = ~reuse
+                if todo.any():
+                    t0 = time.perf_counter()
+                    labels[todo] = score_frame(model, chunk[todo])
+                    chunk_seconds = time.perf_counter() - t0
+                    scoring_seconds += chunk_seconds
+                    if todo.all() and bulk_seconds_per_row is None:
+                        bulk_seconds_per_row = chunk_seconds / len(chunk)
+                        state_writer.metadata["seconds_per_row"] = bulk_seconds_per_row
+
+                stats["rows"] += len(chunk)
+                stats["unchanged"] += int(reuse.sum())
+                stats["scored"] += int(todo.sum())
+                state_writer.write(ids, fingerprints, labels)
+                writer.write(attach_personas(chunk, labels, out_columns))
+                if progress is not None:
+                    progress(stats["rows"], time.perf_counter() - start)
+        state_writer.commit()
+    except BaseException:
+        state_writer.abort()
+        raise
+    finally:
+        if workdir is not None:
+            del prior
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    seconds = time.perf_counter() - start
+    per_row = bulk_seconds_per_row
+    if per_row is None:
+        # unknown (NaN) when every row was reused and nothing was timed
+        per_row = scoring_seconds / stats["scored"] if stats["scored"] else float("nan")
+    removed = 0
+    if state is not None:
+        removed = int((~seen).sum())
+    elif workdir is not None:
+        stats["new"], stats["changed"] = join_counts["new"], join_counts["changed"]
+        removed = join_counts["removed"]
+    stats.update({
+        "removed": removed,
+        "full_rescore": reason is not None,
+        "full_rescore_reason": reason,
+        "model_version": model_version,
+        "seconds": seconds,
+        "scoring_seconds": scoring_seconds,
+        "estimated_seconds_saved": per_row * stats["unchanged"] if stats["unchanged"] else 0.0,
+    })
+    return stats
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Re-score only customers whose features changed since the last run."
+    )
+    parser.add_argument("input", help="Snapshot CSV or Parquet file with FEATURE_COLUMNS and an id column.")
+    parser.add_argument("output", help="Merged persona table (CSV or Parquet).")
+    parser.add_argument("--id-column", required=True, help="Customer id column.")
+    parser.add_argument("--state", required=True,
+                        help="Parquet fingerprint store (read, then replaced after the run).")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to model.pkl.")
+    parser.add_argument("--compiled", action="store_true",
+                        help="Score changed rows with the pure-NumPy compiled predictor.")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="Rows per chunk (bounds memory use).")
+    parser.add_argument("--passthrough", nargs="*", default=None,
+                        help="Input columns to keep next to the id (default: all).")
+    parser.add_argument("--full", action="store_true", help="Ignore the state and re-score everyone.")
+    parser.add_argument("--max-state-rows", type=int, default=DEFAULT_MAX_STATE_ROWS,
+                        help="Largest state joined in memory; larger ones are joined on disk by partition.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if file_format(args.state) != "parquet":
+        raise SystemExit("--state must be a .parquet file.")
+
+    def report(rows, elapsed):
+        print(f"  {rows:,} rows  ({rows / elapsed:,.0f} rows/sec)", flush=True)
+
+    stats = incremental_score(
+        args.input, args.output, args.state, args.id_column,
+        model_path=args.model, compiled=args.compiled, chunksize=args.chunksize,
+        passthrough=args.passthrough, full=args.full, progress=report,
+        max_state_rows=args.max_state_rows,
+    )
+    if stats["full_rescore"]:
+        print(f"Full re-score ({stats['full_rescore_reason']}).")
+    print(
+        f"{stats['rows']:,} rows: {stats['unchanged']:,} unchanged (skipped), "
+        f"{stats['changed']:,} changed, {stats['new']:,} new, {stats['removed']:,} removed"
+    )
+    saved = stats["estimated_seconds_saved"]
+    saved = "n/a" if saved != saved else f"~{saved:.2f}s"
+    print(
+        f"Scored {stats['scored']:,} rows in {stats['scoring_seconds']:.2f}s; "
+        f"skipping saved {saved}; total {stats['seconds']:.2f}s -> {args.output}"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# input_validation.py
+# ---------------------------------------------------------
+# VECTORIZED INPUT VALIDATION / COERCION (quarantine instead of failing)
+# ---------------------------------------------------------
+# Usage:
+#   result = validate_frame(chunk, row_offset=rows_so_far)
+#   model.predict(result.valid[FEATURE_COLUMNS])    # only rows that passed
+#   result.quarantine     # rejected rows: input_row, validation_errors + raw values
+#   result.error_counts   # {"Age: out of range [18, 100]": 12, ...}
+#
+# The rules are the app.py form bounds in persona_config.FEATURE_RANGES:
+#   numeric (min, max, dtype)   parsed with to_numeric, finite, within [min, max]
+#   Gender / Occupation         one of the options; case and surrounding
+#                               whitespace are normalised ("  male" -> "Male")
+#   City_Tier / EMI_Presence    numeric, one of the options
+# Missing values pass: the pipeline imputes them. With strict_integers, int
+# features must also hold whole numbers.
+#
+# Every check is a whole-column array operation (text normalisation runs per
+# distinct value, not per row), and error strings are only built for the
+# rejected rows, so a clean 100k-row chunk costs a few milliseconds.
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from persona_config import FEATURE_COLUMNS, FEATURE_RANGES
+
+ROW_COLUMN = "input_row"
+ERRORS_COLUMN = "validation_errors"
+
+ValidationResult = namedtuple("ValidationResult", ["valid", "quarantine", "error_counts"])
+
+
+def _numeric(series, as_float):
+    if not is_numeric_dtype(series.dtype):
+        series = pd.to_numeric(series.astype(object), errors="coerce")
+    if as_float and series.dtype.kind != "f":
+        # float-valued features (City_Tier's encoder) must stay float
+        series = series.astype(np.float64)
+    return series
+
+
+def _labels(series, options):
+    """Map text onto the options as a Categorical (missing when unknown); also return the unknown mask."""
+    lookup = {str(option).strip().lower(): code for code, option in enumerate(options)}
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series)
+    # trailing -1 so that a missing value (code -1) stays missing
+    code_map = np.array([lookup.get(str(value).strip().lower(), -2) for value in uniques] + [-1])
+    new_codes = code_map[codes]
+    unknown = new_codes == -2
+    new_codes[unknown] = -1
+    return pd.Categorical.from_codes(new_codes, categories=list(options)), unknown
+
+
+def _check_column(col, series, strict_integers):
+    """Return (coerced column, [(reason, mask), ...])."""
+    spec = FEATURE_RANGES[col]
+    present = series.notna().to_numpy()
+    if not isinstance(spec, tuple) and all(isinstance(option, str) for option in spec):
+        values, unknown = _labels(series, spec)
+        return values, [(f"not one of {spec}", unknown)]
+
+    as_float = (spec[2] is float) if isinstance(spec, tuple) else any(isinstance(o, float) for o in spec)
+    values = _numeric(series, as_float)
+    array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    parsed = ~np.isnan(array)
+    checks = [("not a number", present & ~parsed)]
+    finite = np.isfinite(array)
+    checks.append(("not finite", parsed & ~finite))
+    if isinstance(spec, tuple):
+        low, high, kind = spec
+        with np.errstate(invalid="ignore"):
+            checks.append((f"out of range [{low}, {high}]", finite & ((array < low) | (array > high))))
+            if strict_integers and kind is int:
+                checks.append(("not a whole number", finite & (array != np.floor(array))))
+    else:
+        checks.append((f"not one of {spec}", finite & ~np.isin(array, spec)))
+    return values, checks
+
+
+def validate_frame(df, row_offset=0, strict_integers=False):
+    """
+    Validate and coerce the FEATURE_COLUMNS of `df`.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Must contain every FEATURE_COLUMN (raises ValueError otherwise);
+        other columns are carried along untouched.
+    row_offset : int
+        Position of the first row in the whole input, for `input_row`.
+    strict_integers : bool
+        Also reject fractional values in integer features.
+
+    Returns
+    -------
+    ValidationResult(valid, quarantine, error_counts)
+        valid: the passing rows with coerced features; quarantine: the
+        rejected rows' original values (features as text), their input
+        position and a "; "-joined list of reasons; error_counts: rows per
+        "<column>: <reason>".
+    """
+    missing = [col for col in FEATURE_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Input is missing required feature columns: {missing}")
+
+    coerced, failures = {}, []
+    bad = np.zeros(len(df), dtype=bool)
+    for col in FEATURE_COLUMNS:
+        series = df[col]
+        values, checks = _check_column(col, series, strict_integers)
+        if values is not series:
+            coerced[col] = values
+        for reason, mask in checks:
+            if mask.any():
+                failures.append((f"{col}: {reason}", mask))
+                bad |= mask
+
+    valid = df
+    if coerced:
+        # shallow copy: only the coerced columns are new arrays
+        valid = df.copy(deep=False)
+        for col, values in coerced.items():
+            valid[col] = values
+    errors = np.full(int(bad.sum()), "", dtype=object)
+    for message, mask in failures:
+        errors[mask[bad]] += message + "; "
+    quarantine = df[bad].astype({col: "string" for col in FEATURE_COLUMNS})
+    quarantine.insert(0, ERRORS_COLUMN, [text[:-2] for text in errors])
+    quarantine.insert(0, ROW_COLUMN, row_offset + np.flatnonzero(bad))
+    return ValidationResult(
+        valid[~bad] if bad.any() else valid,
+        quarantine,
+        {message: int(mask.sum()) for message, mask in failures},
+    )
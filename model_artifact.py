@@ -0,0 +1,173 @@
+# model_artifact.py
+# ---------------------------------------------------------
+# SLIM MODEL ARTIFACT (fast cold start, shared memory-mapped params)
+# ---------------------------------------------------------
+# Usage:
+#   python model_artifact.py model.pkl --output model_slim --measure
+#
+# Writes a directory with:
+#   pipeline.joblib     the sklearn Pipeline without fit-only state (e.g. the
+#                       KMeans labels_ array with one entry per training row)
+#   compiled/           CompiledPersonaModel parameters: manifest.json plus
+#                       one flat float64 params.bin that is np.memmap-ed
+#
+# The compiled model is the fast path: `load_artifact(path)` maps params.bin
+# read-only, so every worker process shares one page-cached copy and only
+# NumPy has to be imported (~0.1 s, ~36 MB on the shipped model). The slim
+# pipeline is only smaller on disk; loading it still imports scikit-learn,
+# which is nearly all of its ~1.3 s / ~184 MB cold start, so it is loaded
+# normally rather than memory-mapped (its arrays are a few KB).
+
+import argparse
+import copy
+import json
+import os
+import subprocess
+import sys
+
+PIPELINE_FILE = "pipeline.joblib"
+COMPILED_DIR = "compiled"
+
+# attributes only needed during/after fitting, never by predict/transform
+FIT_ONLY_ATTRIBUTES = ("labels_",)
+
+
+# ---------------------------------------------------------
+# EXPORT
+# ---------------------------------------------------------
+def strip_fit_only(pipeline):
+    """Return a deep copy of `pipeline` without FIT_ONLY_ATTRIBUTES."""
+    from sklearn.base import BaseEstimator
+
+    slim = copy.deepcopy(pipeline)
+    seen = set()
+
+    def visit(obj):
+        if id(obj) in seen:
+            return
+        seen.add(id(obj))
+        if isinstance(obj, BaseEstimator):
+            for attr in FIT_ONLY_ATTRIBUTES:
+                if attr in obj.__dict__:
+                    del obj.__dict__[attr]
+            for value in obj.__dict__.values():
+                visit(value)
+        elif isinstance(obj, (list, tuple)):
+            for value in obj:
+                visit(value)
+
+    visit(slim)
+    return slim
+
+
+def export_artifact(pipeline, output_dir):
+    """Write the slim pipeline and the memory-mappable compiled parameters."""
+    import joblib
+
+    from compiled_model import CompiledPersonaModel
+
+    os.makedirs(output_dir, exist_ok=True)
+    joblib.dump(strip_fit_only(pipeline), os.path.join(output_dir, PIPELINE_FILE))
+    CompiledPersonaModel.from_pipeline(pipeline).save(os.path.join(output_dir, COMPILED_DIR))
+    return output_dir
+
+
+# ---------------------------------------------------------
+# LOAD
+# ---------------------------------------------------------
+def is_artifact(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, COMPILED_DIR, "manifest.json"))
+
+
+def load_artifact(path, compiled=True):
+    """
+    Load an exported artifact directory.
+
+    compiled=True returns the memory-mapped CompiledPersonaModel (NumPy
+    only, the fast cold start); compiled=False returns the slim sklearn
+    Pipeline, which loads about as slowly as model.pkl.
+    """
+    if compiled:
+        from compiled_model import CompiledPersonaModel
+
+        return CompiledPersonaModel.load(os.path.join(path, COMPILED_DIR))
+    import joblib
+
+    return joblib.load(os.path.join(path, PIPELINE_FILE))
+
+
+# ---------------------------------------------------------
+# COLD-START MEASUREMENT
+# ---------------------------------------------------------
+_PROBES = {
+    "model.pkl (joblib)": "import joblib; joblib.load({path!r})",
+    "slim pipeline": "import model_artifact; model_artifact.load_artifact({path!r}, compiled=False)",
+    "compiled (mmap)": "import model_artifact; model_artifact.load_artifact({path!r})",
+}
+
+
+def measure_cold_start(code, repeats=3):
+    """Run `code` in fresh interpreters; return (best seconds, max RSS MB)."""
+    best = float("inf")
+    rss = 0.0
+    here = os.path.dirname(os.path.abspath(__file__))
+    for _ in range(repeats):
+        # VmHWM (peak RSS, kB) starts fresh at exec, unlike ru_maxrss which
+        # a spawned child can inherit from a large parent
+        probe = (
+            "import time; t = time.perf_counter()\n"
+            f"{code}\n"
+            "hwm = [l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')][0]\n"
+            "print(time.perf_counter() - t, hwm)"
+        )
+        out = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", probe],
+            cwd=here, capture_output=True, text=True, check=True,
+        ).stdout.split()
+        best = min(best, float(out[0]))
+        rss = max(rss, int(out[1]) / 1024)
+    return best, rss
+
+
+def compare_cold_start(model_path, artifact_dir, repeats=3):
+    targets = [model_path, artifact_dir, artifact_dir]
+    results = {}
+    for (label, template), path in zip(_PROBES.items(), targets):
+        seconds, rss = measure_cold_start(template.format(path=os.path.abspath(path)), repeats)
+        results[label] = {"seconds": seconds, "max_rss_mb": rss}
+    return results
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path) for name in files
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a slim persona model with memory-mapped compiled parameters.")
+    parser.add_argument("model", help="Fitted Pipeline pickle (e.g. model.pkl).")
+    parser.add_argument("--output", required=True, help="Artifact directory to write.")
+    parser.add_argument("--measure", action="store_true",
+                        help="Compare cold-start time and RSS of the original and exported model.")
+    args = parser.parse_args(argv)
+
+    import joblib
+
+    export_artifact(joblib.load(args.model), args.output)
+    print(f"{args.model}: {os.path.getsize(args.model) / 1024:,.0f} KB -> "
+          f"{args.output}/: {directory_size(args.output) / 1024:,.0f} KB")
+
+    if args.measure:
+        results = compare_cold_start(args.model, args.output)
+        for label, stats in results.items():
+            print(f"  {label:<22} load {stats['seconds'] * 1000:7.1f} ms   max RSS {stats['max_rss_mb']:6.1f} MB")
+        print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
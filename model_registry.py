@@ -0,0 +1,375 @@
+# model_registry.py
+# ---------------------------------------------------------
+# LOCAL MODEL REGISTRY (versioned publish, checksums, hot swap)
+# ---------------------------------------------------------
+# Usage:
+#   python model_registry.py publish model.pkl --registry models --note "retrain 2024-06"
+#   python model_registry.py list --registry models
+#   python model_registry.py promote v0002 --registry models --alias production
+#   python model_registry.py verify --registry models
+#
+#   registry = ModelRegistry("models")
+#   served = HotSwapModel(registry, alias="production")
+#   served.start()                          # background watcher thread
+#   version, model = served.current         # bind once per request
+#
+# Layout on disk:
+#   models/versions/v0001/model.pkl         the published artifact (file, or
+#                                           a model_artifact directory "model")
+#   models/versions/v0001/manifest.json     version, sha256, created, source, note
+#   models/aliases/production               text file holding a version id
+#
+# publish() copies into a hidden staging directory and writes the manifest
+# there, then renames the directory into versions/ (atomic on one
+# filesystem), so a reader never sees a half-copied version. Aliases are
+# swapped with os.replace. Every load copies the artifact to a private
+# temporary location, recomputes the SHA-256 of that copy and deserialises
+# the same copy, so a file changed between the check and the load cannot
+# slip through; an artifact that does not match its manifest is refused.
+#
+# HotSwapModel polls its alias; when it moves, the new version is loaded,
+# verified and warmed (a predict on synthetic rows) on the watcher thread,
+# then swapped in with a single reference assignment. A request that read
+# `current` before the swap finishes on the old model; a version that fails
+# to load is skipped and the old one keeps serving.
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from prediction_cache import artifact_fingerprint
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR = "versions"
+ALIASES_DIR = "aliases"
+MANIFEST_FILE = "manifest.json"
+DEFAULT_ALIAS = "production"
+WARM_ROWS = 256
+
+ServedModel = namedtuple("ServedModel", ["version", "model"])
+
+
+class ChecksumError(ValueError):
+    """A registered artifact no longer matches the SHA-256 in its manifest."""
+
+
+# ---------------------------------------------------------
+# REGISTRY
+# ---------------------------------------------------------
+class ModelRegistry:
+    """
+    Versioned model store in a local directory.
+
+    Parameters
+    ----------
+    root : str
+        Registry directory; created on first publish.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.versions_dir = os.path.join(root, VERSIONS_DIR)
+        self.aliases_dir = os.path.join(root, ALIASES_DIR)
+
+    # ---------------- publishing ----------------
+    def publish(self, source, note=None, alias=DEFAULT_ALIAS):
+        """
+        Register a copy of `source` (model.pkl or an artifact directory) and
+        point `alias` at it (None leaves the aliases alone). Publishing
+        content that is already registered reuses that version.
+        """
+        sha256 = artifact_fingerprint(source)
+        for manifest in self.versions():
+            if manifest["sha256"] == sha256:
+                if alias is not None:
+                    self.set_alias(alias, manifest["version"])
+                return manifest["version"]
+
+        os.makedirs(self.versions_dir, exist_ok=True)
+        staging = os.path.join(self.versions_dir, f".staging-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        try:
+            name = "model" if os.path.isdir(source) else "model.pkl"
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(staging, name))
+            else:
+                shutil.copyfile(source, os.path.join(staging, name))
+            if artifact_fingerprint(os.path.join(staging, name)) != sha256:
+                raise ChecksumError(f"{source!r} changed while it was being published.")
+            manifest = {
+                "sha256": sha256,
+                "artifact": name,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "source": os.path.abspath(source),
+                "note": note,
+            }
+            # rename fails if another publisher took the id first: try the next one
+            while True:
+                version = f"v{self._next_number():04d}"
+                manifest["version"] = version
+                with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as fh:
+                    json.dump(manifest, fh, indent=2)
+                try:
+                    os.rename(staging, os.path.join(self.versions_dir, version))
+                    break
+                except OSError:
+                    if not os.path.exists(os.path.join(self.versions_dir, version)):
+                        raise
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if alias is not None:
+            self.set_alias(alias, version)
+        return version
+
+    def _next_number(self):
+        numbers = [int(v["version"][1:]) for v in self.versions()]
+        return max(numbers, default=0) + 1
+
+    def set_alias(self, alias, version):
+        """Atomically point `alias` at a registered `version`."""
+        self.manifest(version)  # must exist
+        os.makedirs(self.aliases_dir, exist_ok=True)
+        path = os.path.join(self.aliases_dir, alias)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            fh.write(version)
+        os.replace(tmp_path, path)
+
+    # ---------------- lookup ----------------
+    def versions(self):
+        """Manifests of every registered version, oldest first."""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        manifests = []
+        for name in sorted(os.listdir(self.versions_dir)):
+            path = os.path.join(self.versions_dir, name, MANIFEST_FILE)
+            if not name.startswith(".") and os.path.exists(path):
+                with open(path, encoding="utf-8") as fh:
+                    manifests.append(json.load(fh))
+        return manifests
+
+    def aliases(self):
+        if not os.path.isdir(self.aliases_dir):
+            return {}
+        return {
+            alias: self.resolve(alias)
+            for alias in sorted(os.listdir(self.aliases_dir)) if not alias.endswith(".tmp")
+        }
+
+    def manifest(self, version):
+        path = os.path.join(self.versions_dir, version, MANIFEST_FILE)
+        if not os.path.exists(path):
+            raise KeyError(f"Unknown model version {version!r} in registry {self.root!r}.")
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+
+    def resolve(self, name):
+        """Version id for an alias or a version id."""
+        path = os.path.join(self.aliases_dir, name)
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as fh:
+                return fh.read().strip()
+        self.manifest(name)
+        return name
+
+    def path(self, version):
+        """Path of the artifact of `version`, as published."""
+        return os.path.join(self.versions_dir, version, self.manifest(version)["artifact"])
+
+    # ---------------- loading ----------------
+    def verify(self, version, path=None):
+        """Raise ChecksumError unless the artifact (or a copy at `path`) matches its manifest."""
+        expected = self.manifest(version)["sha256"]
+        actual = artifact_fingerprint(self.path(version) if path is None else path)
+        if actual != expected:
+            raise ChecksumError(
+                f"Model {version} is corrupt: sha256 {actual[:12]}... != manifest {expected[:12]}..."
+            )
+
+    def load(self, name, loader=None):
+        """Verify and load an alias or version; returns a ServedModel."""
+        if loader is None:
+            from batch_score import load_model as loader
+        version = self.resolve(name)
+        source = self.path(version)
+        copy_dir = tempfile.mkdtemp(prefix=f"persona-{version}-")
+        try:
+            # hash and deserialise the same bytes
+            local = os.path.join(copy_dir, os.path.basename(source))
+            if os.path.isdir(source):
+                shutil.copytree(source, local)
+            else:
+                shutil.copyfile(source, local)
+            self.verify(version, local)
+            # memory-mapped parameters stay valid after the copy is unlinked
+            return ServedModel(version, loader(local))
+        finally:
+            shutil.rmtree(copy_dir, ignore_errors=True)
+
+
+# ---------------------------------------------------------
+# HOT SWAP
+# ---------------------------------------------------------
+def warm_model(model, rows=WARM_ROWS):
+    """Run one predict on synthetic customers (first-call costs, sanity check)."""
+    from benchmark import synthetic_customers
+
+    model.predict(synthetic_customers(rows, seed=0))
+
+
+class HotSwapModel:
+    """
+    The model currently behind a registry alias, swapped in the background.
+
+    Parameters
+    ----------
+    registry : ModelRegistry
+    alias : str
+        Alias (or fixed version id) to follow.
+    loader : callable or None
+        path -> model; batch_score.load_model by default.
+    warm : callable or None
+        Called with a freshly loaded model before it is swapped in
+        (default: warm_model). An exception rejects that version.
+    poll_interval : float
+        Seconds between alias checks of the watcher thread.
+
+    The first version is loaded synchronously, so `current` is always set.
+    """
+
+    def __init__(self, registry, alias=DEFAULT_ALIAS, loader=None, warm=warm_model, poll_interval=2.0):
+        self.registry = registry
+        self.alias = alias
+        self.loader = loader
+        self.warm = warm
+        self.poll_interval = poll_interval
+        self.swaps = 0
+        self.last_error = None
+        self.loaded_at = None
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._current = None
+        self.check()
+        if self._current is None:
+            raise RuntimeError(f"Could not load {alias!r} from {registry.root!r}: {self.last_error}")
+
+    @property
+    def current(self):
+        """ServedModel(version, model); read it once and use that for the whole request."""
+        return self._current
+
+    @property
+    def version(self):
+        return self._current.version
+
+    def check(self):
+        """Swap in the alias' version if it moved; returns True on a swap."""
+        with self._lock:
+            try:
+                version = self.registry.resolve(self.alias)
+            except (OSError, KeyError) as exc:
+                self.last_error = str(exc)
+                return False
+            if (self._current is not None and version == self._current.version) or version in self._failed:
+                return False
+            try:
+                served = self.registry.load(version, self.loader)
+                if self.warm is not None:
+                    self.warm(served.model)
+            except Exception as exc:
+                # keep serving the old version; do not retry this one every poll
+                self._failed.add(version)
+                self.last_error = f"{version}: {exc}"
+                logger.error("Model %s rejected, still serving %s: %s",
+                             version, self._current.version if self._current else None, exc)
+                return False
+            previous = self._current
+            self._current = served
+            self.loaded_at = time.time()
+            if previous is not None:
+                self.swaps += 1
+                logger.info("Model %s -> %s (%s)", previous.version, version, self.alias)
+            return True
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name=f"model-watch-{self.alias}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            self.check()
+
+    def stats(self):
+        return {"alias": self.alias, "version": self.version, "swaps": self.swaps,
+                "loaded_at": self.loaded_at, "last_error": self.last_error}
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local versioned model registry.")
+    parser.add_argument("--registry", default="models", help="Registry directory.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish = commands.add_parser("publish", help="Register a model and point an alias at it.")
+    publish.add_argument("source", help="model.pkl or a model_artifact directory.")
+    publish.add_argument("--alias", default=DEFAULT_ALIAS, help="Alias to move ('' = none).")
+    publish.add_argument("--note", default=None)
+    promote = commands.add_parser("promote", help="Point an alias at an existing version.")
+    promote.add_argument("version")
+    promote.add_argument("--alias", default=DEFAULT_ALIAS)
+    commands.add_parser("list", help="Show versions and aliases.")
+    verify = commands.add_parser("verify", help="Re-check checksums (all versions by default).")
+    verify.add_argument("versions", nargs="*")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.registry)
+    if args.command == "publish":
+        version = registry.publish(args.source, note=args.note, alias=args.alias or None)
+        print(f"Published {args.source} as {version}" + (f" ({args.alias})" if args.alias else ""))
+    elif args.command == "promote":
+        registry.set_alias(args.alias, args.version)
+        print(f"{args.alias} -> {args.version}")
+    elif args.command == "list":
+        by_version = {}
+        for alias, version in registry.aliases().items():
+            by_version.setdefault(version, []).append(alias)
+        for manifest in registry.versions():
+            tags = ", ".join(by_version.get(manifest["version"], []))
+            print(f"{manifest['version']}  {manifest['sha256'][:12]}  {manifest['created']}  "
+                  f"{tags:<20}  {manifest.get('note') or ''}")
+    else:
+        failed = 0
+        for version in args.versions or [m["version"] for m in registry.versions()]:
+            try:
+                registry.verify(version)
+                print(f"{version}  ok")
+            except ChecksumError as exc:
+                failed += 1
+                print(f"{version}  FAILED  {exc}")
+        if failed:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
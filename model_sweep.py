@@ -0,0 +1,399 @@
+# model_sweep.py
+# ---------------------------------------------------------
+# HYPERPARAMETER SWEEP (k, n_init, Winsorizer quantiles, top-N categories)
+# ---------------------------------------------------------
+# Usage:
+#   python model_sweep.py history.parquet --k 3 4 5 6 7 --n-init auto 10 \
+#       --winsor 0.01:0.99 0.05:0.95 --top-n none 5 --output sweep.json
+#   python model_sweep.py history.parquet --k 3 4 5 --export-best model_candidate.pkl
+#
+# Refitting the whole Pipeline per candidate repeats the same preprocessing
+# over and over, although only the Winsorizer quantiles and TopNCategories'
+# top_n change it. The sweep instead:
+#   1. streams the input once into a StreamProfile (sketches, category
+#      counts, reservoir sample), as train_model.py does;
+#   2. fits the preprocessing once per distinct (lower_q, upper_q, top_n)
+#      and saves the transformed sample as a .npy matrix (reused across runs
+#      with --cache-dir);
+#   3. fans the KMeans fits (n_clusters x n_init) out over a process pool;
+#      workers memory-map the matrices, so they are not copied per task;
+#   4. reports inertia, silhouette on a fixed row sample and fit time per
+#      candidate.
+# Every candidate is scored on the same sample rows, so the numbers are
+# comparable across preprocessing configs. Silhouette is computed in each
+# config's own feature space.
+#
+# --export-best only considers candidates with one cluster per persona in
+# PERSONA_DETAILS: scoring, the app and the SQL export name clusters from it,
+# so a model with another k cannot be served until the personas are defined.
+
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.metrics import silhouette_score
+from sklearn.pipeline import Pipeline
+from threadpoolctl import threadpool_limits
+
+from batch_score import DEFAULT_CHUNKSIZE, iter_chunks
+from persona_config import FEATURE_COLUMNS, PERSONA_DETAILS
+from prediction_cache import artifact_signature
+from train_model import StreamProfile, _cover_categories, build_pipeline, categorical_columns, fit_preprocess
+
+DEFAULT_SWEEP_SAMPLE_SIZE = 100_000
+DEFAULT_SILHOUETTE_SAMPLE = 10_000
+
+PreprocessConfig = namedtuple("PreprocessConfig", ["lower_q", "upper_q", "top_n"])
+Candidate = namedtuple("Candidate", ["preprocess", "n_clusters", "n_init"])
+
+
+# ---------------------------------------------------------
+# PREPROCESSING (once per distinct config)
+# ---------------------------------------------------------
+def profile_input(input_path, sample_size=DEFAULT_SWEEP_SAMPLE_SIZE, chunksize=DEFAULT_CHUNKSIZE, seed=42):
+    """One streamed pass: (StreamProfile, sample frame covering every category)."""
+    # top_n only adds a step to the categorical branch, not new columns
+    cat_cols = categorical_columns(build_pipeline())
+    num_cols = [col for col in FEATURE_COLUMNS if col not in cat_cols]
+    profile = StreamProfile(num_cols, cat_cols, sample_size=sample_size, seed=seed)
+    for chunk in iter_chunks(input_path, chunksize=chunksize, columns=FEATURE_COLUMNS):
+        profile.update(chunk)
+    return profile, _cover_categories(profile.sample_frame(), profile)
+
+
+def _matrix_key(config, data_key):
+    payload = json.dumps({"config": list(config), "data": data_key}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _write_atomic(path, write):
+    # tmp + replace: a concurrent or interrupted sweep never sees half a file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        write(fh)
+    os.replace(tmp_path, path)
+
+
+def prepare_matrices(configs, profile, sample, directory, data_key, log=print):
+    """
+    Fit the preprocessing of every config and save transform(sample).
+
+    Returns {config: {"matrix": .npy path, "preprocess": .joblib path,
+    "seconds": fit + transform time, "cached": bool}}. A matrix already in
+    `directory` under the same config and `data_key` is reused.
+    """
+    prepared = {}
+    for config in configs:
+        stem = os.path.join(directory, f"prep-{_matrix_key(config, data_key)}")
+        entry = {"matrix": stem + ".npy", "preprocess": stem + ".joblib", "seconds": 0.0, "cached": True}
+        if not (os.path.exists(entry["matrix"]) and os.path.exists(entry["preprocess"])):
+            start = time.perf_counter()
+            pipeline = build_pipeline(lower_q=config.lower_q, upper_q=config.upper_q, top_n=config.top_n)
+            preprocess = fit_preprocess(pipeline, sample, profile)
+            matrix = np.ascontiguousarray(preprocess.transform(sample[FEATURE_COLUMNS]), dtype=np.float64)
+            _write_atomic(entry["preprocess"], lambda fh: joblib.dump(preprocess, fh))
+            _write_atomic(entry["matrix"], lambda fh: np.save(fh, matrix))
+            entry.update(seconds=time.perf_counter() - start, cached=False)
+        log(f"[preprocess] {_describe(config)}: "
+            + ("cached" if entry["cached"] else f"{entry['seconds']:.1f}s"))
+        prepared[config] = entry
+    return prepared
+
+
+# ---------------------------------------------------------
+# CLUSTERING FITS (process pool)
+# ---------------------------------------------------------
+_worker_limits = None
+_worker_matrices = {}
+
+
+def _init_sweep_worker():
+    # one fit per core: stop KMeans' OpenMP threads from oversubscribing the box
+    global _worker_limits
+    _worker_limits = threadpool_limits(limits=1)
+
+
+def _load_matrix(path):
+    if path not in _worker_matrices:
+        _worker_matrices[path] = np.load(path, mmap_mode="r")
+    return _worker_matrices[path]
+
+
+def fit_candidate(matrix_path, n_clusters, n_init, random_state, silhouette_rows):
+    """
+    Fit one KMeans on a cached matrix. Returns (metrics, fitted KMeans);
+    labels_ holds the sample's labels, as in train_model.py.
+    """
+    X = _load_matrix(matrix_path)
+    start = time.perf_counter()
+    kmeans = KMeans(n_clusters=n_clusters, n_init=n_init, random_state=random_state).fit(X)
+    fit_seconds = time.perf_counter() - start
+
+    labels = kmeans.labels_ = kmeans.labels_.astype(np.int32)
+    start = time.perf_counter()
+    sampled = labels[silhouette_rows]
+    if len(np.unique(sampled)) > 1:
+        silhouette = float(silhouette_score(X[silhouette_rows], sampled))
+    else:
+        silhouette = float("nan")
+    metrics = {
+        "inertia": float(kmeans.inertia_),
+        "inertia_per_row": float(kmeans.inertia_) / len(X),
+        "silhouette": silhouette,
+        "fit_seconds": fit_seconds,
+        "silhouette_seconds": time.perf_counter() - start,
+        "n_iter": int(kmeans.n_iter_),
+        "cluster_sizes": np.bincount(labels, minlength=n_clusters).tolist(),
+    }
+    return metrics, kmeans
+
+
+def _cost(candidate):
+    # submit the slow fits first so they do not end up alone at the tail
+    runs = 1 if candidate.n_init == "auto" else candidate.n_init
+    return candidate.n_clusters * runs
+
+
+# ---------------------------------------------------------
+# SWEEP
+# ---------------------------------------------------------
+def _describe(config):
+    top_n = "all" if config.top_n is None else config.top_n
+    return f"winsor {config.lower_q:g}:{config.upper_q:g}, top_n {top_n}"
+
+
+def run_sweep(input_path, ks=(3, 4, 5, 6), n_inits=("auto",), winsor=((0.01, 0.99),), top_ns=(None,),
+              sample_size=DEFAULT_SWEEP_SAMPLE_SIZE, silhouette_sample=DEFAULT_SILHOUETTE_SAMPLE,
+              jobs=None, cache_dir=None, chunksize=DEFAULT_CHUNKSIZE, random_state=42, log=print):
+    """
+    Evaluate every combination of the given settings.
+
+    Parameters
+    ----------
+    input_path : str
+        Training data (CSV or Parquet) with FEATURE_COLUMNS.
+    ks, n_inits : sequences
+        KMeans n_clusters and n_init values ("auto" or int).
+    winsor : sequence of (lower_q, upper_q)
+        Monetary Winsorizer quantiles.
+    top_ns : sequence of int or None
+        TopNCategories.top_n for Gender / Occupation (None: no grouping).
+    sample_size : int
+        Reservoir sample rows the models are fitted on.
+    silhouette_sample : int
+        Rows of the sample the silhouette is computed on (O(n^2)).
+    jobs : int or None
+        Worker processes for the KMeans fits (None: one per core, 1: in
+        this process).
+    cache_dir : str or None
+        Keep the transformed matrices here across runs (default: a
+        temporary directory removed afterwards).
+
+    Returns
+    -------
+    (report, models)
+        report: JSON-serialisable dict with "rows", "sample_rows",
+        "preprocess" (one entry per config) and "candidates" (settings and
+        metrics, best silhouette first); models: {candidate index:
+        (preprocess .joblib path, fitted KMeans)}, paths valid while the
+        matrix directory exists.
+    """
+    configs = [PreprocessConfig(lo, hi, top_n) for (lo, hi), top_n in itertools.product(winsor, top_ns)]
+    candidates = [Candidate(config, k, n_init)
+                  for config, k, n_init in itertools.product(configs, ks, n_inits)]
+    jobs = min(jobs or os.cpu_count() or 1, len(candidates))
+    start = time.perf_counter()
+
+    profile, sample = profile_input(input_path, sample_size, chunksize, seed=random_state)
+    log(f"[profile] {profile.rows:,} rows, {len(sample):,} sampled, {time.perf_counter() - start:.1f}s")
+    data_key = {
+        "input": [list(entry) for entry in artifact_signature(input_path)],
+        "sample_size": sample_size,
+        "seed": random_state,
+    }
+
+    directory = cache_dir or tempfile.mkdtemp(prefix="persona-sweep-")
+    os.makedirs(directory, exist_ok=True)
+    try:
+        prepared = prepare_matrices(configs, profile, sample, directory, data_key, log=log)
+        rng = np.random.default_rng(random_state)
+        silhouette_rows = np.sort(rng.choice(len(sample), min(silhouette_sample, len(sample)), replace=False))
+
+        results = {}
+
+        def record(index, outcome):
+            metrics, kmeans = outcome
+            results[index] = (metrics, kmeans)
+            candidate = candidates[index]
+            log(f"[fit {len(results)}/{len(candidates)}] k={candidate.n_clusters} n_init={candidate.n_init} "
+                f"{_describe(candidate.preprocess)}: silhouette {metrics['silhouette']:.4f}, "
+                f"inertia/row {metrics['inertia_per_row']:.4f}, {metrics['fit_seconds']:.1f}s")
+
+        order = sorted(range(len(candidates)), key=lambda i: -_cost(candidates[i]))
+        args = {i: (prepared[candidates[i].preprocess]["matrix"], candidates[i].n_clusters,
+                    candidates[i].n_init, random_state, silhouette_rows) for i in order}
+        fit_start = time.perf_counter()
+        if jobs == 1:
+            for index in order:
+                record(index, fit_candidate(*args[index]))
+        else:
+            # spawn, not fork: the parent has already run OpenMP code while preprocessing
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_sweep_worker,
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = {pool.submit(fit_candidate, *args[index]): index for index in order}
+                for future in as_completed(futures):
+                    record(futures[future], future.result())
+        fit_wall = time.perf_counter() - fit_start
+        _worker_matrices.clear()
+    finally:
+        if cache_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    rows = []
+    for index, candidate in enumerate(candidates):
+        config = candidate.preprocess
+        rows.append({
+            "index": index,
+            "n_clusters": candidate.n_clusters,
+            "n_init": candidate.n_init,
+            "lower_q": config.lower_q,
+            "upper_q": config.upper_q,
+            "top_n": config.top_n,
+            **results[index][0],
+        })
+    # NaN silhouettes (a single populated cluster) sort last
+    rows.sort(key=lambda row: -row["silhouette"] if row["silhouette"] == row["silhouette"] else float("inf"))
+    report = {
+        "input": input_path,
+        "rows": profile.rows,
+        "sample_rows": len(sample),
+        "silhouette_rows": len(silhouette_rows),
+        "jobs": jobs,
+        "preprocess": [
+            {"lower_q": config.lower_q, "upper_q": config.upper_q, "top_n": config.top_n,
+             "seconds": entry["seconds"], "cached": entry["cached"]}
+            for config, entry in prepared.items()
+        ],
+        "candidates": rows,
+        "fit_wall_seconds": fit_wall,
+        "fit_cpu_seconds": sum(metrics["fit_seconds"] + metrics["silhouette_seconds"]
+                               for metrics, _ in results.values()),
+        "seconds": time.perf_counter() - start,
+    }
+    models = {index: (prepared[candidates[index].preprocess]["preprocess"], kmeans)
+              for index, (_, kmeans) in results.items()}
+    return report, models
+
+
+def assemble_pipeline(preprocess_path, kmeans):
+    """A model.pkl-shaped Pipeline from a sweep candidate's parts."""
+    return Pipeline([("preprocess", joblib.load(preprocess_path)), ("cluster", kmeans)])
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def _n_init(value):
+    return value if value == "auto" else int(value)
+
+
+def _winsor(value):
+    lower, upper = (float(part) for part in value.split(":"))
+    if not 0.0 <= lower < upper <= 1.0:
+        raise argparse.ArgumentTypeError(f"expected lower:upper quantiles with 0 <= lower < upper <= 1, got {value!r}")
+    return lower, upper
+
+
+def _top_n(value):
+    return None if value.lower() == "none" else int(value)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Sweep k, n_init and preprocessing settings with cached preprocessing."
+    )
+    parser.add_argument("input", help="Training data (CSV or Parquet) with FEATURE_COLUMNS.")
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 4, 5, 6], help="n_clusters values.")
+    parser.add_argument("--n-init", type=_n_init, nargs="+", default=["auto"],
+                        help="KMeans n_init values ('auto' or an int).")
+    parser.add_argument("--winsor", type=_winsor, nargs="+", default=[(0.01, 0.99)],
+                        help="Monetary Winsorizer quantiles as lower:upper.")
+    parser.add_argument("--top-n", type=_top_n, nargs="+", default=[None],
+                        help="TopNCategories top_n for Gender / Occupation ('none' = no grouping).")
+    parser.add_argument("--sample-size", type=int, default=DEFAULT_SWEEP_SAMPLE_SIZE,
+                        help="Reservoir sample rows the candidates are fitted on.")
+    parser.add_argument("--silhouette-sample", type=int, default=DEFAULT_SILHOUETTE_SAMPLE,
+                        help="Sample rows used for the silhouette score.")
+    parser.add_argument("--jobs", type=int, default=0, help="Worker processes (0 = one per core).")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Keep transformed matrices here and reuse them on the next run.")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Write the full report as JSON.")
+    parser.add_argument("--export-best", default=None,
+                        help="Write the best-silhouette candidate with k = number of personas "
+                             f"({len(PERSONA_DETAILS)}) as a Pipeline (joblib).")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    n_personas = len(PERSONA_DETAILS)
+    if args.export_best and n_personas not in args.k:
+        raise SystemExit(f"--export-best needs --k to include {n_personas}: the scoring paths name "
+                         f"clusters from the {n_personas} PERSONA_DETAILS entries.")
+    keep_dir = args.cache_dir
+    if args.export_best and keep_dir is None:
+        # the chosen candidate's preprocessing is read back after the sweep
+        keep_dir = tempfile.mkdtemp(prefix="persona-sweep-")
+    try:
+        report, models = run_sweep(
+            args.input, ks=args.k, n_inits=args.n_init, winsor=args.winsor, top_ns=args.top_n,
+            sample_size=args.sample_size, silhouette_sample=args.silhouette_sample,
+            jobs=args.jobs or None, cache_dir=keep_dir, chunksize=args.chunksize,
+            random_state=args.random_state,
+        )
+        if args.export_best:
+            best = next(row for row in report["candidates"] if row["n_clusters"] == n_personas)
+            joblib.dump(assemble_pipeline(*models[best["index"]]), args.export_best)
+    finally:
+        if args.export_best and args.cache_dir is None:
+            shutil.rmtree(keep_dir, ignore_errors=True)
+
+    print(f"\n{'k':>3} {'n_init':>6} {'winsor':>11} {'top_n':>5} {'silhouette':>10} "
+          f"{'inertia/row':>11} {'fit s':>6}  sizes")
+    for row in report["candidates"]:
+        winsor = f"{row['lower_q']:g}:{row['upper_q']:g}"
+        top_n = "all" if row["top_n"] is None else row["top_n"]
+        print(f"{row['n_clusters']:>3} {row['n_init']!s:>6} {winsor:>11} {top_n!s:>5} "
+              f"{row['silhouette']:>10.4f} {row['inertia_per_row']:>11.4f} {row['fit_seconds']:>6.1f}  "
+              f"{row['cluster_sizes']}")
+    print(f"\n{len(report['candidates'])} candidates on {report['sample_rows']:,} rows with "
+          f"{report['jobs']} worker(s): fits {report['fit_wall_seconds']:.1f}s wall "
+          f"({report['fit_cpu_seconds']:.1f}s of fit + silhouette), total {report['seconds']:.1f}s")
+    if args.export_best:
+        top = report["candidates"][0]
+        if top["n_clusters"] != n_personas:
+            print(f"Best overall is k={top['n_clusters']} (silhouette {top['silhouette']:.4f}); "
+                  f"define its personas in PERSONA_DETAILS before serving it.")
+        print(f"Best with k={n_personas} (silhouette {best['silhouette']:.4f}) -> {args.export_best}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Report -> {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
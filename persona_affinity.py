@@ -0,0 +1,114 @@
+# persona_affinity.py
+# ---------------------------------------------------------
+# PERSONA AFFINITY (distance to every centroid, soft scores, top-k)
+# ---------------------------------------------------------
+# Usage:
+#   scorer = PersonaAffinity.from_model(joblib.load("model.pkl"))
+#   result = scorer.score(df)         # labels, distances, affinities: n x n_personas
+#   ids, affinities, distances = scorer.top_k(result, 2)   # best + runner-up
+#   pd.DataFrame(scorer.columns(result, top_k=2))
+#
+# One preprocess.transform and one (n x 24) @ (24 x 4) product per call,
+# whatever the batch size. `labels` equals model.predict(X) exactly: they
+# are taken from the same ||c||^2 - 2 x.c expression KMeans.predict uses.
+#
+# Affinities are fuzzy c-means memberships of the fitted centroids,
+#   affinity_j = d_j^(-2/(m-1)) / sum_k d_k^(-2/(m-1)),
+# which sum to 1 per customer and need no temperature, so the sklearn
+# Pipeline and the compiled predictor yield the same scores.
+
+from collections import namedtuple
+
+import numpy as np
+
+from compiled_model import CompiledPersonaModel
+
+AffinityResult = namedtuple("AffinityResult", ["labels", "distances", "affinities", "order"])
+
+
+class PersonaAffinity:
+    """
+    Vectorized distance / affinity scoring against the KMeans centroids.
+
+    Parameters
+    ----------
+    transform : callable
+        Raw features -> preprocessed matrix (n x n_features).
+    centers : array (n_personas x n_features)
+        The fitted `cluster_centers_`.
+    fuzziness : float (default=2.0)
+        Fuzzy c-means exponent m > 1; larger values give flatter affinities.
+    """
+
+    def __init__(self, transform, centers, fuzziness=2.0):
+        if fuzziness <= 1:
+            raise ValueError(f"fuzziness must be > 1, got {fuzziness}")
+        self.transform = transform
+        self.centers = np.ascontiguousarray(centers, dtype=np.float64)
+        self.centers_squared_norms = (self.centers ** 2).sum(axis=1)
+        self.fuzziness = fuzziness
+
+    @classmethod
+    def from_model(cls, model, fuzziness=2.0):
+        """Build from a Pipeline, a CompiledPersonaModel or a CachedPersonaModel."""
+        model = getattr(model, "model", model)
+        if isinstance(model, CompiledPersonaModel):
+            return cls(model.transform, model.centers, fuzziness)
+        return cls(model[:-1].transform, model.steps[-1][1].cluster_centers_, fuzziness)
+
+    @property
+    def n_personas(self):
+        return len(self.centers)
+
+    def score(self, X):
+        """Labels plus the full customer x persona distance and affinity matrices."""
+        Xt = np.asarray(self.transform(X), dtype=np.float64)
+        if not np.isfinite(Xt).all():
+            raise ValueError("Input contains NaN or infinity after preprocessing.")
+        partial = self.centers_squared_norms - 2.0 * (Xt @ self.centers.T)
+        order = np.argsort(partial, axis=1, kind="stable")
+        squared = partial + np.einsum("ij,ij->i", Xt, Xt)[:, None]
+        np.maximum(squared, 0.0, out=squared)
+        return AffinityResult(
+            order[:, 0].astype(np.int32), np.sqrt(squared), self._memberships(squared), order,
+        )
+
+    def _memberships(self, squared):
+        # in log space, so a customer sitting on a centroid gets 1.0 there
+        # instead of inf / inf
+        logw = np.log(np.maximum(squared, np.finfo(np.float64).tiny)) / -(self.fuzziness - 1)
+        logw -= logw.max(axis=1, keepdims=True)
+        weights = np.exp(logw)
+        weights /= weights.sum(axis=1, keepdims=True)
+        return weights
+
+    def top_k(self, result, k):
+        """(ids, affinities, distances), each n x k, best persona first."""
+        if not 1 <= k <= self.n_personas:
+            raise ValueError(f"k must be between 1 and {self.n_personas}, got {k}")
+        ids = result.order[:, :k]
+        return (
+            ids.astype(np.int32),
+            np.take_along_axis(result.affinities, ids, axis=1),
+            np.take_along_axis(result.distances, ids, axis=1),
+        )
+
+    def columns(self, result, top_k=None, dtype=np.float32):
+        """
+        Output columns as a dict of arrays.
+
+        top_k=None gives distance_<id> and affinity_<id> for every persona;
+        top_k=k gives top<r>_cluster_id, top<r>_affinity and top<r>_distance
+        for the k closest personas only.
+        """
+        if top_k is None:
+            out = {f"distance_{j}": result.distances[:, j].astype(dtype) for j in range(self.n_personas)}
+            out.update({f"affinity_{j}": result.affinities[:, j].astype(dtype) for j in range(self.n_personas)})
+            return out
+        ids, affinities, distances = self.top_k(result, top_k)
+        out = {}
+        for r in range(top_k):
+            out[f"top{r + 1}_cluster_id"] = ids[:, r]
+            out[f"top{r + 1}_affinity"] = affinities[:, r].astype(dtype)
+            out[f"top{r + 1}_distance"] = distances[:, r].astype(dtype)
+        return out
@@ -69,6 +69,100 @@ PERSONA_DETAILS = {
     },
 }
 
+# ---------------------------------------------------------
+# CLUSTER MEDIAN SNAPSHOT FACTS (incl. Dormancy as last line)
+# Fallback for the app's persona cards when no profile data is configured
+# (persona_profiles.py computes these from data for the current model).
+# ---------------------------------------------------------
+PERSONA_FACTS = {
+    0: {
+        "Age": 28,
+        "Occupation": "Salaried (65%)",
+        "UPI Usage": "0.76",
+        "Mobile App Logins": 35,
+        "AMB": "₹32,000",
+        "SIP Amount": "₹1,200",
+        "FD Amount": "₹10,000",
+        "ATM Withdrawals": 1,
+        "Dormancy": "99 days",
+    },
+    1: {
+        "Age": 45,
+        "Occupation": "Business Owner (58%)",
+        "FD Amount": "₹8,50,000",
+        "AMB": "₹1,20,000",
+        "UPI Usage": "0.32",
+        "ATM Withdrawals": 6,
+        "SIP Amount": "₹2,500",
+        "Dormancy": "159 days",
+    },
+    2: {
+        "Age": 34,
+        "Occupation": "Salaried (72%)",
+        "Income": "₹18,00,000",
+        "SIP Amount": "₹12,000",
+        "Mobile App Logins": 68,
+        "Credit Card Utilization": "48%",
+        "FD Amount": "₹75,000",
+        "UPI Usage": "0.84",
+        "Dormancy": "24 days",
+    },
+    3: {
+        "Age": 31,
+        "Occupation": "Self-Employed (52%)",
+        "ATM Withdrawals": 11,
+        "UPI Usage": "0.41",
+        "Mobile App Logins": 16,
+        "AMB": "₹18,000",
+        "FD Amount": "₹22,000",
+        "Dormancy": "79 days",
+    }
+}
+
+# ---------------------------------------------------------
+# FEATURE ORDER (must match model training)
+# ---------------------------------------------------------
+
+FEATURE_COLUMNS = [
+    "Age", "Gender", "City_Tier", "Occupation", "Annual_Income", "AMB",
+    "Debit_Txn_Count", "Credit_Txn_Count", "UPI_Usage_Ratio",
+    "ATM_Withdrawal_Count", "Failed_Txn_Count", "Mobile_App_Login",
+    "Netbanking_Login", "Dormancy_Days", "Products_Held",
+    "Credit_Card_Utilization", "EMI_Presence", "Insurance_Premium",
+    "SIP_Amount", "FD_Amount"
+]
+
+# text-valued features (imputed with 'missing' and one-hot encoded)
+CATEGORICAL_COLUMNS = ["Gender", "Occupation"]
+
+# ---------------------------------------------------------
+# INPUT RANGES (same bounds / options as the app.py form widgets)
+# ---------------------------------------------------------
+# numeric: (min, max, dtype)   categorical / select: list of options
+
+FEATURE_RANGES = {
+    "Age": (18, 100, int),
+    "Gender": ["Male", "Female", "Other"],
+    "City_Tier": [1.0, 2.0, 3.0],
+    "Occupation": ["Salaried", "Self-Employed", "Business Owner"],
+    "Annual_Income": (100000, 50000000, int),
+    "AMB": (0, 5000000, int),
+    "Debit_Txn_Count": (0, 300, int),
+    "Credit_Txn_Count": (0, 300, int),
+    "UPI_Usage_Ratio": (0.0, 1.0, float),
+    "ATM_Withdrawal_Count": (0, 50, int),
+    "Failed_Txn_Count": (0, 50, int),
+    "Mobile_App_Login": (0, 300, int),
+    "Netbanking_Login": (0, 300, int),
+    "Dormancy_Days": (0, 365, int),
+    "Products_Held": (0, 10, int),
+    "Credit_Card_Utilization": (0, 100, int),
+    "EMI_Presence": [0, 1],
+    "Insurance_Premium": (0, 500000, int),
+    "SIP_Amount": (0, 300000, int),
+    "FD_Amount": (0, 20000000, int),
+}
+
 # ---------------------------------------------------------
 # FEATURE METADATA (Unchanged, unless you want icons here also)
 # ---------------------------------------------------------
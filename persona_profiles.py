@@ -0,0 +1,228 @@
+# persona_profiles.py
+# ---------------------------------------------------------
+# PERSONA PROFILES (per-persona median snapshot, once per model version)
+# ---------------------------------------------------------
+# Usage:
+#   python persona_profiles.py training.parquet --model model.pkl --output persona_profiles.json
+#
+#   profiles = load_profiles("model.pkl", "training.parquet")   # reuses the JSON if still valid
+#   facts = profile_facts(profiles)   # {0: {"Age": 28, "Occupation": "Salaried (65%)", ...}, ...}
+#
+# The data is streamed through the model once; per persona it keeps a
+# QuantileSketch for every numeric feature and value counts for the
+# categorical ones, so memory does not grow with the file. The result is
+# stored as JSON together with the model's SHA-256 and the data file's
+# signature, and is recomputed only when either of them changes.
+#
+# Each card shows Age and Occupation, then the features in which the persona
+# differs most from the whole population (|persona median - overall median|
+# in IQR units), with Dormancy always last.
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from batch_score import DEFAULT_CHUNKSIZE, DEFAULT_MODEL_PATH, iter_chunks, load_model, score_frame
+from persona_config import CATEGORICAL_COLUMNS, FEATURE_COLUMNS
+from prediction_cache import artifact_fingerprint, artifact_signature
+from sketches import QuantileSketch
+
+DEFAULT_PROFILE_CACHE = "persona_profiles.json"
+NUMERIC_COLUMNS = [col for col in FEATURE_COLUMNS if col not in CATEGORICAL_COLUMNS]
+
+
+# ---------------------------------------------------------
+# FORMATTING
+# ---------------------------------------------------------
+def format_rupees(value):
+    """Indian digit grouping: 850000 -> '₹8,50,000', -1234567 -> '-₹12,34,567'."""
+    amount = int(round(value))
+    sign = "-" if amount < 0 else ""
+    digits = str(abs(amount))
+    head, tail = digits[:-3], digits[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    if head:
+        groups.insert(0, head)
+    return sign + "₹" + ",".join(groups + [tail])
+
+
+# column -> (card label, formatter), in card order
+FACT_FIELDS = {
+    "Age": ("Age", lambda v: int(round(v))),
+    "Occupation": ("Occupation", None),
+    "Annual_Income": ("Income", format_rupees),
+    "AMB": ("AMB", format_rupees),
+    "UPI_Usage_Ratio": ("UPI Usage", lambda v: f"{v:.2f}"),
+    "Mobile_App_Login": ("Mobile App Logins", lambda v: int(round(v))),
+    "Netbanking_Login": ("Netbanking Logins", lambda v: int(round(v))),
+    "SIP_Amount": ("SIP Amount", format_rupees),
+    "FD_Amount": ("FD Amount", format_rupees),
+    "ATM_Withdrawal_Count": ("ATM Withdrawals", lambda v: int(round(v))),
+    "Credit_Card_Utilization": ("Credit Card Utilization", lambda v: f"{v:.0f}%"),
+    "Dormancy_Days": ("Dormancy", lambda v: f"{v:.0f} days"),
+}
+ALWAYS_FIRST = ["Age", "Occupation"]
+ALWAYS_LAST = ["Dormancy_Days"]
+
+
+# ---------------------------------------------------------
+# PROFILING
+# ---------------------------------------------------------
+def compute_profiles(model, data_path, chunksize=DEFAULT_CHUNKSIZE, seed=0):
+    """
+    Stream `data_path` through `model` and summarise every persona.
+
+    Returns a JSON-serialisable dict:
+      {"rows": n, "overall": {col: {median, q25, q75}},
+       "personas": {cluster_id: {"rows": n, "medians": {col: v},
+                                 "modes": {col: [value, share]}}}}
+    """
+    overall = {col: QuantileSketch(seed=seed) for col in NUMERIC_COLUMNS}
+    sketches, counts, rows = {}, {}, {}
+    for chunk in iter_chunks(data_path, chunksize=chunksize, columns=FEATURE_COLUMNS):
+        labels = score_frame(model, chunk)
+        for col in NUMERIC_COLUMNS:
+            overall[col].update(chunk[col].to_numpy(dtype=float, na_value=np.nan))
+        for cid in np.unique(labels):
+            cid = int(cid)
+            part = chunk[labels == cid]
+            rows[cid] = rows.get(cid, 0) + len(part)
+            persona = sketches.setdefault(cid, {col: QuantileSketch(seed=seed) for col in NUMERIC_COLUMNS})
+            for col in NUMERIC_COLUMNS:
+                persona[col].update(part[col].to_numpy(dtype=float, na_value=np.nan))
+            persona_counts = counts.setdefault(cid, {col: pd.Series(dtype=float) for col in CATEGORICAL_COLUMNS})
+            for col in CATEGORICAL_COLUMNS:
+                persona_counts[col] = persona_counts[col].add(
+                    part[col].astype(object).value_counts(), fill_value=0
+                )
+
+    personas = {}
+    for cid in sorted(sketches):
+        modes = {}
+        for col, value_counts in counts[cid].items():
+            if value_counts.sum() > 0:
+                top = value_counts.idxmax()
+                modes[col] = [str(top), float(value_counts[top] / value_counts.sum())]
+        personas[cid] = {
+            "rows": rows[cid],
+            "medians": {col: _quantile(sketch, 0.5) for col, sketch in sketches[cid].items()},
+            "modes": modes,
+        }
+    return {
+        "rows": sum(rows.values()),
+        "overall": {
+            col: {"median": _quantile(s, 0.5), "q25": _quantile(s, 0.25), "q75": _quantile(s, 0.75)}
+            for col, s in overall.items()
+        },
+        "personas": personas,
+    }
+
+
+def _quantile(sketch, q):
+    value = sketch.quantile(q) if sketch.count else float("nan")
+    return None if value != value else float(value)
+
+
+def profile_facts(profiles, max_facts=8):
+    """
+    Card lines per persona: {cluster_id: {label: formatted value}} with at
+    most `max_facts` lines (Age, Occupation, the most distinctive features,
+    Dormancy).
+    """
+    overall = profiles["overall"]
+    middle = [col for col in FACT_FIELDS if col not in ALWAYS_FIRST + ALWAYS_LAST]
+    n_middle = max(max_facts - len(ALWAYS_FIRST) - len(ALWAYS_LAST), 0)
+    facts = {}
+    for cid, persona in profiles["personas"].items():
+        medians = persona["medians"]
+
+        def distinctiveness(col):
+            stats = overall[col]
+            if medians.get(col) is None or stats["median"] is None:
+                return -1.0
+            spread = (stats["q75"] - stats["q25"]) or 1.0
+            return abs(medians[col] - stats["median"]) / spread
+
+        chosen = sorted(middle, key=distinctiveness, reverse=True)[:n_middle]
+        ordered = ALWAYS_FIRST + [col for col in middle if col in chosen] + ALWAYS_LAST
+        lines = {}
+        for col in ordered:
+            label, formatter = FACT_FIELDS[col]
+            if col in CATEGORICAL_COLUMNS:
+                if col in persona["modes"]:
+                    value, share = persona["modes"][col]
+                    lines[label] = f"{value} ({share:.0%})"
+            elif medians.get(col) is not None:
+                lines[label] = formatter(medians[col])
+        facts[int(cid)] = lines
+    return facts
+
+
+# ---------------------------------------------------------
+# CACHED ON DISK PER MODEL VERSION
+# ---------------------------------------------------------
+def load_profiles(model_path=DEFAULT_MODEL_PATH, data_path=None, cache_path=DEFAULT_PROFILE_CACHE,
+                  model=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Return the profiles for the current model, from `cache_path` when it
+    was built for the same model and data, otherwise computed from
+    `data_path` and written back. Returns None when the cache is stale or
+    missing and there is no `data_path` to rebuild it from.
+    """
+    version = artifact_fingerprint(model_path)
+    data_signature = [list(entry) for entry in artifact_signature(data_path)] if data_path else None
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as fh:
+            cached = json.load(fh)
+        if cached.get("model_version") == version and (
+            data_path is None or cached.get("data_signature") == data_signature
+        ):
+            return _with_int_keys(cached["profiles"])
+    if data_path is None:
+        return None
+
+    if model is None:
+        model = load_model(model_path)
+    profiles = compute_profiles(model, data_path, chunksize=chunksize)
+    if cache_path:
+        payload = {"model_version": version, "data_signature": data_signature, "profiles": profiles}
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(payload, fh, indent=2)
+        os.replace(tmp_path, cache_path)
+    return profiles
+
+
+def _with_int_keys(profiles):
+    # JSON object keys are strings
+    profiles["personas"] = {int(cid): persona for cid, persona in profiles["personas"].items()}
+    return profiles
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute per-persona median snapshots.")
+    parser.add_argument("data", help="Training or scoring data (CSV or Parquet) with FEATURE_COLUMNS.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to model.pkl.")
+    parser.add_argument("--output", default=DEFAULT_PROFILE_CACHE, help="Profile JSON to write.")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    profiles = load_profiles(args.model, args.data, args.output, chunksize=args.chunksize)
+    for cid, lines in profile_facts(profiles).items():
+        rows = profiles["personas"][cid]["rows"]
+        print(f"Persona {cid} ({rows:,} rows): " + "; ".join(f"{k} {v}" for k, v in lines.items()))
+    print(f"Profiles -> {args.output}")
+    return profiles
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+# prediction_cache.py
+# ---------------------------------------------------------
+# PREDICTION CACHE (repeat customers are scored once)
+# ---------------------------------------------------------
+# Usage:
+#   cache = PredictionCache(max_size=100_000, ttl=3600)
+#   model = CachedPersonaModel(load_model("model.pkl"), cache,
+#                              model_path="model.pkl", loader=load_model)
+#   model.predict(df)              # DataFrame or list of dicts
+#   model.predict_one(record)
+#   cache.stats()                  # hits, misses, evictions, ...
+#
+# Keys are a canonical hash of the 20 FEATURE_COLUMNS values (see CANONICAL
+# KEYS below), so equivalent inputs share one entry. Within one
+# predict call duplicate rows are always scored once, with or without a
+# cache, which makes CachedPersonaModel(model) a batch dedupe step too.
+#
+# The cache is bound to a fingerprint of the model artifact: when the file
+# (or artifact directory) on disk changes, the model is reloaded and every
+# cached label is dropped.
+
+import hashlib
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from persona_config import FEATURE_COLUMNS, CATEGORICAL_COLUMNS
+
+_CATEGORICAL = frozenset(CATEGORICAL_COLUMNS)
+_NUMERIC = [col for col in FEATURE_COLUMNS if col not in _CATEGORICAL]
+_NAN = float("nan")
+_PACK = struct.Struct(f"<{len(_NUMERIC)}d")
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_ANY_VERSION = object()
+
+
+# ---------------------------------------------------------
+# CANONICAL KEYS
+# ---------------------------------------------------------
+# key = blake2b(numeric features as little-endian float64 + category reprs).
+# Numbers are canonicalised to one NaN and +0.0, so 30 / 30.0 / np.int64(30)
+# and None / NaN in a numeric column give the same key. In a categorical
+# column None and NaN stay distinct: the pipeline's SimpleImputer only
+# fills NaN.
+def _canonical_number(value):
+    if value is None:
+        return _NAN
+    value = float(value)
+    return _NAN if value != value else value + 0.0
+
+
+def _category_token(value):
+    if value is not None and not isinstance(value, str) and value != value:
+        value = _NAN
+    elif isinstance(value, str):
+        value = str(value)
+    return b"\0" + repr(value).encode("utf-8")
+
+
+def _digest(numbers, categories):
+    return hashlib.blake2b(numbers + categories, digest_size=16).digest()
+
+
+def canonical_key(record):
+    """16-byte key for one customer given as a dict of FEATURE_COLUMNS."""
+    numbers = _PACK.pack(*[_canonical_number(record[col]) for col in _NUMERIC])
+    return _digest(numbers, b"".join(_category_token(record[col]) for col in CATEGORICAL_COLUMNS))
+
+
+def _encode_frame(df):
+    """
+    Canonical numeric matrix (n, 18) plus per-categorical-column codes and
+    the token of every code (None and NaN get codes of their own).
+    """
+    numbers = df[_NUMERIC].to_numpy(dtype=np.float64, na_value=np.nan) + 0.0
+    numbers[np.isnan(numbers)] = np.nan
+    codes, tokens = [], []
+    for col in CATEGORICAL_COLUMNS:
+        values = df[col].to_numpy(dtype=object)
+        col_codes, uniques = pd.factorize(values)
+        # factorize folds None into NaN (code -1); split them again
+        col_codes[col_codes == -1] = len(uniques)
+        col_codes[values == None] = len(uniques) + 1  # noqa: E711
+        codes.append(col_codes)
+        tokens.append([_category_token(u) for u in uniques] + [_category_token(_NAN), _category_token(None)])
+    return np.ascontiguousarray(numbers, dtype="<f8"), codes, tokens
+
+
+def canonical_keys(df):
+    """canonical_key for every row of a DataFrame with FEATURE_COLUMNS."""
+    numbers, codes, tokens = _encode_frame(df)
+    categories = [
+        b"".join(parts)
+        for parts in zip(*[[tok[c] for c in col_codes.tolist()] for col_codes, tok in zip(codes, tokens)])
+    ]
+    buffer = numbers.tobytes()
+    width = numbers.shape[1] * 8
+    return [
+        _digest(buffer[i * width:(i + 1) * width], cats) for i, cats in enumerate(categories)
+    ]
+
+
+def _row_hash(bits):
+    """64-bit multiply-xorshift hash of every row of a uint64 matrix."""
+    row_hash = np.zeros(len(bits), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(bits.shape[1]):
+            row_hash = (row_hash ^ bits[:, j]) * _MIX
+            row_hash ^= row_hash >> np.uint64(29)
+    return row_hash
+
+
+def feature_fingerprints(df):
+    """
+    Stable uint64 fingerprint of every row's FEATURE_COLUMNS, with the same
+    equality as canonical_key. Unlike the dedupe codes it does not depend
+    on the other rows of `df`, so it can be stored and compared between
+    snapshots.
+    """
+    numbers, codes, tokens = _encode_frame(df)
+    columns = [numbers.view(np.uint64)]
+    for col_codes, col_tokens in zip(codes, tokens):
+        token_hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(token, digest_size=8).digest(), "little") for token in col_tokens],
+            dtype=np.uint64,
+        )
+        columns.append(token_hashes[col_codes][:, None])
+    return _row_hash(np.hstack(columns))
+
+
+def dedupe_frame(df):
+    """
+    Return (unique_rows, inverse) so that unique_rows.iloc[inverse]
+    reproduces df[FEATURE_COLUMNS], using the same equality as the keys.
+    """
+    numbers, codes, _ = _encode_frame(df)
+    # NaNs are canonical, so bit-identical rows are exactly the duplicates
+    bits = np.column_stack([numbers] + codes).astype(np.float64).view(np.uint64)
+    inverse, uniques = pd.factorize(_row_hash(bits))
+    first = np.empty(len(uniques), dtype=np.intp)
+    first[inverse[::-1]] = np.arange(len(bits))[::-1]
+    if not (bits[first[inverse]] == bits).all():
+        # 64-bit hash collision: fall back to an exact (slower) row sort
+        rows = np.ascontiguousarray(bits).view(np.dtype((np.void, bits.shape[1] * 8))).ravel()
+        _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    return df[FEATURE_COLUMNS].iloc[first], inverse.ravel()
+
+
+# ---------------------------------------------------------
+# MODEL VERSION
+# ---------------------------------------------------------
+def _artifact_files(path):
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, files in os.walk(path) for name in files
+        )
+    return [path]
+
+
+def artifact_signature(path):
+    """Cheap change detector: (file, size, mtime) for every file of the artifact."""
+    signature = []
+    for name in _artifact_files(path):
+        stat = os.stat(name)
+        signature.append((os.path.relpath(name, path), stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def artifact_fingerprint(path):
+    """SHA-256 over the content of a model file or artifact directory."""
+    digest = hashlib.sha256()
+    for name in _artifact_files(path):
+        digest.update(os.path.relpath(name, path).encode("utf-8"))
+        with open(name, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+# ---------------------------------------------------------
+# CACHE
+# ---------------------------------------------------------
+class PredictionCache:
+    """
+    Thread-safe LRU cache of cluster ids with an optional TTL.
+
+    Parameters
+    ----------
+    max_size : int (default=100_000)
+        Entries kept; the least recently used one is evicted beyond that.
+    ttl : float or None (default=None)
+        Seconds an entry stays valid. None keeps entries until evicted.
+    version : str or None
+        Model fingerprint the entries belong to (see `bind`).
+    """
+
+    def __init__(self, max_size=100_000, ttl=None, version=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = version
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def bind(self, version):
+        """Attach the cache to a model version, dropping entries of any other."""
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key):
+        """Cached cluster id for `key`, or None."""
+        return self.get_many([key])[0]
+
+    def put(self, key, label):
+        self.put_many([key], [label])
+
+    def get_many(self, keys, version=_ANY_VERSION):
+        """
+        Cached cluster ids (None for a miss). With `version`, everything is a
+        miss unless the cache is still bound to that model version.
+        """
+        now = time.monotonic()
+        entries = self._entries
+        found = []
+        with self._lock:
+            if version is not _ANY_VERSION and version != self.version:
+                self.misses += len(keys)
+                return [None] * len(keys)
+            for key in keys:
+                entry = entries.get(key)
+                if entry is not None and entry[1] is not None and entry[1] <= now:
+                    del entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    found.append(None)
+                else:
+                    entries.move_to_end(key)
+                    self.hits += 1
+                    found.append(entry[0])
+        return found
+
+    def put_many(self, keys, labels, version=_ANY_VERSION):
+        """
+        Store labels. With `version` (the model that produced them), the
+        write is dropped if the cache has been re-bound to another version
+        in the meantime, so a retired model's labels are never served.
+        """
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        entries = self._entries
+        with self._lock:
+            if version is not _ANY_VERSION and version != self.version:
+                return
+            for key, label in zip(keys, labels):
+                entries[key] = (int(label), expires)
+                entries.move_to_end(key)
+            overflow = len(entries) - self.max_size
+            for _ in range(max(overflow, 0)):
+                entries.popitem(last=False)
+            self.evictions += max(overflow, 0)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# ---------------------------------------------------------
+# CACHED MODEL
+# ---------------------------------------------------------
+class CachedPersonaModel:
+    """
+    Wrap a persona model (Pipeline or CompiledPersonaModel) with batch
+    dedupe and an optional PredictionCache.
+
+    Parameters
+    ----------
+    model : fitted model with `predict`
+    cache : PredictionCache or None
+        None only dedupes rows within each predict call.
+    model_path : str or None
+        Artifact the model was loaded from. When given, it is re-checked at
+        most every `check_interval` seconds; a changed artifact is reloaded
+        with `loader(model_path)` and the cache is invalidated.
+    loader : callable or None
+        Required with `model_path`.
+    """
+
+    def __init__(self, model, cache=None, model_path=None, loader=None, check_interval=5.0):
+        if model_path is not None and loader is None:
+            raise ValueError("`loader` is required to reload a changed model_path.")
+        self.cache = cache
+        self.model_path = model_path
+        self.loader = loader
+        self.check_interval = check_interval
+        self._signature = None
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
+        version = None
+        if model_path is not None:
+            self._signature = artifact_signature(model_path)
+            version = artifact_fingerprint(model_path)
+            self._checked_at = time.monotonic()
+        # (version, model), replaced as one reference: a predict call binds
+        # it once, so its labels are never cached under a newer version
+        self._served = (version, model)
+        if cache is not None:
+            cache.bind(version)
+
+    @property
+    def model(self):
+        return self._served[1]
+
+    @property
+    def version(self):
+        return self._served[0]
+
+    # ---------------- invalidation ----------------
+    def refresh(self, force=False):
+        """Reload the model and drop cached labels if the artifact changed."""
+        if self.model_path is None:
+            return False
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return False
+        with self._reload_lock:
+            self._checked_at = now
+            signature = artifact_signature(self.model_path)
+            if signature == self._signature:
+                return False
+            self._signature = signature
+            version = artifact_fingerprint(self.model_path)
+            if version == self.version:
+                return False
+            self._served = (version, self.loader(self.model_path))
+            if self.cache is not None:
+                self.cache.bind(version)
+            return True
+
+    # ---------------- prediction ----------------
+    @staticmethod
+    def _score(model, rows):
+        if isinstance(rows, list):
+            if hasattr(model, "predict_one"):
+                return np.asarray(model.predict(rows))
+            rows = pd.DataFrame.from_records(rows, columns=FEATURE_COLUMNS)
+        return np.asarray(model.predict(rows))
+
+    @classmethod
+    def _score_one(cls, model, record):
+        if hasattr(model, "predict_one"):
+            return int(model.predict_one(record))
+        return int(cls._score(model, [record])[0])
+
+    def _lookup_and_score(self, served, unique_rows, keys):
+        """Labels for de-duplicated rows, scoring only the cache misses."""
+        version, model = served
+        if self.cache is None:
+            return self._score(model, unique_rows)
+        found = self.cache.get_many(keys, version=version)
+        missing = [i for i, label in enumerate(found) if label is None]
+        labels = np.array([-1 if label is None else label for label in found], dtype=np.int32)
+        if missing:
+            if isinstance(unique_rows, list):
+                fresh = self._score(model, [unique_rows[i] for i in missing])
+            else:
+                fresh = self._score(model, unique_rows.iloc[missing])
+            labels[missing] = fresh
+            self.cache.put_many([keys[i] for i in missing], fresh, version=version)
+        return labels
+
+    def predict(self, X):
+        """Cluster ids for a DataFrame or list of dicts, one model call per batch."""
+        self.refresh()
+        served = self._served
+        if isinstance(X, list):
+            keys = [canonical_key(record) for record in X]
+            slots = {}
+            inverse = np.array([slots.setdefault(key, len(slots)) for key in keys], dtype=np.intp)
+            unique_keys = list(slots)
+            unique_rows = [None] * len(slots)
+            for record, slot in zip(X, inverse.tolist()):
+                if unique_rows[slot] is None:
+                    unique_rows[slot] = record
+            return self._lookup_and_score(served, unique_rows, unique_keys)[inverse]
+        if len(X) == 0:
+            return self._score(served[1], X[FEATURE_COLUMNS])
+        unique_rows, inverse = dedupe_frame(X)
+        keys = canonical_keys(unique_rows) if self.cache is not None else None
+        return np.asarray(self._lookup_and_score(served, unique_rows, keys))[inverse]
+
+    def predict_one(self, record):
+        """Cluster id for one customer dict."""
+        self.refresh()
+        version, model = self._served
+        if self.cache is None:
+            return self._score_one(model, record)
+        key = canonical_key(record)
+        label = self.cache.get_many([key], version=version)[0]
+        if label is None:
+            label = self._score_one(model, record)
+            self.cache.put_many([key], [label], version=version)
+        return label
@@ -0,0 +1,299 @@
+# profiling.py
+# ---------------------------------------------------------
+# PER-STAGE PROFILING (wall time, rows, bytes per pipeline step)
+# ---------------------------------------------------------
+# Usage:
+#   sink = PrometheusSink()
+#   profiler = StageProfiler([sink, LogSink(min_seconds=0.05)])
+#   instrument(model, profiler)        # patches the fitted steps in place
+#   model.predict(df)
+#   print(sink.render())               # Prometheus text exposition
+#   uninstrument(model)                # before pickling the model again
+#
+# Stages are named after the fitted objects:
+#   pipeline            Pipeline.predict (end to end)
+#   preprocess          ColumnTransformer.transform (incl. dispatch/hstack)
+#   trf1 .. trf5        one ColumnTransformer branch
+#   trf1/step1 ...      one step inside a branch
+#   cluster             KMeans.predict
+#
+# An un-instrumented model has no overhead at all. An instrumented model
+# with `profiler.enabled = False` pays one attribute check per stage.
+# Allocation tracking (tracemalloc) is opt-in because it slows NumPy
+# and pandas allocations down noticeably.
+
+import bisect
+import functools
+import logging
+import threading
+import time
+import tracemalloc
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger("persona.profile")
+
+
+def _rows(X):
+    shape = getattr(X, "shape", None)
+    return int(shape[0]) if shape else len(X)
+
+
+def _nbytes(X):
+    nbytes = getattr(X, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    memory_usage = getattr(X, "memory_usage", None)
+    if memory_usage is not None:
+        # shallow: object columns count their pointers, not the strings
+        return int(memory_usage(index=False, deep=False).sum())
+    return 0
+
+
+# ---------------------------------------------------------
+# SINKS
+# ---------------------------------------------------------
+class LogSink:
+    """
+    One log line per stage call, e.g.
+    `stage=trf1/step2 rows=100000 seconds=0.001412 out_bytes=2400000`.
+
+    Parameters
+    ----------
+    logger : logging.Logger or None
+        Defaults to the 'persona.profile' logger.
+    level : int (default=logging.INFO)
+    min_seconds : float (default=0.0)
+        Only stages at least this slow are logged.
+    """
+
+    def __init__(self, logger=None, level=logging.INFO, min_seconds=0.0):
+        self.logger = logger or globals()["logger"]
+        self.level = level
+        self.min_seconds = min_seconds
+
+    def record(self, stage, seconds, rows, out_bytes, alloc_bytes):
+        if seconds < self.min_seconds:
+            return
+        line = f"stage={stage} rows={rows} seconds={seconds:.6f} out_bytes={out_bytes}"
+        if alloc_bytes is not None:
+            line += f" alloc_bytes={alloc_bytes}"
+        self.logger.log(self.level, line)
+
+
+class HistogramSink:
+    """
+    In-memory per-stage latency histogram plus row and byte totals.
+
+    `snapshot()` returns {stage: {count, seconds_sum, rows, out_bytes,
+    alloc_bytes_max, buckets}} where buckets are cumulative counts per
+    upper bound in `self.buckets` (the last one is +Inf).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, rows, out_bytes, alloc_bytes):
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {
+                    "count": 0, "seconds_sum": 0.0, "rows": 0, "out_bytes": 0,
+                    "alloc_bytes_max": None, "counts": [0] * (len(self.buckets) + 1),
+                }
+            entry["count"] += 1
+            entry["seconds_sum"] += seconds
+            entry["rows"] += rows
+            entry["out_bytes"] += out_bytes
+            if alloc_bytes is not None:
+                entry["alloc_bytes_max"] = max(entry["alloc_bytes_max"] or 0, alloc_bytes)
+            entry["counts"][bisect.bisect_left(self.buckets, seconds)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for stage, entry in self._stages.items():
+                cumulative, total = [], 0
+                for count in entry["counts"]:
+                    total += count
+                    cumulative.append(total)
+                result[stage] = {
+                    key: value for key, value in entry.items() if key != "counts"
+                }
+                result[stage]["buckets"] = dict(zip([*self.buckets, float("inf")], cumulative))
+            return result
+
+    def quantile(self, stage, q):
+        """Upper bucket bound below which a `q` share of the calls fall."""
+        entry = self.snapshot().get(stage)
+        if not entry or not entry["count"]:
+            return float("nan")
+        target = q * entry["count"]
+        for bound, cumulative in entry["buckets"].items():
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+class PrometheusSink(HistogramSink):
+    """HistogramSink that renders the Prometheus text exposition format."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix="persona_stage"):
+        super().__init__(buckets)
+        self.prefix = prefix
+
+    def render(self):
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_seconds Wall time per pipeline stage call.",
+            f"# TYPE {p}_seconds histogram",
+        ]
+        snapshot = self.snapshot()
+        for stage, entry in snapshot.items():
+            for bound, cumulative in entry["buckets"].items():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{p}_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{p}_seconds_sum{{stage="{stage}"}} {entry["seconds_sum"]!r}')
+            lines.append(f'{p}_seconds_count{{stage="{stage}"}} {entry["count"]}')
+        for name, key, help_text in (
+            ("rows_total", "rows", "Rows processed per pipeline stage."),
+            ("output_bytes_total", "out_bytes", "Bytes of stage output produced."),
+        ):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} counter")
+            for stage, entry in snapshot.items():
+                lines.append(f'{p}_{name}{{stage="{stage}"}} {entry[key]}')
+        tracked = {s: e for s, e in snapshot.items() if e["alloc_bytes_max"] is not None}
+        if tracked:
+            lines.append(f"# HELP {p}_alloc_bytes_max Peak bytes allocated during one stage call.")
+            lines.append(f"# TYPE {p}_alloc_bytes_max gauge")
+            for stage, entry in tracked.items():
+                lines.append(f'{p}_alloc_bytes_max{{stage="{stage}"}} {entry["alloc_bytes_max"]}')
+        return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------
+# PROFILER
+# ---------------------------------------------------------
+class StageProfiler:
+    """
+    Times wrapped callables and forwards each call to every sink.
+
+    Parameters
+    ----------
+    sinks : list
+        Objects with record(stage, seconds, rows, out_bytes, alloc_bytes).
+    enabled : bool (default=True)
+        Flip at runtime; a disabled profiler calls straight through.
+    track_allocations : bool (default=False)
+        Measure peak bytes allocated per stage with tracemalloc. Nested
+        stages report their own peak; the outer stage's peak includes them.
+    """
+
+    def __init__(self, sinks=(), enabled=True, track_allocations=False):
+        self.sinks = list(sinks)
+        self.enabled = enabled
+        self.track_allocations = track_allocations
+        self._local = threading.local()
+
+    def wrap(self, stage, fn):
+        @functools.wraps(fn)
+        def profiled(X, *args, **kwargs):
+            if not self.enabled:
+                return fn(X, *args, **kwargs)
+            return self._call(stage, fn, X, args, kwargs)
+
+        profiled._profiled_stage = stage
+        return profiled
+
+    def _call(self, stage, fn, X, args, kwargs):
+        frame = self._enter() if self.track_allocations else None
+        start = time.perf_counter()
+        result = fn(X, *args, **kwargs)
+        seconds = time.perf_counter() - start
+        alloc_bytes = self._exit(frame) if frame is not None else None
+        rows = _rows(X)
+        out_bytes = _nbytes(result)
+        for sink in self.sinks:
+            sink.record(stage, seconds, rows, out_bytes, alloc_bytes)
+        return result
+
+    # ---------------- allocation tracking ----------------
+    def _enter(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._local.started = True
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            # keep the parent's peak before the child resets the counter
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        frame = [current, current]
+        stack.append(frame)
+        return frame
+
+    def _exit(self, frame):
+        stack = self._local.stack
+        _, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, frame[1])
+        stack.pop()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        elif getattr(self._local, "started", False):
+            tracemalloc.stop()
+            self._local.started = False
+        return peak - frame[0]
+
+
+# ---------------------------------------------------------
+# INSTRUMENTATION
+# ---------------------------------------------------------
+def _patch(obj, method, stage, profiler, patched):
+    # an instance attribute shadows the class method for every caller,
+    # including Pipeline and ColumnTransformer internals
+    setattr(obj, method, profiler.wrap(stage, getattr(obj, method)))
+    patched.append((obj, method))
+
+
+def instrument(pipeline, profiler):
+    """
+    Wrap the fitted stages of a persona Pipeline in place and return it.
+
+    Call `uninstrument(pipeline)` before pickling: the wrappers are closures.
+    """
+    uninstrument(pipeline)
+    patched = []
+    preprocess = pipeline.steps[0][1]
+    cluster = pipeline.steps[-1][1]
+    for name, transformer, _ in preprocess.transformers_:
+        if isinstance(transformer, str):
+            continue
+        if hasattr(transformer, "steps"):
+            for step_name, step in transformer.steps:
+                _patch(step, "transform", f"{name}/{step_name}", profiler, patched)
+        _patch(transformer, "transform", name, profiler, patched)
+    _patch(preprocess, "transform", "preprocess", profiler, patched)
+    _patch(cluster, "predict", "cluster", profiler, patched)
+    _patch(pipeline, "predict", "pipeline", profiler, patched)
+    pipeline.__dict__["_profiled_objects"] = patched
+    return pipeline
+
+
+def uninstrument(pipeline):
+    """Remove the wrappers added by `instrument` (no-op if there are none)."""
+    for obj, method in pipeline.__dict__.pop("_profiled_objects", []):
+        obj.__dict__.pop(method, None)
+    return pipeline
+
+
+def is_instrumented(pipeline):
+    return "_profiled_objects" in pipeline.__dict__
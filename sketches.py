@@ -0,0 +1,126 @@
+# sketches.py
+# ---------------------------------------------------------
+# STREAMING STATISTICS (mergeable, bounded-memory sketches)
+# ---------------------------------------------------------
+# QuantileSketch is a compactor-based (KLL-style) quantile sketch: values
+# are buffered per level, and whenever a level grows beyond `k` items it
+# is sorted and every other item is promoted to the next level with twice
+# the weight. Memory is O(k log(n / k)) and sketches built on different
+# chunks or processes can be merged.
+
+import numpy as np
+
+
+def weighted_quantile(values, weights, q):
+    """
+    Quantile of weighted items with pandas' 'linear' interpolation.
+
+    Each item is placed at the centre of the ranks it stands for, so with
+    unit weights this is exactly `pd.Series(values).quantile(q)`.
+    """
+    order = np.argsort(values, kind="stable")
+    values = np.asarray(values, dtype=float)[order]
+    weights = np.asarray(weights, dtype=float)[order]
+    total = weights.sum()
+    if total == 0:
+        return np.nan
+    centres = np.cumsum(weights) - (weights + 1) / 2
+    result = np.interp(np.asarray(q, dtype=float) * (total - 1), centres, values)
+    return float(result) if np.ndim(result) == 0 else result
+
+
+class QuantileSketch:
+    """
+    Mergeable approximate quantile sketch for one numeric feature.
+
+    Parameters
+    ----------
+    k : int (default=2048)
+        Items kept per level; rank error is roughly O(1/k).
+    seed : int or None
+        Seed for the random compaction offsets (for reproducible runs).
+
+    NaNs are ignored (counted in `nulls`); min, max, count and sum are exact.
+    """
+
+    def __init__(self, k=2048, seed=None):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.nulls = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    # ---------------- updates ----------------
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        missing = np.isnan(values)
+        self.nulls += int(missing.sum())
+        values = values[~missing]
+        if len(values) == 0:
+            return self
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.nulls += other.nulls
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.k:
+                items = np.sort(items)
+                n_pairs = len(items) // 2 * 2
+                offset = int(self._rng.integers(2))
+                promoted = items[offset:n_pairs:2]
+                self.levels[level] = items[n_pairs:]
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    # ---------------- queries ----------------
+    def weighted_items(self):
+        """Return (values, weights) summarising everything seen so far."""
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([
+            np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)
+        ])
+        return values, weights
+
+    def quantile(self, q):
+        values, weights = self.weighted_items()
+        return weighted_quantile(values, weights, q)
+
+    def cdf(self, x):
+        """Approximate fraction of observed values <= x (x may be an array)."""
+        values, weights = self.weighted_items()
+        order = np.argsort(values, kind="stable")
+        cum = np.concatenate([[0.0], np.cumsum(weights[order])])
+        idx = np.searchsorted(values[order], x, side="right")
+        return cum[idx] / cum[-1] if cum[-1] > 0 else np.full(np.shape(x), np.nan)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+    def __len__(self):
+        return sum(len(items) for items in self.levels)
@@ -0,0 +1,337 @@
+# sql_export.py
+# ---------------------------------------------------------
+# SQL EXPORT (assign personas inside the warehouse)
+# ---------------------------------------------------------
+# Usage:
+#   python sql_export.py --model model.pkl --table analytics.customers \
+#       --passthrough Customer_ID --output assign_personas.sql
+#   python sql_export.py --model model.pkl --check customers.parquet     # SQLite vs model.predict
+#   python sql_export.py --model model.pkl --check customers.parquet --engine duckdb
+#
+#   sql = export_sql(model, "analytics.customers", passthrough=["Customer_ID"])
+#
+# The fitted Pipeline is reduced to its flat parameters (compiled_model) and
+# written out as one SELECT with a chain of CTEs:
+#   persona_input      CAST + COALESCE with the imputer fill values
+#   persona_clipped    CASE clipping to the Winsorizer bounds
+#   persona_features   Yeo-Johnson + standardization, one-hot / ordinal CASEs,
+#                      in the ColumnTransformer's output order
+#   persona_distances  ||c||^2 - 2 x.c per cluster, as KMeans computes it
+#   final SELECT       argmin CASE -> cluster_id, persona_name
+# Only CAST, COALESCE, CASE, POWER and LN are used, so the query runs on
+# SQLite (3.35+ with math functions), DuckDB, PostgreSQL and most warehouses;
+# pass --float-type for engines that spell DOUBLE PRECISION differently.
+#
+# The arithmetic follows sklearn expression by expression, so labels agree
+# exactly with model.predict except for a row whose two nearest centres are
+# within rounding error of each other. --check reports any such row. A row
+# with NULL in a feature the model has no fill value for gets a NULL
+# cluster_id; model.predict would raise on it.
+
+import argparse
+import time
+
+import numpy as np
+
+from batch_score import (
+    CLUSTER_COLUMN, DEFAULT_MODEL_PATH, PERSONA_COLUMN, PERSONA_NAMES, iter_chunks, load_model,
+)
+from compiled_model import CompiledPersonaModel
+from persona_config import FEATURE_COLUMNS
+from prediction_cache import artifact_fingerprint
+
+DEFAULT_FLOAT_TYPE = "DOUBLE PRECISION"
+CHECK_TABLE = "persona_check_input"
+CHECK_ROW = "persona_check_row"
+
+
+# ---------------------------------------------------------
+# LITERALS
+# ---------------------------------------------------------
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def quote_string(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def sql_number(value):
+    """Shortest round-trip float literal; negatives are parenthesised so '- -x' never becomes a comment."""
+    value = float(value)
+    if not np.isfinite(value):
+        raise ValueError(f"Cannot write {value!r} as a SQL literal.")
+    text = repr(value)
+    return f"({text})" if value < 0 else text
+
+
+# ---------------------------------------------------------
+# EXPRESSIONS
+# ---------------------------------------------------------
+def _yeo_johnson_sql(x, lam):
+    """PowerTransformer._yeo_johnson_transform for one column, as a CASE."""
+    if abs(lam) < np.spacing(1.0):
+        positive = f"LN({x} + 1)"
+    else:
+        positive = f"(POWER({x} + 1, {sql_number(lam)}) - 1) / {sql_number(lam)}"
+    if abs(lam - 2) <= np.spacing(1.0):
+        negative = f"-LN(-{x} + 1)"
+    else:
+        negative = f"-(POWER(-{x} + 1, {sql_number(2 - lam)}) - 1) / {sql_number(2 - lam)}"
+    return f"CASE WHEN {x} >= 0 THEN {positive} ELSE {negative} END"
+
+
+def _select(columns, source, indent="        "):
+    return "    SELECT\n" + ",\n".join(indent + column for column in columns) + f"\n    FROM {source}"
+
+
+def export_sql(model, source, passthrough=(), float_type=DEFAULT_FLOAT_TYPE, persona_names=True,
+               header=None):
+    """
+    Build the persona assignment query.
+
+    Parameters
+    ----------
+    model : fitted Pipeline or CompiledPersonaModel
+    source : str
+        Table (or parenthesised subquery) holding the FEATURE_COLUMNS;
+        inserted verbatim, so schema-qualified names work.
+    passthrough : sequence of str
+        Source columns to carry into the result, e.g. the customer id.
+    float_type : str
+        SQL type every numeric feature is cast to.
+    persona_names : bool
+        Also return persona_name next to cluster_id.
+    header : str or None
+        Comment lines written above the query (e.g. the model version).
+
+    Returns
+    -------
+    str
+        One SELECT statement returning passthrough + cluster_id
+        (+ persona_name).
+    """
+    compiled = model if isinstance(model, CompiledPersonaModel) else CompiledPersonaModel.from_pipeline(model)
+    carried = [quote_identifier(col) for col in passthrough]
+
+    # ---- persona_input: cast + impute ----
+    inputs, numeric = [], []
+    for j, col in enumerate(compiled.numeric_columns):
+        value = f"CAST({quote_identifier(col)} AS {float_type})"
+        if not np.isnan(compiled.fill[j]):
+            value = f"COALESCE({value}, {sql_number(compiled.fill[j])})"
+        inputs.append(f"{value} AS x{j}")
+        numeric.append(f"x{j}")
+    categorical = []  # (input alias, block, column index in block)
+    for block in compiled.categorical_blocks:
+        for j, col in enumerate(block["columns"]):
+            alias = f"c{len(categorical)}"
+            fill = None if block["fill"] is None else block["fill"][j]
+            if block["kind"] == "onehot":
+                value = quote_identifier(col)
+                if fill is not None:
+                    value = f"COALESCE({value}, {quote_string(fill)})"
+            else:
+                value = f"CAST({quote_identifier(col)} AS {float_type})"
+                if fill is not None:
+                    value = f"COALESCE({value}, {sql_number(fill)})"
+            inputs.append(f"{value} AS {alias}")
+            categorical.append((alias, block, j))
+    passed = [f"c{i}" for i in range(len(categorical))]
+
+    # ---- persona_clipped: winsorize ----
+    clipped = []
+    for j, x in enumerate(numeric):
+        lower, upper = compiled.lower[j], compiled.upper[j]
+        cases = []
+        if np.isfinite(lower):
+            cases.append(f"WHEN {x} < {sql_number(lower)} THEN {sql_number(lower)}")
+        if np.isfinite(upper):
+            cases.append(f"WHEN {x} > {sql_number(upper)} THEN {sql_number(upper)}")
+        clipped.append(f"CASE {' '.join(cases)} ELSE {x} END AS {x}" if cases else x)
+
+    # ---- persona_features: power transform, scaling, encoders ----
+    features = [None] * compiled.n_features_out
+    for j, x in enumerate(numeric):
+        value = x
+        if not np.isnan(compiled.lambdas[j]):
+            value = _yeo_johnson_sql(x, compiled.lambdas[j])
+        if compiled.mean[j] != 0.0 or compiled.scale[j] != 1.0:
+            value = f"(({value}) - {sql_number(compiled.mean[j])}) / {sql_number(compiled.scale[j])}"
+        features[compiled.numeric_slots[j]] = value
+    for block in compiled.categorical_blocks:
+        slot = block["start"]
+        for alias, owner, j in categorical:
+            if owner is not block:
+                continue
+            categories = block["categories"][j]
+            if block["kind"] == "onehot":
+                for category in categories:
+                    features[slot] = f"CASE WHEN {alias} = {quote_string(category)} THEN 1.0 ELSE 0.0 END"
+                    slot += 1
+            else:
+                whens = " ".join(f"WHEN {sql_number(c)} THEN {sql_number(code)}" for code, c in enumerate(categories))
+                features[slot] = f"CASE {alias} {whens} ELSE {sql_number(block['unknown_value'])} END"
+                slot += 1
+    if any(feature is None for feature in features):
+        raise ValueError("The pipeline's output columns are not all covered by the compiled model.")
+
+    # ---- persona_distances: ||c||^2 - 2 x.c ----
+    distances = []
+    for k, center in enumerate(compiled.centers):
+        dot = " + ".join(f"f{i} * {sql_number(c)}" for i, c in enumerate(center))
+        distances.append(f"{sql_number(compiled.centers_squared_norms[k])} - 2.0 * ({dot}) AS d{k}")
+
+    # ---- argmin, first centre wins ties like numpy ----
+    n_clusters = len(compiled.centers)
+    whens = ["WHEN d0 IS NULL THEN NULL"]
+    for k in range(n_clusters - 1):
+        rest = " AND ".join(f"d{k} <= d{m}" for m in range(k + 1, n_clusters))
+        whens.append(f"WHEN {rest} THEN {k}")
+    label = f"CASE {' '.join(whens)} ELSE {n_clusters - 1} END"
+
+    ctes = [
+        ("persona_input", _select(carried + inputs, source)),
+        ("persona_clipped", _select(carried + clipped + passed, "persona_input")),
+        ("persona_features", _select(carried + [f"{v} AS f{i}" for i, v in enumerate(features)],
+                                     "persona_clipped")),
+        ("persona_distances", _select(carried + distances, "persona_features")),
+        ("persona_labels", _select(carried + [f"{label} AS {quote_identifier(CLUSTER_COLUMN)}"],
+                                   "persona_distances")),
+    ]
+    outputs = carried + [quote_identifier(CLUSTER_COLUMN)]
+    if persona_names:
+        if n_clusters > len(PERSONA_NAMES):
+            raise ValueError(f"{n_clusters} clusters but only {len(PERSONA_NAMES)} persona names.")
+        names = " ".join(f"WHEN {k} THEN {quote_string(PERSONA_NAMES[k])}" for k in range(n_clusters))
+        outputs.append(f"CASE {quote_identifier(CLUSTER_COLUMN)} {names} END AS {quote_identifier(PERSONA_COLUMN)}")
+
+    lines = [f"-- {line}" for line in (header or "").splitlines()]
+    body = ",\n".join(f"{name} AS (\n{select}\n)" for name, select in ctes)
+    final = "SELECT\n" + ",\n".join("    " + column for column in outputs) + "\nFROM persona_labels"
+    return "\n".join(lines + ["WITH " + body, final]) + ";\n"
+
+
+# ---------------------------------------------------------
+# LOCAL AGREEMENT CHECK (SQLite or DuckDB vs model.predict)
+# ---------------------------------------------------------
+def _run_sqlite(sql, frame):
+    import sqlite3
+
+    connection = sqlite3.connect(":memory:")
+    try:
+        # categoricals as plain values; NaN / None become NULL
+        frame.astype({col: object for col in frame.columns if frame[col].dtype.name == "category"}).to_sql(
+            CHECK_TABLE, connection, index=False,
+        )
+        rows = connection.execute(sql).fetchall()
+    finally:
+        connection.close()
+    return rows
+
+
+def _run_duckdb(sql, frame):
+    import duckdb
+
+    connection = duckdb.connect()
+    try:
+        connection.register(CHECK_TABLE, frame)
+        rows = connection.execute(sql).fetchall()
+    finally:
+        connection.close()
+    return rows
+
+
+ENGINES = {"sqlite": _run_sqlite, "duckdb": _run_duckdb}
+
+
+def check_agreement(model, frame, engine="sqlite", float_type=DEFAULT_FLOAT_TYPE):
+    """
+    Run the exported query over `frame` in a local engine and compare it
+    with model.predict.
+
+    Returns a dict with rows, mismatches, agreement, the seconds taken by
+    each side and, for every mismatching row, its index and the gap between
+    its two nearest centres (a near-zero gap is a rounding tie, not a bug).
+    """
+    frame = frame[FEATURE_COLUMNS].reset_index(drop=True)
+    sql = export_sql(model, CHECK_TABLE, passthrough=[CHECK_ROW], float_type=float_type, persona_names=False)
+    start = time.perf_counter()
+    # engines may return rows in any order: carry the position through the query
+    rows = ENGINES[engine](sql, frame.assign(**{CHECK_ROW: np.arange(len(frame))}))
+    sql_labels = np.full(len(frame), np.nan)
+    for position, label in rows:
+        if label is not None:
+            sql_labels[position] = label
+    sql_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    labels = np.asarray(model.predict(frame), dtype=float)
+    predict_seconds = time.perf_counter() - start
+
+    mismatched = np.flatnonzero(sql_labels != labels)
+    compiled = model if isinstance(model, CompiledPersonaModel) else CompiledPersonaModel.from_pipeline(model)
+    gaps = []
+    if len(mismatched):
+        Xt = compiled.transform(frame.iloc[mismatched])
+        distances = np.sort(compiled.centers_squared_norms - 2.0 * (Xt @ compiled.centers.T), axis=1)
+        gaps = (distances[:, 1] - distances[:, 0]).tolist()
+    return {
+        "engine": engine,
+        "rows": len(frame),
+        "mismatches": len(mismatched),
+        "agreement": 1.0 - len(mismatched) / max(len(frame), 1),
+        "mismatched_rows": [{"row": int(i), "nearest_gap": gap} for i, gap in zip(mismatched, gaps)],
+        "sql_seconds": sql_seconds,
+        "predict_seconds": predict_seconds,
+    }
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def build_parser():
+    parser = argparse.ArgumentParser(description="Export the persona model as a SQL query.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to model.pkl or a model artifact.")
+    parser.add_argument("--table", default="customers", help="Source table or (subquery) in the warehouse.")
+    parser.add_argument("--passthrough", nargs="*", default=[], help="Source columns to keep, e.g. the id.")
+    parser.add_argument("--float-type", default=DEFAULT_FLOAT_TYPE,
+                        help="SQL type numeric features are cast to (e.g. FLOAT64 on BigQuery).")
+    parser.add_argument("--no-names", action="store_true", help="Return cluster_id only.")
+    parser.add_argument("--output", default=None, help="Write the query here (default: stdout).")
+    parser.add_argument("--check", default=None,
+                        help="CSV or Parquet file: run the query locally and compare with model.predict.")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="sqlite", help="Engine for --check.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows of --check data to compare.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    model = load_model(args.model)
+
+    if args.check:
+        frame = next(iter_chunks(args.check, chunksize=args.rows, columns=FEATURE_COLUMNS))
+        result = check_agreement(model, frame, engine=args.engine, float_type=args.float_type)
+        print(f"{result['engine']}: {result['rows']:,} rows, {result['mismatches']} mismatches "
+              f"(agreement {result['agreement']:.4%}); SQL {result['sql_seconds']:.2f}s, "
+              f"predict {result['predict_seconds']:.2f}s")
+        for row in result["mismatched_rows"][:20]:
+            print(f"  row {row['row']}: nearest centres {row['nearest_gap']:.3g} apart")
+        if result["mismatches"]:
+            raise SystemExit(1)
+        return result
+
+    header = f"Persona assignment generated by sql_export.py\nmodel sha256: {artifact_fingerprint(args.model)}"
+    sql = export_sql(model, args.table, passthrough=args.passthrough, float_type=args.float_type,
+                     persona_names=not args.no_names, header=header)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(sql)
+        print(f"Query ({len(sql):,} characters) -> {args.output}")
+    else:
+        print(sql, end="")
+    return sql
+
+
+if __name__ == "__main__":
+    main()
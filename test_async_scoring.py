@@ -0,0 +1,106 @@
+# test_async_scoring.py
+# ---------------------------------------------------------
+# REGRESSION CHECKS (priority lanes, queue limits, 503 vs 413)
+# ---------------------------------------------------------
+# Usage:
+#   python -m pytest -q test_async_scoring.py
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from async_scoring import AsyncScorer, QueueFullError, RequestTooLargeError
+
+
+class GatedScorer:
+    """Row-wise scorer that records every call and blocks until `gate` is set."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.calls = []
+
+    def __call__(self, records):
+        self.gate.wait(5)
+        self.calls.append(list(records))
+        return np.asarray(records)
+
+
+async def _wait_until_running(scorer):
+    while not scorer._running:
+        await asyncio.sleep(0.001)
+
+
+def test_interactive_lane_goes_first():
+    fn = GatedScorer()
+
+    async def run():
+        scorer = AsyncScorer(fn, workers=1, bulk_chunk_rows=2)
+        scorer.start()
+        first = asyncio.ensure_future(scorer.submit([0], lane="bulk"))
+        await _wait_until_running(scorer)
+        bulk = asyncio.ensure_future(scorer.submit([1, 2, 3], lane="bulk"))
+        interactive = asyncio.ensure_future(scorer.submit([9], lane="interactive"))
+        await asyncio.sleep(0.01)
+        fn.gate.set()
+        results = await asyncio.gather(first, bulk, interactive)
+        await scorer.stop()
+        return results
+
+    first, bulk, interactive = asyncio.run(run())
+    # the running bulk job finishes, then the lookup jumps the queued bulk chunks
+    assert fn.calls == [[0], [9], [1, 2], [3]]
+    assert bulk.labels.tolist() == [1, 2, 3] and interactive.labels.tolist() == [9]
+
+
+def test_full_lane_and_oversized_request_are_told_apart():
+    fn = GatedScorer()
+
+    async def run():
+        scorer = AsyncScorer(fn, workers=1, max_queue_rows={"interactive": 3})
+        scorer.start()
+        running = asyncio.ensure_future(scorer.submit([0]))
+        await _wait_until_running(scorer)
+        waiting = asyncio.ensure_future(scorer.submit([1, 2]))
+        await asyncio.sleep(0.01)
+        with pytest.raises(QueueFullError):
+            await scorer.submit([3, 4])
+        with pytest.raises(RequestTooLargeError):
+            await scorer.submit([5, 6, 7, 8])
+        # a request that fits once the queue drains is still accepted
+        fn.gate.set()
+        await asyncio.gather(running, waiting)
+        result = await scorer.submit([3, 4, 5])
+        stats = scorer.stats()["lanes"]["interactive"]
+        await scorer.stop()
+        return result, stats
+
+    result, stats = asyncio.run(run())
+    assert result.labels.tolist() == [3, 4, 5]
+    assert stats["rejected"] == 1 and stats["too_large"] == 1 and stats["completed"] == 3
+
+
+def test_api_maps_oversized_requests_to_413():
+    httpx = pytest.importorskip("httpx")
+    import api
+    from benchmark import synthetic_customers
+    from persona_config import FEATURE_COLUMNS
+
+    records = synthetic_customers(3, seed=10)[FEATURE_COLUMNS].astype(
+        {"Gender": object, "Occupation": object}
+    ).to_dict("records")
+
+    async def run():
+        async with api.lifespan(api.app):
+            api.state["scorer"].max_queue_rows["interactive"] = 2
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                too_large = await client.post("/predict/batch?lane=interactive", json=records)
+                fits = await client.post("/predict/batch?lane=interactive", json=records[:2])
+        return too_large, fits
+
+    too_large, fits = asyncio.run(run())
+    assert too_large.status_code == 413
+    assert "Retry-After" not in too_large.headers
+    assert fits.status_code == 200
@@ -0,0 +1,131 @@
+# test_batch_score.py
+# ---------------------------------------------------------
+# REGRESSION CHECKS (chunked Parquet output, top-N pipelines)
+# ---------------------------------------------------------
+# Usage:
+#   python -m pytest -q test_batch_score.py
+
+import os
+
+import joblib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from batch_score import load_model, score_file
+from benchmark import synthetic_customers
+from incremental_score import incremental_score
+from persona_profiles import compute_profiles
+from persona_config import FEATURE_COLUMNS
+from train_model import build_pipeline
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.pkl")
+
+
+def test_parquet_quarantine_spans_chunks(tmp_path):
+    # `note` and `score` are null in the first rejected chunk and set in a later one
+    df = synthetic_customers(3000, seed=1).astype({"Gender": object, "Occupation": object})
+    df["note"] = None
+    df.loc[2500, "note"] = "vip"
+    df["score"] = pd.array([None] * 3000, dtype="Int64")
+    df.loc[2500, "score"] = 7
+    df.loc[10, "Age"] = 500
+    df.loc[2500, "Gender"] = "Robot"
+    source = tmp_path / "in.parquet"
+    df.to_parquet(source)
+    rejected = tmp_path / "rejected.parquet"
+
+    stats = score_file(str(source), str(tmp_path / "out.parquet"), model_path=MODEL_PATH,
+                       chunksize=1000, quarantine_path=str(rejected))
+
+    assert stats["rows"] == 2998 and stats["quarantined"] == 2
+    schema = pq.read_schema(rejected)
+    assert schema.field("input_row").type == pa.int64()
+    assert schema.field("Age").type == pa.string()
+    assert schema.field("score").type == pa.int64()
+    quarantine = pd.read_parquet(rejected)
+    assert quarantine["input_row"].tolist() == [10, 2500]
+    assert quarantine["note"].tolist() == [None, "vip"]
+
+
+def test_csv_to_parquet_with_empty_first_chunk(tmp_path):
+    df = synthetic_customers(3000, seed=2)
+    df["note"] = None
+    df.loc[2500, "note"] = "vip"
+    source = tmp_path / "in.csv"
+    df.to_csv(source, index=False)
+    output = tmp_path / "out.parquet"
+
+    score_file(str(source), str(output), model_path=MODEL_PATH, chunksize=1000)
+
+    assert pd.read_parquet(output)["note"].tolist()[2500] == "vip"
+
+
+def test_sparse_numeric_passthrough_keeps_its_type(tmp_path, caplog):
+    # `bonus` is empty in the first two chunks of the CSV and numeric later
+    df = synthetic_customers(3000, seed=5)
+    df["bonus"] = None
+    df.loc[2500, "bonus"] = 7.5
+    df["never"] = None
+    source = tmp_path / "in.csv"
+    df.to_csv(source, index=False)
+    output = tmp_path / "out.parquet"
+
+    with caplog.at_level("WARNING", logger="batch_score"):
+        score_file(str(source), str(output), model_path=MODEL_PATH, chunksize=1000)
+
+    schema = pq.read_schema(output)
+    assert schema.field("bonus").type == pa.float64()
+    assert pd.read_parquet(output)["bonus"].tolist()[2500] == 7.5
+    # nothing ever typed `never`: it is written as string, and said so
+    assert schema.field("never").type == pa.string()
+    assert "never" in caplog.text and "bonus" not in caplog.text
+
+
+def test_sparse_parquet_column_takes_the_source_type(tmp_path):
+    df = synthetic_customers(3000, seed=6)
+    df["bonus"] = pd.array([None] * 3000, dtype="Int32")
+    df.loc[2500, "bonus"] = 3
+    source = tmp_path / "in.parquet"
+    df.to_parquet(source)
+    output = tmp_path / "out.parquet"
+
+    score_file(str(source), str(output), model_path=MODEL_PATH, chunksize=1000)
+
+    assert pq.read_schema(output).field("bonus").type == pa.int32()
+    assert pd.read_parquet(output)["bonus"].tolist()[2500] == 3
+
+
+def test_top_n_pipeline_scores_categorical_chunks(tmp_path):
+    # iter_chunks hands Gender / Occupation over as Categoricals
+    df = synthetic_customers(3000, seed=3)
+    pipeline = build_pipeline(top_n=1).fit(df[FEATURE_COLUMNS].astype({"Gender": object, "Occupation": object}))
+    model_path = tmp_path / "top_n.pkl"
+    joblib.dump(pipeline, model_path)
+    expected = pipeline.predict(df[FEATURE_COLUMNS].astype({"Gender": object, "Occupation": object}))
+    df.to_csv(tmp_path / "in.csv", index=False)
+    df.to_parquet(tmp_path / "in.parquet")
+
+    for source in ("in.csv", "in.parquet"):
+        output = tmp_path / f"out_{source}.parquet"
+        score_file(str(tmp_path / source), str(output), model_path=str(model_path), chunksize=1000)
+        assert (pd.read_parquet(output)["cluster_id"].to_numpy() == expected).all()
+
+
+def test_integer_city_tier_csv(tmp_path):
+    # no nulls: pandas reads City_Tier as int64, which trf4's 0.0 fill rejects
+    df = synthetic_customers(2000, seed=4)
+    df["City_Tier"] = df["City_Tier"].fillna(1.0).astype(int)
+    df["Customer_ID"] = range(len(df))
+    source = tmp_path / "ints.csv"
+    df.to_csv(source, index=False)
+    model = load_model(MODEL_PATH)
+    expected = model.predict(df[FEATURE_COLUMNS].astype({"City_Tier": float}))
+
+    score_file(str(source), str(tmp_path / "out.csv"), model=model, chunksize=500)
+    assert (pd.read_csv(tmp_path / "out.csv")["cluster_id"].to_numpy() == expected).all()
+    incremental_score(str(source), str(tmp_path / "inc.csv"), str(tmp_path / "state.parquet"), "Customer_ID",
+                      model=model, model_path=MODEL_PATH, chunksize=500)
+    assert (pd.read_csv(tmp_path / "inc.csv")["cluster_id"].to_numpy() == expected).all()
+    profiles = compute_profiles(model, str(source), chunksize=500)
+    assert profiles["rows"] == len(df)
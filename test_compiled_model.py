@@ -0,0 +1,81 @@
+# test_compiled_model.py
+# ---------------------------------------------------------
+# REGRESSION CHECKS (compiled predictor and SQL export vs the Pipeline)
+# ---------------------------------------------------------
+# Usage:
+#   python -m pytest -q test_compiled_model.py
+
+import os
+
+import numpy as np
+import pytest
+
+from batch_score import load_model
+from benchmark import synthetic_customers
+from compiled_model import CompiledPersonaModel
+from persona_config import CATEGORICAL_COLUMNS, FEATURE_COLUMNS
+from sql_export import check_agreement
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.pkl")
+# EMI_Presence is passed through unimputed, so it has to stay filled
+NUMERIC_COLUMNS = [col for col in FEATURE_COLUMNS if col not in CATEGORICAL_COLUMNS + ["City_Tier", "EMI_Presence"]]
+
+
+@pytest.fixture(scope="module")
+def model():
+    return load_model(MODEL_PATH)
+
+
+@pytest.fixture(scope="module")
+def customers():
+    """Synthetic customers plus the inputs each branch has to fill or ignore."""
+    df = synthetic_customers(2000, seed=9)[FEATURE_COLUMNS].astype({"Gender": object, "Occupation": object})
+    for i, col in enumerate(NUMERIC_COLUMNS):
+        df.loc[i, col] = np.nan
+    df.loc[20, NUMERIC_COLUMNS] = np.nan
+    df.loc[30, "Gender"] = None
+    df.loc[31, "Gender"] = np.nan
+    df.loc[32, "Gender"] = "Robot"
+    df.loc[33, "Occupation"] = None
+    df.loc[34, "Occupation"] = "Astronaut"
+    df.loc[35, ["Gender", "Occupation"]] = np.nan
+    df.loc[40, "City_Tier"] = 7.0
+    df.loc[41, "City_Tier"] = -1.0
+    df.loc[42, "City_Tier"] = np.nan
+    df.loc[43, "City_Tier"] = 2.5
+    return df
+
+
+def test_compiled_predict_matches_pipeline(model, customers):
+    compiled = CompiledPersonaModel.from_pipeline(model)
+    assert (compiled.predict(customers) == model.predict(customers)).all()
+    records = customers.iloc[:50].to_dict("records")
+    assert compiled.predict(records).tolist() == model.predict(customers.iloc[:50]).tolist()
+    assert [compiled.predict_one(record) for record in records] == model.predict(customers.iloc[:50]).tolist()
+
+
+def test_compiled_artifact_round_trip(model, customers, tmp_path):
+    compiled = CompiledPersonaModel.from_pipeline(model)
+    compiled.save(str(tmp_path / "compiled"))
+    loaded = CompiledPersonaModel.load(str(tmp_path / "compiled"))
+    assert (loaded.predict(customers) == model.predict(customers)).all()
+
+
+@pytest.mark.parametrize("engine", ["sqlite", "duckdb"])
+def test_sql_export_agrees_with_pipeline(model, customers, engine):
+    if engine == "duckdb":
+        pytest.importorskip("duckdb")
+    result = check_agreement(model, customers, engine=engine)
+    assert result["rows"] == len(customers)
+    assert result["mismatches"] == 0, result["mismatched_rows"][:5]
+
+
+def test_slim_artifact_loads_both_variants(model, customers, tmp_path):
+    from model_artifact import export_artifact, load_artifact
+
+    path = export_artifact(model, str(tmp_path / "slim"))
+    expected = model.predict(customers)
+    pipeline = load_artifact(path, compiled=False)
+    assert not hasattr(pipeline.steps[-1][1], "labels_")
+    assert (pipeline.predict(customers) == expected).all()
+    assert (load_artifact(path).predict(customers) == expected).all()
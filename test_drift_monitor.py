@@ -0,0 +1,57 @@
+# test_drift_monitor.py
+# ---------------------------------------------------------
+# REGRESSION CHECKS (model vs data reference, category matching)
+# ---------------------------------------------------------
+# Usage:
+#   python -m pytest -q test_drift_monitor.py
+
+import os
+
+import pytest
+
+from batch_score import load_model
+from benchmark import synthetic_customers
+from drift_monitor import DriftMonitor
+from persona_config import FEATURE_COLUMNS
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.pkl")
+
+
+@pytest.fixture(scope="module")
+def model():
+    return load_model(MODEL_PATH)
+
+
+def _customers(n, seed):
+    return synthetic_customers(n, seed=seed)[FEATURE_COLUMNS].astype({"Gender": object, "Occupation": object})
+
+
+def test_integer_city_tier_is_not_unseen(model):
+    df = _customers(1000, seed=11)
+    df["City_Tier"] = df["City_Tier"].fillna(1.0).astype(int).astype(object)
+    df.loc[:9, "City_Tier"] = 2.0
+    report = DriftMonitor(model).update(df, model.predict(df.astype({"City_Tier": float}))).report()
+    assert report["categorical"]["City_Tier"]["unseen_share"] == 0
+    assert not [alert for alert in report["alerts"] if alert.startswith("City_Tier")]
+
+
+def test_model_reference_never_alerts_on_numeric_psi(model):
+    shifted = _customers(2000, seed=12)
+    shifted["Age"] += 25
+    report = DriftMonitor(model).update(shifted).report()
+    age = report["numeric"]["Age"]
+    assert age["approximate"] and age["psi"] > 0.25
+    assert age["status"] is None
+    assert not [alert for alert in report["alerts"] if alert.startswith("Age")]
+
+
+def test_data_reference_alerts_on_numeric_psi(model):
+    baseline = _customers(4000, seed=13)
+    reference = DriftMonitor(model).update(baseline, model.predict(baseline)).to_reference()
+    shifted = _customers(2000, seed=14)
+    shifted["Age"] += 25
+    report = DriftMonitor(model, reference).update(shifted).report()
+    assert report["numeric"]["Age"]["status"] == "major"
+    assert any(alert.startswith("Age") for alert in report["alerts"])
+    steady = DriftMonitor(model, reference).update(_customers(2000, seed=15)).report()
+    assert not [alert for alert in steady["alerts"] if alert.startswith("Age")]
@@ -0,0 +1,90 @@
+# test_incremental_score.py
+# ---------------------------------------------------------
+# REGRESSION CHECKS (snapshot diffing, CSV/Parquet switch, on-disk join)
+# ---------------------------------------------------------
+# Usage:
+#   python -m pytest -q test_incremental_score.py
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_score import load_model
+from benchmark import synthetic_customers
+from incremental_score import incremental_score
+from persona_config import FEATURE_COLUMNS
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.pkl")
+
+
+@pytest.fixture(scope="module")
+def model():
+    return load_model(MODEL_PATH)
+
+
+def _snapshot(n, seed):
+    df = synthetic_customers(n, seed=seed)[FEATURE_COLUMNS].astype({"Gender": object, "Occupation": object})
+    df["EMI_Presence"] = df["EMI_Presence"].astype("int8")
+    df.insert(0, "Customer_ID", np.arange(n, dtype=np.int64))
+    return df
+
+
+def _run(model, snapshot, state, out, **kwargs):
+    return incremental_score(str(snapshot), str(out), str(state), "Customer_ID", model=model,
+                             model_path=MODEL_PATH, chunksize=700, **kwargs)
+
+
+def test_second_run_reuses_everything_and_tracks_edits(model, tmp_path):
+    df = _snapshot(3000, seed=21)
+    df.to_parquet(tmp_path / "day1.parquet", index=False)
+    first = _run(model, tmp_path / "day1.parquet", tmp_path / "state.parquet", tmp_path / "out1.parquet")
+    assert first["full_rescore_reason"] == "no previous state" and first["scored"] == 3000
+
+    day2 = df.drop(index=range(10)).reset_index(drop=True)
+    day2.loc[:4, "Age"] += 1
+    new = _snapshot(3, seed=22).assign(Customer_ID=[9001, 9002, 9003])
+    day2 = pd.concat([day2, new], ignore_index=True)
+    day2.to_parquet(tmp_path / "day2.parquet", index=False)
+    second = _run(model, tmp_path / "day2.parquet", tmp_path / "state.parquet", tmp_path / "out2.parquet")
+    assert (second["new"], second["changed"], second["removed"]) == (3, 5, 10)
+    assert second["scored"] == 8 and second["unchanged"] == len(day2) - 8
+    merged = pd.read_parquet(tmp_path / "out2.parquet")
+    assert (merged["cluster_id"].to_numpy() == model.predict(day2[FEATURE_COLUMNS])).all()
+
+
+def test_switching_a_snapshot_to_csv_changes_nothing(model, tmp_path):
+    df = _snapshot(3000, seed=23)
+    df.to_parquet(tmp_path / "snapshot.parquet", index=False)
+    df.to_csv(tmp_path / "snapshot.csv", index=False)
+    _run(model, tmp_path / "snapshot.parquet", tmp_path / "state.parquet", tmp_path / "out.parquet")
+    stats = _run(model, tmp_path / "snapshot.csv", tmp_path / "state.parquet", tmp_path / "out.csv")
+    assert (stats["new"], stats["changed"], stats["scored"]) == (0, 0, 0)
+    back = _run(model, tmp_path / "snapshot.parquet", tmp_path / "state.parquet", tmp_path / "out.parquet")
+    assert back["scored"] == 0
+
+
+def test_on_disk_join_matches_the_in_memory_join(model, tmp_path):
+    df = _snapshot(3000, seed=24)
+    df.to_parquet(tmp_path / "day1.parquet", index=False)
+    day2 = pd.concat([df.drop(index=range(0, 3000, 7)), _snapshot(40, seed=25).assign(
+        Customer_ID=np.arange(5000, 5040))], ignore_index=True).sample(frac=1, random_state=0)
+    day2.loc[day2.index[::11], "Age"] += 1
+    day2.to_parquet(tmp_path / "day2.parquet", index=False)
+
+    results = []
+    for name, max_state_rows in [("memory", 10_000), ("disk", 500)]:
+        state = tmp_path / f"{name}.parquet"
+        _run(model, tmp_path / "day1.parquet", state, tmp_path / f"{name}1.parquet")
+        stats = _run(model, tmp_path / "day2.parquet", state, tmp_path / f"{name}2.parquet",
+                     max_state_rows=max_state_rows)
+        merged = pd.read_parquet(tmp_path / f"{name}2.parquet")
+        results.append(({k: stats[k] for k in ("new", "changed", "removed", "unchanged", "scored")}, merged))
+        assert not [p for p in os.listdir(tmp_path) if p.startswith(".persona-join-")]
+
+    (memory_stats, memory_out), (disk_stats, disk_out) = results
+    assert disk_stats == memory_stats
+    assert memory_stats["changed"] > 0 and memory_stats["new"] == 40 and memory_stats["removed"] == len(range(0, 3000, 7))
+    pd.testing.assert_frame_equal(disk_out, memory_out)
+    assert (disk_out["cluster_id"].to_numpy() == model.predict(day2[FEATURE_COLUMNS])).all()
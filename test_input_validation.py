@@ -0,0 +1,99 @@
+# test_input_validation.py
+# ---------------------------------------------------------
+# REGRESSION CHECKS (coercion, rejection reasons, quarantine rows)
+# ---------------------------------------------------------
+# Usage:
+#   python -m pytest -q test_input_validation.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import synthetic_customers
+from input_validation import ERRORS_COLUMN, ROW_COLUMN, validate_frame
+from persona_config import FEATURE_COLUMNS
+
+
+def _customers(n, seed):
+    df = synthetic_customers(n, seed=seed)[FEATURE_COLUMNS].astype({"Gender": object, "Occupation": object})
+    df.insert(0, "Customer_ID", np.arange(n))
+    return df
+
+
+def test_clean_frame_passes_untouched():
+    df = _customers(500, seed=31)
+    result = validate_frame(df)
+    assert len(result.valid) == 500 and len(result.quarantine) == 0
+    assert result.error_counts == {}
+    assert result.valid["Customer_ID"].tolist() == df["Customer_ID"].tolist()
+
+
+def test_text_is_normalised_and_missing_values_pass():
+    df = _customers(6, seed=32).astype({"Age": object, "City_Tier": object})
+    df["Gender"] = ["  male", "FEMALE", "Other ", None, np.nan, "Male"]
+    df.loc[0, "Age"] = " 42 "
+    df.loc[1, "City_Tier"] = "2"
+    df.loc[2, "Occupation"] = "self-employed"
+    df.loc[3, "Annual_Income"] = np.nan
+    result = validate_frame(df)
+    assert len(result.quarantine) == 0
+    valid = result.valid
+    assert valid["Gender"].tolist()[:3] == ["Male", "Female", "Other"]
+    assert valid["Gender"].isna().tolist() == [False, False, False, True, True, False]
+    assert valid.loc[0, "Age"] == 42 and valid.loc[2, "Occupation"] == "Self-Employed"
+    assert valid["City_Tier"].dtype == np.float64 and valid.loc[1, "City_Tier"] == 2.0
+    # the caller's frame is not modified
+    assert df.loc[0, "Age"] == " 42 "
+
+
+def test_rejected_rows_carry_their_reasons():
+    df = _customers(10, seed=33).astype({"Age": object})
+    df.loc[2, "Age"] = "forty"
+    df.loc[3, "Age"] = 150
+    df.loc[3, "Gender"] = "Robot"
+    df.loc[5, "City_Tier"] = 4.0
+    df.loc[6, "UPI_Usage_Ratio"] = np.inf
+    df.loc[7, "EMI_Presence"] = 2
+    result = validate_frame(df, row_offset=1000)
+
+    quarantine = result.quarantine.set_index(ROW_COLUMN)
+    assert quarantine.index.tolist() == [1002, 1003, 1005, 1006, 1007]
+    assert quarantine.loc[1002, ERRORS_COLUMN] == "Age: not a number"
+    assert quarantine.loc[1003, ERRORS_COLUMN] == (
+        "Age: out of range [18, 100]; Gender: not one of ['Male', 'Female', 'Other']"
+    )
+    assert quarantine.loc[1006, ERRORS_COLUMN] == "UPI_Usage_Ratio: not finite"
+    # the original values are kept, as text
+    assert quarantine.loc[1002, "Age"] == "forty" and quarantine.loc[1003, "Gender"] == "Robot"
+    assert quarantine.loc[1005, "Customer_ID"] == 5
+    assert result.error_counts == {
+        "Age: not a number": 1,
+        "Age: out of range [18, 100]": 1,
+        "Gender: not one of ['Male', 'Female', 'Other']": 1,
+        "City_Tier: not one of [1.0, 2.0, 3.0]": 1,
+        "UPI_Usage_Ratio: not finite": 1,
+        "EMI_Presence: not one of [0, 1]": 1,
+    }
+    assert result.valid["Customer_ID"].tolist() == [0, 1, 4, 8, 9]
+
+
+def test_strict_integers_rejects_fractions():
+    df = _customers(3, seed=34)
+    df["Age"] = [30.0, 30.5, 31.0]
+    assert len(validate_frame(df).quarantine) == 0
+    strict = validate_frame(df, strict_integers=True)
+    assert strict.quarantine[ERRORS_COLUMN].tolist() == ["Age: not a whole number"]
+
+
+def test_categorical_input_is_mapped_by_code():
+    df = _customers(4, seed=35)
+    df["Gender"] = pd.Categorical(["male", "Female", "x", None])
+    result = validate_frame(df)
+    assert result.quarantine[ROW_COLUMN].tolist() == [2]
+    assert result.valid["Gender"].tolist()[:2] == ["Male", "Female"]
+    assert result.valid["Gender"].isna().tolist() == [False, False, True]
+
+
+def test_missing_feature_column_is_an_error():
+    with pytest.raises(ValueError, match="Occupation"):
+        validate_frame(_customers(3, seed=36).drop(columns="Occupation"))
@@ -0,0 +1,103 @@
+# test_model_registry.py
+# ---------------------------------------------------------
+# REGRESSION CHECKS (publish, verified loads, hot swap, API drift rebind)
+# ---------------------------------------------------------
+# Usage:
+#   python -m pytest -q test_model_registry.py
+
+import asyncio
+import os
+
+import joblib
+import numpy as np
+import pytest
+
+from benchmark import synthetic_customers
+from model_registry import ChecksumError, HotSwapModel, ModelRegistry
+from persona_config import FEATURE_COLUMNS
+from train_model import build_pipeline
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.pkl")
+
+
+@pytest.fixture(scope="module")
+def retrained(tmp_path_factory):
+    """A second, different model.pkl."""
+    df = synthetic_customers(2000, seed=16)[FEATURE_COLUMNS].astype({"Gender": object, "Occupation": object})
+    path = tmp_path_factory.mktemp("retrained") / "model.pkl"
+    joblib.dump(build_pipeline(random_state=7).fit(df), path)
+    return str(path)
+
+
+def test_publish_promote_and_dedupe(tmp_path, retrained):
+    registry = ModelRegistry(str(tmp_path / "models"))
+    first = registry.publish(MODEL_PATH, note="baseline")
+    assert registry.publish(MODEL_PATH) == first
+    second = registry.publish(retrained, alias="candidate")
+    assert (first, second) == ("v0001", "v0002")
+    assert registry.aliases() == {"candidate": "v0002", "production": "v0001"}
+    registry.set_alias("production", second)
+    assert registry.load("production").version == second
+    with pytest.raises(KeyError):
+        registry.set_alias("production", "v0009")
+
+
+def test_load_deserialises_the_verified_copy(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "models"))
+    version = registry.publish(MODEL_PATH)
+    published = registry.path(version)
+
+    def tampering_loader(path):
+        # the registry file changes after the checksum was taken
+        with open(published, "wb") as fh:
+            fh.write(b"not a model")
+        assert path != published
+        return joblib.load(path)
+
+    served = registry.load(version, loader=tampering_loader)
+    assert hasattr(served.model, "predict")
+    with pytest.raises(ChecksumError):
+        registry.load(version)
+
+
+def test_hot_swap_skips_a_corrupt_version(tmp_path, retrained):
+    registry = ModelRegistry(str(tmp_path / "models"))
+    first = registry.publish(MODEL_PATH)
+    served = HotSwapModel(registry, warm=None)
+    second = registry.publish(retrained)
+    with open(registry.path(second), "ab") as fh:
+        fh.write(b"\0")
+    assert not served.check() and served.version == first
+    assert second in served.last_error
+
+
+def test_api_drift_monitor_follows_a_hot_swap(tmp_path, retrained, monkeypatch):
+    httpx = pytest.importorskip("httpx")
+    import api
+
+    registry = ModelRegistry(str(tmp_path / "models"))
+    registry.publish(MODEL_PATH)
+    monkeypatch.setattr(api, "REGISTRY", registry.root)
+    monkeypatch.setattr(api, "DRIFT", True)
+    records = synthetic_customers(50, seed=17)[FEATURE_COLUMNS].dropna().head(5).astype(
+        {"Gender": object, "Occupation": object}
+    ).to_dict("records")
+
+    async def run():
+        async with api.lifespan(api.app):
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await client.post("/predict/batch", json=records)
+                before = api.state["drift"].rows
+                registry.publish(retrained)
+                assert api.state["served"].check()
+                response = await client.post("/predict/batch", json=records)
+                monitor = api.state["drift"]
+                return before, response.json()[0]["model_version"], api.state["drift_version"], monitor
+
+    before, response_version, drift_version, monitor = asyncio.run(run())
+    assert before == 5
+    assert response_version == drift_version == "v0002"
+    # a fresh monitor, in the space of the new model
+    assert monitor.rows == 5
+    assert np.allclose(monitor.compiled.centers, joblib.load(retrained).steps[-1][1].cluster_centers_)
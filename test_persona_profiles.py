@@ -0,0 +1,39 @@
+# test_persona_profiles.py
+# ---------------------------------------------------------
+# REGRESSION CHECKS (rupee formatting on persona cards)
+# ---------------------------------------------------------
+# Usage:
+#   python -m pytest -q test_persona_profiles.py
+
+import pytest
+
+from persona_profiles import format_rupees
+
+
+@pytest.mark.parametrize("value, expected", [
+    (0, "₹0"),
+    (999, "₹999"),
+    (1000, "₹1,000"),
+    (99999, "₹99,999"),
+    (100000, "₹1,00,000"),
+    (850000, "₹8,50,000"),
+    (12345678, "₹1,23,45,678"),
+    (1234567890, "₹1,23,45,67,890"),
+])
+def test_indian_digit_grouping(value, expected):
+    assert format_rupees(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    (-1, "-₹1"),
+    (-1234567, "-₹12,34,567"),
+    (-999.6, "-₹1,000"),
+])
+def test_sign_goes_in_front(value, expected):
+    assert format_rupees(value) == expected
+
+
+def test_medians_are_rounded():
+    assert format_rupees(849999.5) == "₹8,50,000"
+    assert format_rupees(1234.4) == "₹1,234"
+    assert format_rupees(-0.4) == "₹0"
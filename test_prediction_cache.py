@@ -0,0 +1,101 @@
+# test_prediction_cache.py
+# ---------------------------------------------------------
+# REGRESSION CHECKS (canonical keys, TTL, versioned writes)
+# ---------------------------------------------------------
+# Usage:
+#   python -m pytest -q test_prediction_cache.py
+
+import time
+
+import numpy as np
+
+from benchmark import synthetic_customers
+from persona_config import FEATURE_COLUMNS
+from prediction_cache import CachedPersonaModel, PredictionCache, canonical_key, canonical_keys
+
+
+class ConstantModel:
+    """Labels every row with `label`; `on_predict` runs before it returns."""
+
+    def __init__(self, label, on_predict=None):
+        self.label = label
+        self.on_predict = on_predict
+        self.calls = 0
+
+    def predict(self, X):
+        self.calls += 1
+        if self.on_predict is not None:
+            self.on_predict()
+        return np.full(len(X), self.label)
+
+
+def test_equivalent_records_share_a_key():
+    record = synthetic_customers(1, seed=5)[FEATURE_COLUMNS].iloc[0].to_dict()
+    record["Age"] = 30
+    same = dict(record, Age=np.int64(30))
+    same_float = dict(record, Age=30.0)
+    assert canonical_key(record) == canonical_key(same) == canonical_key(same_float)
+    assert canonical_key(dict(record, Monthly_Income=None)) == canonical_key(dict(record, Monthly_Income=float("nan")))
+    # the imputer only fills NaN, so a None category is a different input
+    assert canonical_key(dict(record, Gender=None)) != canonical_key(dict(record, Gender=float("nan")))
+    assert canonical_key(dict(record, Age=31)) != canonical_key(record)
+
+
+def test_frame_keys_match_record_keys():
+    df = synthetic_customers(50, seed=6)[FEATURE_COLUMNS].astype({"Gender": object, "Occupation": object})
+    df.loc[3, "Gender"] = None
+    df.loc[4, "Occupation"] = float("nan")
+    assert canonical_keys(df) == [canonical_key(row) for row in df.to_dict("records")]
+
+
+def test_entries_expire_after_ttl():
+    cache = PredictionCache(max_size=10, ttl=0.05)
+    cache.put(b"k", 2)
+    assert cache.get(b"k") == 2
+    time.sleep(0.1)
+    assert cache.get(b"k") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_lru_eviction():
+    cache = PredictionCache(max_size=2)
+    cache.put(b"a", 0)
+    cache.put(b"b", 1)
+    cache.get(b"a")
+    cache.put(b"c", 2)
+    assert cache.get(b"b") is None and cache.get(b"a") == 0
+    assert cache.stats()["evictions"] == 1
+
+
+def test_duplicate_rows_are_scored_once():
+    df = synthetic_customers(10, seed=7)
+    df = df.iloc[[0, 1, 0, 2, 1]].reset_index(drop=True)
+    cache = PredictionCache()
+    model = CachedPersonaModel(ConstantModel(1), cache)
+    assert model.predict(df).tolist() == [1] * 5
+    assert len(cache) == 3
+    model.predict(df)
+    assert model.model.calls == 1
+
+
+def test_write_from_a_retired_version_is_dropped():
+    df = synthetic_customers(20, seed=8)
+    cache = PredictionCache()
+    model = CachedPersonaModel(ConstantModel(1), cache)
+    # a hot swap lands while the old model is still scoring
+    model.model.on_predict = lambda: (setattr(model, "_served", ("v2", ConstantModel(2))), cache.bind("v2"))
+
+    assert model.predict(df).tolist() == [1] * 20
+    assert len(cache) == 0
+    assert model.predict(df).tolist() == [2] * 20
+    assert len(cache) == 20
+
+
+def test_put_many_drops_stale_version():
+    cache = PredictionCache(version="v1")
+    cache.put_many([b"a"], [3], version="v0")
+    assert len(cache) == 0
+    assert cache.get_many([b"a"], version="v1") == [None]
+    cache.put_many([b"a"], [3], version="v1")
+    assert cache.get_many([b"a"], version="v0") == [None]
+    assert cache.get_many([b"a"], version="v1") == [3]
@@ -0,0 +1,39 @@
+# test_train_model.py
+# ---------------------------------------------------------
+# REGRESSION CHECKS (out-of-core training)
+# ---------------------------------------------------------
+# Usage:
+#   python -m pytest -q test_train_model.py
+
+import numpy as np
+from sklearn.preprocessing import PowerTransformer, StandardScaler
+
+from benchmark import synthetic_customers
+from compiled_model import CompiledPersonaModel
+from custom_classes import DistributionPreservingImputer
+from persona_config import FEATURE_COLUMNS
+from train_model import fit_streaming
+
+
+def test_streamed_scaler_is_a_public_step(tmp_path, monkeypatch):
+    df = synthetic_customers(4000, seed=18)
+    source = tmp_path / "history.parquet"
+    df.to_parquet(source)
+    # fit_preprocess sets the imputers from the profile and never fits them
+    monkeypatch.setattr(DistributionPreservingImputer, "fit", lambda self, X, y=None: 1 / 0)
+
+    pipeline, report = fit_streaming(str(source), chunksize=1000, sample_size=1500, log=lambda _: None)
+
+    X = df[FEATURE_COLUMNS]
+    for name in ("trf1", "trf2"):
+        steps = [step for _, step in pipeline.named_steps["preprocess"].named_transformers_[name].steps]
+        power = next(step for step in steps if isinstance(step, PowerTransformer))
+        assert not power.standardize and not hasattr(power, "_scaler")
+        scaler = steps[steps.index(power) + 1]
+        assert isinstance(scaler, StandardScaler) and scaler.n_samples_seen_.max() == len(df)
+    # full-data standardization: every scaled numeric column has mean ~0 over the stream
+    Xt = pipeline.named_steps["preprocess"].transform(X)
+    assert np.allclose(Xt[:, :16].mean(axis=0), 0.0, atol=1e-6)
+    labels = pipeline.predict(X)
+    assert (CompiledPersonaModel.from_pipeline(pipeline).predict(X) == labels).all()
+    assert report["rows"] == len(df)
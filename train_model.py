@@ -0,0 +1,514 @@
+# train_model.py
+# ---------------------------------------------------------
+# OUT-OF-CORE TRAINING (rebuilds model.pkl from streamed data)
+# ---------------------------------------------------------
+# Usage:
+#   python train_model.py history.parquet --output model_new.pkl --reference model.pkl
+#
+# The input is never loaded whole. It is streamed in bounded chunks over
+# a few passes:
+#   1. profile  - per-feature quantile sketches, null counts, min/max/mean,
+#                 category value counts and a fixed-size reservoir sample
+#   2. scale    - standardization statistics after the Yeo-Johnson step
+#   3+. k-means - chunked Lloyd iterations from a k-means++ init fitted on
+#                 the reservoir sample
+# Custom transformers are fitted from the streaming statistics; the
+# remaining sklearn steps (encoders, Yeo-Johnson lambdas) are fitted on
+# the sample. The written Pipeline has the structure of model.pkl, except
+# that each PowerTransformer is split into PowerTransformer(standardize=
+# False) plus a StandardScaler step holding the full-data statistics, so
+# no private sklearn state is written.
+
+import argparse
+import resource
+import time
+from collections import Counter
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from sklearn.base import clone
+from sklearn.cluster import KMeans
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import adjusted_rand_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, PowerTransformer, StandardScaler
+
+from batch_score import DEFAULT_CHUNKSIZE, iter_chunks, load_model
+from compiled_model import CompiledPersonaModel
+from custom_classes import DistributionPreservingImputer, TopNCategories, Winsorizer
+from persona_config import FEATURE_COLUMNS
+from sketches import QuantileSketch, weighted_quantile
+
+DEFAULT_SAMPLE_SIZE = 200_000
+
+
+# ---------------------------------------------------------
+# PIPELINE TEMPLATE (same structure as model.pkl)
+# ---------------------------------------------------------
+def build_pipeline(n_clusters=4, random_state=42, n_init="auto", lower_q=0.01, upper_q=0.99, top_n=None):
+    """
+    Unfitted persona Pipeline. The defaults reproduce model.pkl; `lower_q` /
+    `upper_q` are the monetary Winsorizer quantiles, and `top_n` adds a
+    TopNCategories step (rare Gender / Occupation values -> 'other') in
+    front of the one-hot encoder.
+    """
+    categorical_steps = [
+        ("step1", SimpleImputer(strategy="constant", fill_value="missing")),
+        ("step2", OneHotEncoder(drop="first", handle_unknown="ignore", sparse_output=False)),
+    ]
+    if top_n is not None:
+        categorical_steps = [("step0", TopNCategories(top_n=top_n))] + categorical_steps
+    monetary = ["Annual_Income", "AMB", "FD_Amount"]
+    behavioural = [
+        "Age", "Debit_Txn_Count", "Credit_Txn_Count", "UPI_Usage_Ratio",
+        "ATM_Withdrawal_Count", "Failed_Txn_Count", "Mobile_App_Login",
+        "Netbanking_Login", "Dormancy_Days", "Products_Held",
+        "Credit_Card_Utilization", "Insurance_Premium", "SIP_Amount",
+    ]
+    preprocess = ColumnTransformer([
+        ("trf1", Pipeline([
+            ("step1", DistributionPreservingImputer()),
+            ("step2", Winsorizer(lower_q=lower_q, upper_q=upper_q, columns=monetary)),
+            ("step3", PowerTransformer()),
+        ]), monetary),
+        ("trf2", Pipeline([
+            ("step1", DistributionPreservingImputer()),
+            ("step2", PowerTransformer()),
+        ]), behavioural),
+        ("trf3", Pipeline(categorical_steps), ["Gender", "Occupation"]),
+        ("trf4", Pipeline([
+            ("step1", SimpleImputer(strategy="constant", fill_value=0.0)),
+            ("step2", OrdinalEncoder(categories=[[0.0, 1.0, 2.0, 3.0]],
+                                     handle_unknown="use_encoded_value", unknown_value=-1)),
+        ]), ["City_Tier"]),
+        ("trf5", "passthrough", ["EMI_Presence"]),
+    ])
+    return Pipeline([
+        ("preprocess", preprocess),
+        ("cluster", KMeans(n_clusters=n_clusters, random_state=random_state, n_init=n_init)),
+    ])
+
+
+def _branch_steps(transformer):
+    if isinstance(transformer, Pipeline):
+        return list(transformer.steps)
+    return [("step", transformer)]
+
+
+def categorical_columns(pipeline):
+    """Columns that feed a OneHotEncoder or TopNCategories branch."""
+    columns = []
+    for _, transformer, cols in pipeline.named_steps["preprocess"].transformers:
+        steps = [step for _, step in _branch_steps(transformer)]
+        if any(isinstance(step, (OneHotEncoder, TopNCategories)) for step in steps):
+            columns.extend(cols)
+    return columns
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ---------------------------------------------------------
+# PASS 1: STREAMING PROFILE + RESERVOIR SAMPLE
+# ---------------------------------------------------------
+class StreamProfile:
+    """
+    Constant-memory summary of a stream of customer chunks.
+
+    Keeps a QuantileSketch per numeric column, value counts and null
+    counts per categorical column, and a uniform reservoir sample of at
+    most `sample_size` rows.
+    """
+
+    def __init__(self, numeric_columns, categorical_columns, sample_size=DEFAULT_SAMPLE_SIZE,
+                 sketch_k=2048, seed=0):
+        self.numeric_columns = list(numeric_columns)
+        self.categorical_columns = list(categorical_columns)
+        self.sketches = {col: QuantileSketch(k=sketch_k, seed=seed + i)
+                         for i, col in enumerate(self.numeric_columns)}
+        self.counts = {col: Counter() for col in self.categorical_columns}
+        self.nulls = {col: 0 for col in self.categorical_columns}
+        self.sample_size = sample_size
+        self.rows = 0
+        self._sample = None
+        self._filled = 0
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, chunk):
+        for col in self.numeric_columns:
+            self.sketches[col].update(pd.to_numeric(chunk[col], errors="coerce").to_numpy(dtype=float))
+        for col in self.categorical_columns:
+            values = chunk[col]
+            self.nulls[col] += int(values.isna().sum())
+            self.counts[col].update(values.dropna().value_counts().to_dict())
+        self._reservoir(chunk)
+        self.rows += len(chunk)
+
+    def _reservoir(self, chunk):
+        # Algorithm R, vectorised per chunk: row t replaces slot r ~ U[0, t]
+        # when r < sample_size; later rows overwrite earlier ones as in the
+        # sequential version.
+        chunk = chunk[FEATURE_COLUMNS]
+        if self._sample is None:
+            self._sample = {
+                col: np.empty(self.sample_size, dtype=float if col in self.numeric_columns else object)
+                for col in FEATURE_COLUMNS
+            }
+        n = len(chunk)
+        take = min(self.sample_size - self._filled, n)
+        if take > 0:
+            for col in FEATURE_COLUMNS:
+                self._sample[col][self._filled:self._filled + take] = chunk[col].to_numpy()[:take]
+            self._filled += take
+        if take < n:
+            positions = np.arange(self.rows + take, self.rows + n)
+            slots = self._rng.integers(0, positions + 1)
+            keep = slots < self.sample_size
+            rows = np.arange(take, n)[keep]
+            for col in FEATURE_COLUMNS:
+                self._sample[col][slots[keep]] = chunk[col].to_numpy()[rows]
+
+    def sample_frame(self):
+        data = {col: values[:self._filled] for col, values in self._sample.items()}
+        return pd.DataFrame(data, columns=FEATURE_COLUMNS)
+
+
+def fill_value_from_sketch(sketch):
+    """
+    DistributionPreservingImputer's choice, from a sketch: the candidate
+    (min/median/mean/max/Q1/Q3) with the smallest mean |x - v|, which ranks
+    candidates exactly as the Wasserstein distance of the filled column.
+    """
+    values, weights = sketch.weighted_items()
+    candidates = [
+        sketch.min,
+        sketch.quantile(0.5),
+        sketch.mean,
+        sketch.max,
+        sketch.quantile(0.25),
+        sketch.quantile(0.75),
+    ]
+    best_val = None
+    best_dist = float("inf")
+    for val in candidates:
+        dist = float(np.dot(weights, np.abs(values - val)))
+        if dist < best_dist:
+            best_dist = dist
+            best_val = val
+    return best_val
+
+
+def winsor_bounds_from_sketch(sketch, lower_q, upper_q, fill=None):
+    """Quantile bounds of the column after nulls are filled with `fill`."""
+    values, weights = sketch.weighted_items()
+    if fill is not None and sketch.nulls:
+        values = np.append(values, fill)
+        weights = np.append(weights, float(sketch.nulls))
+    return weighted_quantile(values, weights, lower_q), weighted_quantile(values, weights, upper_q)
+
+
+def top_categories_from_counts(counts, top_n):
+    ranked = sorted(counts.items(), key=lambda item: -item[1])
+    return {category for category, _ in ranked[:top_n]}
+
+
+def _cover_categories(sample, profile):
+    """
+    Append one row per category (or null) seen in the stream but missing
+    from the sample, so sample-fitted encoders know every category.
+    """
+    extra = []
+    for col in profile.categorical_columns:
+        present = set(sample[col].dropna().unique())
+        for category in profile.counts[col]:
+            if category not in present:
+                row = sample.iloc[0].copy()
+                row[col] = category
+                extra.append(row)
+        if profile.nulls[col] and not sample[col].isna().any():
+            row = sample.iloc[0].copy()
+            row[col] = np.nan
+            extra.append(row)
+    if not extra:
+        return sample
+    return pd.concat([sample, pd.DataFrame(extra, columns=FEATURE_COLUMNS)], ignore_index=True)
+
+
+def fit_preprocess(pipeline, sample, profile):
+    """
+    Fit the ColumnTransformer: structure and encoders from the sample,
+    custom transformers from the streaming profile.
+    """
+    preprocess = pipeline.named_steps["preprocess"]
+    # the imputers are fitted from the profile below: fitting them on the
+    # sample first (six Wasserstein distances per column) would be wasted
+    imputers = []
+    for name, transformer, _ in preprocess.transformers:
+        if isinstance(transformer, Pipeline):
+            for i, (step_name, step) in enumerate(transformer.steps):
+                if isinstance(step, DistributionPreservingImputer):
+                    imputers.append((name, transformer, i, step_name, step))
+                    transformer.steps[i] = (step_name, "passthrough")
+    try:
+        preprocess.fit(sample[FEATURE_COLUMNS])
+    finally:
+        for _, transformer, i, step_name, step in imputers:
+            transformer.steps[i] = (step_name, step)
+    for name, _, i, step_name, step in imputers:
+        preprocess.named_transformers_[name].steps[i] = (step_name, clone(step))
+
+    for _, transformer, cols in preprocess.transformers_:
+        if transformer in ("drop", "passthrough"):
+            continue
+        Xs = sample[list(cols)]
+        fills = {}
+        for _, step in _branch_steps(transformer):
+            if isinstance(step, DistributionPreservingImputer):
+                step.fill_values_ = {
+                    col: fill_value_from_sketch(profile.sketches[col])
+                    for col in cols if profile.sketches[col].nulls
+                }
+                fills = step.fill_values_
+            elif isinstance(step, Winsorizer):
+                for col in step.columns_:
+                    lower, upper = winsor_bounds_from_sketch(
+                        profile.sketches[col], step.lower_q, step.upper_q, fills.get(col),
+                    )
+                    step.lower_bounds_[col] = lower
+                    step.upper_bounds_[col] = upper
+            elif isinstance(step, TopNCategories):
+                step.top_categories_ = {
+                    col: top_categories_from_counts(profile.counts[col], step.top_n) for col in cols
+                }
+            elif step != "passthrough" and hasattr(step, "fit"):
+                # refit on the sample as seen through the streamed steps above
+                step.fit(Xs)
+            if step != "passthrough":
+                Xs = step.transform(Xs)
+    return preprocess
+
+
+# ---------------------------------------------------------
+# PASS 2: STREAMED STANDARDIZATION STATISTICS
+# ---------------------------------------------------------
+def _power_branches(preprocess):
+    """(branch Pipeline, index of its standardizing PowerTransformer, columns) per branch."""
+    branches = []
+    for _, transformer, cols in preprocess.transformers_:
+        if not isinstance(transformer, Pipeline):
+            continue
+        for i, (_, step) in enumerate(transformer.steps):
+            if isinstance(step, PowerTransformer) and step.standardize:
+                branches.append((transformer, i, list(cols)))
+    return branches
+
+
+def stream_power_scalers(preprocess, chunks):
+    """
+    Split each standardizing PowerTransformer into the Yeo-Johnson step
+    (standardize=False, same public lambdas_) and a StandardScaler step
+    fitted on the full stream instead of the sample.
+    """
+    branches = _power_branches(preprocess)
+    raw = []
+    for transformer, i, _ in branches:
+        pt = transformer.steps[i][1]
+        unscaled = PowerTransformer(method=pt.method, standardize=False)
+        unscaled.lambdas_ = pt.lambdas_
+        unscaled.n_features_in_ = pt.n_features_in_
+        if hasattr(pt, "feature_names_in_"):
+            unscaled.feature_names_in_ = pt.feature_names_in_
+        raw.append((unscaled, StandardScaler(copy=False)))
+
+    for chunk in chunks:
+        for (transformer, i, cols), (unscaled, scaler) in zip(branches, raw):
+            Xb = chunk[cols]
+            for _, step in transformer.steps[:i]:
+                Xb = step.transform(Xb)
+            scaler.partial_fit(unscaled.transform(Xb))
+
+    for (transformer, i, _), (unscaled, scaler) in zip(branches, raw):
+        transformer.steps[i] = (transformer.steps[i][0], unscaled)
+        transformer.steps.insert(i + 1, (f"step{len(transformer.steps) + 1}", scaler))
+
+
+# ---------------------------------------------------------
+# PASS 3+: CHUNKED LLOYD K-MEANS
+# ---------------------------------------------------------
+def chunked_lloyd(transform, chunk_factory, centers, max_passes=10, tol=1e-4):
+    """
+    Exact Lloyd iterations where each iteration is one streamed pass.
+
+    Per pass only the (k, d) sums, the k counts and the inertia are kept,
+    so memory does not depend on the number of rows. Empty clusters keep
+    their previous centre. `tol` is an absolute bound on the total squared
+    centre shift (scale it like sklearn's relative tol before calling).
+    """
+    centers = np.array(centers, dtype=float)
+    sq_norms = (centers ** 2).sum(axis=1)
+    inertia = np.nan
+    n_passes = 0
+    for n_passes in range(1, max_passes + 1):
+        sums = np.zeros_like(centers)
+        counts = np.zeros(len(centers))
+        inertia = 0.0
+        for chunk in chunk_factory():
+            Xt = transform(chunk)
+            distances = sq_norms - 2.0 * (Xt @ centers.T)  # same as nearest_center
+            labels = distances.argmin(axis=1)
+            inertia += float((distances[np.arange(len(Xt)), labels] + (Xt ** 2).sum(axis=1)).sum())
+            np.add.at(sums, labels, Xt)
+            counts += np.bincount(labels, minlength=len(centers))
+        new_centers = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+        shift = float(((new_centers - centers) ** 2).sum())
+        centers = new_centers
+        sq_norms = (centers ** 2).sum(axis=1)
+        if shift <= tol:
+            break
+    return centers, inertia, n_passes
+
+
+def nearest_center(X, centers):
+    distances = (centers ** 2).sum(axis=1) - 2.0 * (X @ centers.T)
+    return distances.argmin(axis=1)
+
+
+def align_to_reference(new_labels, ref_labels, n_clusters):
+    """Permutation new cluster -> reference cluster maximising agreement."""
+    overlap = np.zeros((n_clusters, n_clusters))
+    np.add.at(overlap, (new_labels, ref_labels), 1)
+    rows, cols = linear_sum_assignment(-overlap)
+    return dict(zip(rows, cols))
+
+
+# ---------------------------------------------------------
+# DRIVER
+# ---------------------------------------------------------
+def fit_streaming(input_path, chunksize=DEFAULT_CHUNKSIZE, sample_size=DEFAULT_SAMPLE_SIZE,
+                  n_clusters=4, n_init="auto", random_state=42, max_passes=10, tol=1e-4,
+                  sketch_k=2048, reference=None, log=print):
+    """
+    Fit a model.pkl-compatible Pipeline from a CSV/Parquet file in bounded memory.
+
+    Returns (pipeline, report). `reference` is an optional fitted Pipeline
+    (e.g. the current model.pkl); when given, cluster ids are permuted to
+    match it so persona ids stay stable, and agreement with it is reported.
+    """
+    report = {"stages": {}}
+    pipeline = build_pipeline(n_clusters=n_clusters, random_state=random_state, n_init=n_init)
+    cat_cols = categorical_columns(pipeline)
+    num_cols = [col for col in FEATURE_COLUMNS if col not in cat_cols]
+
+    def chunks():
+        return iter_chunks(input_path, chunksize=chunksize, columns=FEATURE_COLUMNS)
+
+    def stage(name, start):
+        report["stages"][name] = {"seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb()}
+        log(f"[{name}] {report['stages'][name]['seconds']:.1f}s, peak RSS {peak_rss_mb():.0f} MB")
+
+    # pass 1: profile
+    start = time.perf_counter()
+    profile = StreamProfile(num_cols, cat_cols, sample_size=sample_size, sketch_k=sketch_k, seed=random_state)
+    for chunk in chunks():
+        profile.update(chunk)
+    sample = _cover_categories(profile.sample_frame(), profile)
+    report["rows"] = profile.rows
+    report["sample_rows"] = len(sample)
+    stage("profile", start)
+
+    # preprocessing from streaming statistics + sample
+    start = time.perf_counter()
+    preprocess = fit_preprocess(pipeline, sample, profile)
+    stage("fit_preprocess", start)
+
+    # pass 2: full-data standardization statistics
+    start = time.perf_counter()
+    stream_power_scalers(preprocess, chunks())
+    stage("scale", start)
+
+    # k-means++ init on the sample, then chunked Lloyd over the full stream
+    start = time.perf_counter()
+    Xs = preprocess.transform(sample[FEATURE_COLUMNS])
+    kmeans = pipeline.named_steps["cluster"]
+    kmeans.fit(Xs)
+    init_centers = kmeans.cluster_centers_.copy()
+    sample_inertia = kmeans.inertia_ / len(Xs)
+    compiled = CompiledPersonaModel.from_pipeline(pipeline)
+    abs_tol = tol * float(np.mean(np.var(Xs, axis=0)))
+    centers, inertia, n_passes = chunked_lloyd(compiled.transform, chunks, init_centers,
+                                               max_passes=max_passes, tol=abs_tol)
+    stage("kmeans", start)
+
+    report["kmeans"] = {
+        "passes": n_passes,
+        "inertia_per_row": inertia / max(profile.rows, 1),
+        "full_batch_sample_inertia_per_row": sample_inertia,
+    }
+
+    if reference is not None:
+        ref_labels = np.asarray(reference.predict(sample[FEATURE_COLUMNS]))
+        new_labels = nearest_center(Xs, centers)
+        mapping = align_to_reference(new_labels, ref_labels, n_clusters)
+        aligned = np.empty_like(centers)
+        for new_id, ref_id in mapping.items():
+            aligned[ref_id] = centers[new_id]
+        centers = aligned
+        new_labels = np.array([mapping[label] for label in new_labels])
+        report["reference"] = {
+            "label_agreement": float((new_labels == ref_labels).mean()),
+            "adjusted_rand_index": float(adjusted_rand_score(ref_labels, new_labels)),
+        }
+
+    kmeans.cluster_centers_ = centers
+    kmeans.inertia_ = inertia
+    kmeans.n_iter_ = n_passes
+    # labels_ would hold one entry per training row; keep only the sample's
+    kmeans.labels_ = nearest_center(Xs, centers).astype(np.int32)
+    report["peak_rss_mb"] = peak_rss_mb()
+    return pipeline, report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Rebuild the persona model from streamed data.")
+    parser.add_argument("input", help="Training data (CSV or Parquet) with FEATURE_COLUMNS.")
+    parser.add_argument("--output", required=True, help="Where to write the fitted Pipeline.")
+    parser.add_argument("--reference", default=None,
+                        help="Current model.pkl, used to keep cluster ids stable and to compare quality.")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--sample-size", type=int, default=DEFAULT_SAMPLE_SIZE,
+                        help="Reservoir sample rows used for encoders, lambdas and k-means init.")
+    parser.add_argument("--n-clusters", type=int, default=4)
+    parser.add_argument("--max-passes", type=int, default=10, help="Maximum streamed Lloyd passes.")
+    parser.add_argument("--random-state", type=int, default=42)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    reference = load_model(args.reference) if args.reference else None
+    pipeline, report = fit_streaming(
+        args.input, chunksize=args.chunksize, sample_size=args.sample_size,
+        n_clusters=args.n_clusters, random_state=args.random_state,
+        max_passes=args.max_passes, reference=reference,
+    )
+    joblib.dump(pipeline, args.output)
+
+    km = report["kmeans"]
+    print(f"Trained on {report['rows']:,} rows ({report['sample_rows']:,} sampled) -> {args.output}")
+    print(f"  k-means: {km['passes']} passes, inertia/row {km['inertia_per_row']:.4f} "
+          f"(full-batch fit on sample: {km['full_batch_sample_inertia_per_row']:.4f})")
+    if "reference" in report:
+        ref = report["reference"]
+        print(f"  vs reference: label agreement {ref['label_agreement']:.3%}, "
+              f"ARI {ref['adjusted_rand_index']:.4f}")
+    print(f"  peak RSS {report['peak_rss_mb']:.0f} MB")
+    return report
+
+
+if __name__ == "__main__":
+    main()